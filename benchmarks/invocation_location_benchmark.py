@@ -0,0 +1,88 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the per-step cost of resolving the call site of a step.
+
+Usage: python benchmarks/invocation_location_benchmark.py [num_steps]
+
+Run it from the repository root with the `couler` package importable,
+e.g. with `PYTHONPATH=.` or after `python setup.py install`.
+"""
+
+import inspect
+import os
+import sys
+import timeit
+
+from couler.core import states, utils
+
+
+def _inspect_stack_invocation_location():
+    """The `inspect.stack()` based implementation that
+    `utils.invocation_location()` used to have, kept as the baseline.
+    """
+    stack = inspect.stack()
+    if len(stack) < 4:
+        line_number = stack[len(stack) - 1][2]
+        full_path = stack[len(stack) - 1][0].f_code.co_filename
+        filename, _ = os.path.splitext(os.path.basename(full_path))
+        func_name = "%s-%d" % (utils.argo_safe_name(filename), line_number)
+    else:
+        func_name = utils.argo_safe_name(stack[2][3])
+        line_number = stack[3][2]
+    return func_name, line_number
+
+
+def _run_step(resolver):
+    # Stands in for `couler.run_container()`.
+    return resolver()
+
+
+def _user_step(resolver):
+    # Stands in for a user function that defines a step.
+    return _run_step(resolver)
+
+
+def _nested(depth, fn):
+    # Mimic the call depth of a workflow defined inside a test runner or
+    # a workflow-generating framework.
+    if depth == 0:
+        return fn()
+    return _nested(depth - 1, fn)
+
+
+def bench(resolver, num_steps, depth):
+    def build():
+        for _ in range(num_steps):
+            _user_step(resolver)
+
+    seconds = min(timeit.repeat(lambda: _nested(depth, build), number=1))
+    return seconds / num_steps * 1e6
+
+
+def main():
+    # Do not print the (empty) workflow YAML at exit.
+    states._enable_print_yaml = False
+    num_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for depth in (5, 30):
+        before = bench(_inspect_stack_invocation_location, num_steps, depth)
+        after = bench(utils.invocation_location, num_steps, depth)
+        print(
+            "%d steps, stack depth %d: inspect.stack %.2f us/step, "
+            "frame walk %.2f us/step (%.0fx)"
+            % (num_steps, depth, before, after, before / after)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark attaching DAG dependencies to the protobuf representation.
+
+Usage: python benchmarks/proto_repr_benchmark.py [num_tasks ...]
+
+Run it from the repository root with the `couler` package importable,
+e.g. with `PYTHONPATH=.` or after `python setup.py install`.
+"""
+
+import random
+import sys
+import time
+
+from couler.core import proto_repr, states
+
+# The linear scan is quadratic over a whole DAG, so it is only timed for
+# a sample of the tasks and the total is extrapolated.
+_LINEAR_SCAN_SAMPLE = 200
+
+
+def _linear_add_deps_to_step(step_name):
+    """The linear scan that `proto_repr.add_deps_to_step()` used to do,
+    kept as the baseline.
+    """
+    dag_task = states.workflow.get_dag_task(step_name)
+    deps = dag_task.get("dependencies") if dag_task is not None else None
+    if deps is not None:
+        proto_wf = proto_repr.get_default_proto_workflow()
+        step_id = None
+        for i, step in enumerate(proto_wf.steps):
+            if step.steps[0].name == step_name:
+                step_id = i
+                break
+        if step_id is not None:
+            proto_wf.steps[step_id].steps[0].dependencies.extend(deps)
+
+
+def build_dag(num_tasks):
+    """Build a DAG where each task depends on the previous one."""
+    states._cleanup()
+    states.workflow.enable_dag_mode()
+    names = []
+    for i in range(num_tasks):
+        name = "task-%d" % i
+        task = {"name": name, "template": "echo"}
+        if names:
+            task["dependencies"] = [names[-1]]
+        states.workflow.update_dag_task(name, task)
+        proto_repr.step_repr(
+            step_name=name, tmpl_name="echo", image="alpine", command="echo"
+        )
+        names.append(name)
+    return names
+
+
+def bench(num_tasks):
+    names = build_dag(num_tasks)
+    sample = random.Random(0).sample(
+        names, min(_LINEAR_SCAN_SAMPLE, len(names))
+    )
+
+    start = time.perf_counter()
+    for name in sample:
+        _linear_add_deps_to_step(name)
+    linear = (time.perf_counter() - start) / len(sample) * num_tasks
+
+    names = build_dag(num_tasks)
+    start = time.perf_counter()
+    for name in names:
+        proto_repr.add_deps_to_step(name)
+    indexed = time.perf_counter() - start
+
+    names = build_dag(num_tasks)
+    start = time.perf_counter()
+    proto_repr.add_deps_to_steps(names)
+    bulk = time.perf_counter() - start
+    return linear, indexed, bulk
+
+
+def main():
+    # Do not print the (empty) workflow YAML at exit.
+    states._enable_print_yaml = False
+    sizes = [int(n) for n in sys.argv[1:]] or [10000, 50000]
+    for num_tasks in sizes:
+        linear, indexed, bulk = bench(num_tasks)
+        print(
+            "%d tasks: linear scan %.2fs (extrapolated), indexed %.3fs, "
+            "bulk %.3fs" % (num_tasks, linear, indexed, bulk)
+        )
+    states._cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,18 +12,29 @@
 # limitations under the License.
 
 import atexit
-import logging
+import io
+from collections import OrderedDict
 
 import pyaml
 import yaml
 from kubernetes import client as k8s_client
-from kubernetes import config
 
+from couler import client_registry
 from couler.argo_submitter import ArgoSubmitter
-from couler.core import states  # noqa: F401
+from couler.core import (  # noqa: F401
+    shared_templates,
+    states,
+    utils,
+    workflow_emitter,
+    workflow_sharding,
+)
 from couler.core.config import config_defaults, config_workflow  # noqa: F401
 from couler.core.constants import *  # noqa: F401, F403
-from couler.core.constants import WorkflowCRD
+from couler.core.constants import (
+    ETCD_REQUEST_SIZE_LIMIT,
+    WorkflowCRD,
+    WorkflowTemplateCRD,
+)
 from couler.core.run_templates import (  # noqa: F401
     run_canned_step,
     run_container,
@@ -48,6 +59,7 @@ from couler.core.templates import (  # noqa: F401
 from couler.core.workflow_validation_utils import (  # noqa: F401
     validate_workflow_yaml,
 )
+from couler.retry_policy import RateLimiter, RetryPolicy  # noqa: F401
 
 
 def workflow_yaml():
@@ -61,24 +73,9 @@ def run(submitter=None):
     """
     states._enable_print_yaml = False
 
-    if submitter is None and ArgoSubmitter._default_submitter is None:
-        raise ValueError(
-            "The input submitter is None and default submitter was not set."
-        )
-    wf = workflow_yaml()
-    secrets = states._secrets.values()
-    validate_workflow_yaml(wf)
-
-    if submitter is not None:
-        if isinstance(submitter, ArgoSubmitter):
-            res = submitter.submit(wf, secrets=secrets)
-        elif issubclass(submitter, ArgoSubmitter):
-            submitter = ArgoSubmitter()
-            res = submitter.submit(wf, secrets=secrets)
-        else:
-            raise ValueError("Only ArgoSubmitter is supported currently.")
-    else:
-        res = ArgoSubmitter._default_submitter.submit(wf, secrets=secrets)
+    submitter = _get_submitter(submitter)
+    wf, kwargs = _compile(workflow_yaml())
+    res = submitter.submit(wf, **kwargs)
 
     # Clean up the saved states of the workflow since we made a copy of
     # the workflow above and no longer need the original reference. This
@@ -87,6 +84,110 @@ def run(submitter=None):
     return res
 
 
+def create_workflow_template(submitter=None, name=None):
+    """Compile the workflow into a WorkflowTemplate and create it, or
+    update it if it changed, to run it many times with `run_workflow_template`.
+    The template is named `name`, or after the workflow name given to
+    `config_workflow` without its salt, so that it stays the same across
+    runs. The arguments
+    set with `config_workflow` are its parameters.
+    Returns the name of the WorkflowTemplate.
+    """
+    states._enable_print_yaml = False
+
+    submitter = _get_submitter(submitter)
+    wf, kwargs = _compile(workflow_yaml())
+    if wf["kind"] != WorkflowCRD.KIND:
+        raise ValueError("Cron workflows cannot be workflow templates")
+    if name is None and states.workflow.base_name is not None:
+        # Not the salted name of the workflow, which changes on every run,
+        # so that compiling the workflow again updates the same template
+        name = utils.argo_safe_name(states.workflow.base_name)
+    if name is None:
+        name = wf["metadata"]["generateName"].rstrip("-")
+    workflow_template = OrderedDict(
+        [
+            ("apiVersion", wf["apiVersion"]),
+            ("kind", WorkflowTemplateCRD.KIND),
+            ("metadata", {"name": name}),
+            ("spec", wf["spec"]),
+        ]
+    )
+    submitter.create_workflow_template(workflow_template, **kwargs)
+
+    _cleanup()
+    return name
+
+
+def workflow_from_template(name, arguments=None):
+    """Return a workflow running the WorkflowTemplate of the given name,
+    with the given argument values by parameter name."""
+    spec = OrderedDict([("workflowTemplateRef", {"name": name})])
+    if arguments:
+        spec["arguments"] = {
+            "parameters": [
+                {"name": key, "value": utils.parameter_value(value)}
+                for key, value in arguments.items()
+            ]
+        }
+    return OrderedDict(
+        [
+            ("apiVersion", "argoproj.io/v1alpha1"),
+            ("kind", WorkflowCRD.KIND),
+            ("metadata", {"generateName": "%s-" % name}),
+            ("spec", spec),
+        ]
+    )
+
+
+def run_workflow_template(name, arguments=None, submitter=None):
+    """Submit a workflow running the WorkflowTemplate of the given name,
+    created with `create_workflow_template`, with the given arguments.
+    Unlike `run`, this neither uses nor clears the workflow being defined.
+    """
+    return _get_submitter(submitter).submit(
+        workflow_from_template(name, arguments)
+    )
+
+
+def _get_submitter(submitter):
+    if submitter is None:
+        if ArgoSubmitter._default_submitter is None:
+            raise ValueError(
+                "The input submitter is None and default submitter "
+                "was not set."
+            )
+        return ArgoSubmitter._default_submitter
+    if isinstance(submitter, ArgoSubmitter):
+        return submitter
+    if issubclass(submitter, ArgoSubmitter):
+        return ArgoSubmitter()
+    raise ValueError("Only ArgoSubmitter is supported currently.")
+
+
+def _compile(wf):
+    """Validate the workflow, and return the workflow to submit and the
+    keyword arguments of the submitter creating the objects it uses."""
+    kwargs = {"secrets": states._secrets.values()}
+    if states._config_maps:
+        kwargs["config_maps"] = list(states._config_maps.values())
+    validate_workflow_yaml(wf)
+    wf, workflow_templates = _split(wf)
+    if workflow_templates:
+        kwargs["workflow_templates"] = workflow_templates
+    return wf, kwargs
+
+
+def _split(wf):
+    """Return the workflow to submit and the WorkflowTemplates it uses."""
+    wf, workflow_templates = shared_templates.extract_shared_templates(
+        wf, states.workflow.shared_templates
+    )
+    # A workflow too large for etcd runs its steps in child workflows
+    wf, shards = workflow_sharding.shard_workflow(wf)
+    return wf, workflow_templates + shards
+
+
 def set_default_submitter(submitter=None):
     """
     Config couler defaults.
@@ -108,26 +209,20 @@ def delete(
     persist_config=True,
     grace_period_seconds=5,
     propagation_policy="Background",
+    retry_policy=None,
 ):
-    try:
-        config.load_kube_config(
-            config_file, context, client_configuration, persist_config
-        )
-        logging.info(
-            "Found local kubernetes config. Initialized with kube_config."
-        )
-    except Exception:
-        logging.info("Cannot find local k8s config. Trying in-cluster config.")
-        config.load_incluster_config()
-        logging.info("Initialized with in-cluster config.")
-
-    api_client = k8s_client.CustomObjectsApi()
+    api_client = client_registry.get_clients(
+        namespace, config_file, context, client_configuration, persist_config
+    ).custom_objects_api
     delete_body = k8s_client.V1DeleteOptions(
         grace_period_seconds=grace_period_seconds,
         propagation_policy=propagation_policy,
     )
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
     try:
-        return api_client.delete_namespaced_custom_object(
+        return retry_policy.call(
+            api_client.delete_namespaced_custom_object,
             WorkflowCRD.GROUP,
             WorkflowCRD.VERSION,
             namespace,
@@ -139,6 +234,47 @@ def delete(
         raise Exception("Exception when deleting the workflow: %s\n" % e)
 
 
+def delete_many(
+    names=None,
+    namespace="default",
+    label_selector=None,
+    phases=None,
+    older_than=None,
+    max_concurrency=8,
+    on_progress=None,
+    config_file=None,
+    context=None,
+    client_configuration=None,
+    persist_config=True,
+    grace_period_seconds=5,
+    propagation_policy="Background",
+    retry_policy=None,
+):
+    """Delete workflows in bulk, see `ArgoSubmitter.delete_many`.
+
+    For example, to delete the workflows that succeeded more than a week
+    ago: `delete_many(phases=["Succeeded"], older_than=timedelta(days=7))`.
+    """
+    submitter = ArgoSubmitter(
+        namespace,
+        config_file,
+        context,
+        client_configuration,
+        persist_config,
+        retry_policy=retry_policy,
+    )
+    return submitter.delete_many(
+        names=names,
+        label_selector=label_selector,
+        phases=phases,
+        older_than=older_than,
+        max_concurrency=max_concurrency,
+        on_progress=on_progress,
+        grace_period_seconds=grace_period_seconds,
+        propagation_policy=propagation_policy,
+    )
+
+
 def init_yaml_dump():
     yaml.SafeDumper.org_represent_str = yaml.SafeDumper.represent_str
 
@@ -153,20 +289,35 @@ def init_yaml_dump():
 
 
 def _dump_yaml():
-    yaml_str = pyaml.dump(workflow_yaml())
-
-    # The maximum size of an etcd request is 1.5MiB:
-    # https://github.com/etcd-io/etcd/blob/master/Documentation/dev-guide/limit.md#request-size-limit # noqa: E501
-    if len(yaml_str) > 1573000:
-        raise ValueError(
-            "The size of workflow YAML file should not be more \
-            than 1.5MiB."
+    # Stream the workflow and fail as soon as it exceeds the size
+    # limit of an etcd request instead of serializing all of it first.
+    stream = io.StringIO()
+    wf, workflow_templates = shared_templates.extract_shared_templates(
+        workflow_yaml(), states.workflow.shared_templates
+    )
+    try:
+        workflow_emitter.dump_yaml(
+            wf, stream, max_bytes=ETCD_REQUEST_SIZE_LIMIT
+        )
+    except workflow_emitter.WorkflowSizeError as e:
+        # Only a workflow that does not fit is split, and emitted again
+        wf, shards = workflow_sharding.shard_workflow(wf, error=e)
+        workflow_templates = workflow_templates + shards
+        stream = io.StringIO()
+        workflow_emitter.dump_yaml(
+            wf, stream, max_bytes=ETCD_REQUEST_SIZE_LIMIT
         )
+    yaml_str = stream.getvalue()
+
+    for workflow_template in workflow_templates:
+        yaml_str += "\n---\n" + pyaml.dump(workflow_template)
 
     # TODO(weiyan): add unittest for verifying multiple secrets outputs
     for secret in states._secrets.values():
         if not secret.dry_run:
             yaml_str += "\n---\n" + pyaml.dump(secret.to_yaml())
+    for config_map in states._config_maps.values():
+        yaml_str += "\n---\n" + pyaml.dump(config_map.to_yaml())
 
     if states._enable_print_yaml:
         print(yaml_str)
@@ -10,19 +10,345 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import datetime
+import functools
+import hashlib
+import json
 import logging
 import os
 import re
 import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-import pyaml
-import yaml
 from kubernetes import client as k8s_client
-from kubernetes import config
+from kubernetes import watch as k8s_watch
+from kubernetes.client.rest import ApiException
 
-from couler.core.constants import CronWorkflowCRD, WorkflowCRD
+from couler import client_registry
+from couler.core.constants import (
+    COULER_MANAGED_LABEL,
+    CronWorkflowCRD,
+    WFStatus,
+    WorkflowCRD,
+    WorkflowTemplateCRD,
+)
+from couler.core.plain_objects import to_plain_objects
+from couler.retry_policy import RetryPolicy
 
 _SUBMITTER_IMPL_ENV_VAR_KEY = "SUBMITTER_IMPLEMENTATION"
+_DEFAULT_MAX_CONCURRENCY = 8
+_WATCH_TIMEOUT_SECONDS = 300
+_WATCH_MAX_BACKOFF_SECONDS = 30
+_WATCH_MAX_ATTEMPT = 64
+_FINAL_PHASES = frozenset(status.value for status in WFStatus)
+_DEFAULT_PAGE_SIZE = 500
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+_PLURALS = {
+    crd.KIND: crd.PLURAL
+    for crd in (WorkflowCRD, CronWorkflowCRD, WorkflowTemplateCRD)
+}
+# Selects the secrets created by couler
+_MANAGED_SELECTOR = "%s=true" % COULER_MANAGED_LABEL
+# The annotation holding the hash of the spec of a workflow template
+_CONTENT_HASH_ANNOTATION = "couler/content-hash"
+
+
+class SubmitResult(object):
+    """The outcome of submitting one workflow with `submit_many`."""
+
+    def __init__(self, workflow_yaml, response=None, error=None):
+        self.workflow_yaml = workflow_yaml
+        self.response = response
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    @property
+    def name(self):
+        if self.response is not None:
+            return self.response.get("metadata", {}).get("name")
+        return None
+
+
+def _split_batch(workflows, secrets=None):
+    """Return the `(workflow_yaml, secret_names)` pairs of a batch and the
+    distinct secrets they need, by name."""
+    batch = []
+    batch_secrets = OrderedDict()
+    for item in workflows:
+        if isinstance(item, tuple):
+            workflow_yaml, wf_secrets = item
+        else:
+            workflow_yaml, wf_secrets = item, None
+        names = []
+        for secret in list(secrets or []) + list(wf_secrets or []):
+            batch_secrets.setdefault(secret.name, secret)
+            names.append(secret.name)
+        batch.append((workflow_yaml, names))
+    return batch, batch_secrets
+
+
+def _annotate_content_hash(workflow_template):
+    """Return the workflow template as plain objects, annotated with the
+    hash of its spec."""
+    body = to_plain_objects(workflow_template)
+    digest = hashlib.sha1(
+        json.dumps(body["spec"], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    metadata = body["metadata"]
+    metadata["annotations"] = dict(metadata.get("annotations") or {})
+    metadata["annotations"][_CONTENT_HASH_ANNOTATION] = digest
+    return body
+
+
+def _same_content(existing, body):
+    annotations = existing["metadata"].get("annotations") or {}
+    return (
+        annotations.get(_CONTENT_HASH_ANNOTATION)
+        == body["metadata"]["annotations"][_CONTENT_HASH_ANNOTATION]
+    )
+
+
+def _owner_patches(owner):
+    """Return the JSON patches making the given object an owner of a config
+    map, the first adding it to the existing owners and the second to a
+    config map with none. The config map is deleted with its last owner.
+    """
+    reference = OrderedDict(
+        [
+            ("apiVersion", owner["apiVersion"]),
+            ("kind", owner["kind"]),
+            ("name", owner["metadata"]["name"]),
+            ("uid", owner["metadata"]["uid"]),
+        ]
+    )
+    return (
+        [
+            {
+                "op": "add",
+                "path": "/metadata/ownerReferences/-",
+                "value": reference,
+            }
+        ],
+        [
+            {
+                "op": "add",
+                "path": "/metadata/ownerReferences",
+                "value": [reference],
+            }
+        ],
+    )
+
+
+def _call_directly(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def _list_pages(list_func, *args, limit=_DEFAULT_PAGE_SIZE, **kwargs):
+    """Yield the pages of a list call of custom objects, following the
+    `continue` token so that no response holds more than `limit` items."""
+    while True:
+        page = list_func(*args, limit=limit, **kwargs)
+        yield page
+        kwargs["_continue"] = page["metadata"].get("continue")
+        if not kwargs["_continue"]:
+            return
+
+
+class SecretCache(object):
+    """A local view of the secrets of one namespace.
+
+    The secrets created by couler are listed once and then kept up to date
+    by a single watch running in a daemon thread, so creating the secrets
+    of a workflow only calls the API for the ones that do not exist yet
+    with the same content. Without the permission to list the secrets,
+    each secret is created once and an existing one is kept.
+    """
+
+    def __init__(
+        self,
+        core_api_client,
+        namespace,
+        watch=True,
+        watch_factory=k8s_watch.Watch,
+        max_concurrency=_DEFAULT_MAX_CONCURRENCY,
+        call_api=_call_directly,
+        call_create_api=_call_directly,
+    ):
+        self._core_api_client = core_api_client
+        self.namespace = namespace
+        self.watch = watch
+        self._watch_factory = watch_factory
+        self.max_concurrency = max_concurrency
+        # Run the API calls, e.g. with the retry policy of a submitter
+        self._call_api = call_api
+        self._call_create_api = call_create_api
+        # secret name -> data
+        self._secrets = {}
+        self._resource_version = None
+        self._synced = False
+        # False once listing the secrets is forbidden
+        self._listable = True
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watch_thread = None
+
+    def ensure(self, secrets):
+        """Create the given secrets unless they already exist with the same
+        content. Returns an OrderedDict from secret name to the error raised
+        when creating it, or None if it exists.
+        """
+        secrets = OrderedDict((secret.name, secret) for secret in secrets)
+        if not secrets:
+            return OrderedDict()
+        self._sync()
+        with self._lock:
+            missing = [
+                secret
+                for name, secret in secrets.items()
+                if self._secrets.get(name) != secret.data
+            ]
+        errors = OrderedDict((name, None) for name in secrets)
+        if len(missing) > 1 and self.max_concurrency > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrency, len(missing))
+            ) as executor:
+                results = list(executor.map(self._create, missing))
+        else:
+            results = [self._create(secret) for secret in missing]
+        for secret, error in zip(missing, results):
+            errors[secret.name] = error
+        return errors
+
+    def invalidate(self):
+        """Drop the local view, the secrets are listed again on next use."""
+        with self._lock:
+            self._synced = False
+            self._secrets = {}
+
+    def stop(self):
+        self._stopped.set()
+
+    def _sync(self):
+        with self._lock:
+            if self._synced:
+                return
+        self._list()
+        if not self._listable:
+            return
+        if self.watch and (
+            self._watch_thread is None or not self._watch_thread.is_alive()
+        ):
+            self._watch_thread = threading.Thread(
+                target=self._watch_loop, daemon=True
+            )
+            self._watch_thread.start()
+
+    def _list(self):
+        try:
+            secret_list = self._call_api(
+                self._core_api_client.list_namespaced_secret,
+                self.namespace,
+                label_selector=_MANAGED_SELECTOR,
+            )
+        except ApiException as e:
+            if e.status != 403:
+                raise
+            logging.warning(
+                "Cannot list the secrets, creating them instead: %s" % e
+            )
+            with self._lock:
+                self._listable = False
+                self._synced = True
+            return
+        with self._lock:
+            self._secrets = {
+                item.metadata.name: item.data or {}
+                for item in secret_list.items
+            }
+            self._resource_version = secret_list.metadata.resource_version
+            self._synced = True
+
+    def _watch_loop(self):
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                self._watch_once()
+                backoff = 1
+            except ApiException as e:
+                if e.status == 410:
+                    # The resource version is too old, list again
+                    self._list()
+                    continue
+                logging.warning("Secret watch failed: %s" % e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, _WATCH_MAX_BACKOFF_SECONDS)
+            except Exception as e:
+                logging.warning("Secret watch failed: %s" % e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, _WATCH_MAX_BACKOFF_SECONDS)
+
+    def _watch_once(self):
+        if not self._synced:
+            self._list()
+        w = self._watch_factory()
+        for event in w.stream(
+            self._core_api_client.list_namespaced_secret,
+            self.namespace,
+            label_selector=_MANAGED_SELECTOR,
+            resource_version=self._resource_version,
+            timeout_seconds=_WATCH_TIMEOUT_SECONDS,
+        ):
+            if self._stopped.is_set():
+                w.stop()
+                return
+            obj = event["object"]
+            with self._lock:
+                if event["type"] == "DELETED":
+                    self._secrets.pop(obj.metadata.name, None)
+                else:
+                    self._secrets[obj.metadata.name] = obj.data or {}
+                self._resource_version = obj.metadata.resource_version
+
+    def _create(self, secret):
+        try:
+            self._call_create_api(
+                self._core_api_client.create_namespaced_secret,
+                self.namespace,
+                to_plain_objects(secret.to_yaml()),
+            )
+        except ApiException as e:
+            if e.status != 409:
+                return e
+            # Someone else created it, the local view is out of date
+            if self._listable:
+                self.invalidate()
+            try:
+                existing = self._call_api(
+                    self._core_api_client.read_namespaced_secret,
+                    secret.name,
+                    self.namespace,
+                )
+            except ApiException as read_error:
+                if read_error.status != 403:
+                    return e
+                # Keep the existing secret, the names of the secrets are
+                # derived from their content unless given
+                existing = None
+            except Exception:
+                return e
+            if existing is not None and (existing.data or {}) != secret.data:
+                return e
+        except Exception as e:
+            return e
+        with self._lock:
+            self._secrets[secret.name] = secret.data
+        return None
 
 
 class _SubmitterImplTypes(object):
@@ -32,7 +358,14 @@ class _SubmitterImplTypes(object):
 
 # TODO: some k8s common parts can move to another file later.
 class ArgoSubmitter(object):
-    """A submitter which submits a workflow to Argo"""
+    """A submitter which submits a workflow to Argo.
+
+    The calls creating, deleting and listing workflows and secrets are
+    retried with `retry_policy`, a default `RetryPolicy` if not given, and
+    throttled by `rate_limiter`, a `RateLimiter` shared by all the threads
+    of the submitter, if given. Creates are only retried when the server
+    did not process them, see `RetryPolicy.call_create`.
+    """
 
     _default_submitter = None
 
@@ -43,9 +376,25 @@ class ArgoSubmitter(object):
         context=None,
         client_configuration=None,
         persist_config=True,
+        custom_object_api_client=None,
+        core_api_client=None,
+        watch_secrets=True,
+        watch_factory=k8s_watch.Watch,
+        retry_policy=None,
+        rate_limiter=None,
     ):
         logging.basicConfig(level=logging.INFO)
         self.namespace = namespace
+        self.retry_policy = (
+            retry_policy if retry_policy is not None else RetryPolicy()
+        )
+        self.rate_limiter = rate_limiter
+        self.watch_secrets = watch_secrets
+        self._watch_factory = watch_factory
+        self._secret_cache = None
+        # Names of the workflow templates known to exist, which are named
+        # after their content and so never need to be created again
+        self._workflow_templates = set()
         logging.info("Argo submitter namespace: %s" % self.namespace)
         self.go_impl = (
             os.environ.get(
@@ -55,6 +404,7 @@ class ArgoSubmitter(object):
         )
         if self.go_impl:
             from ctypes import c_char_p, cdll
+
             from couler.core.proto_repr import get_default_proto_workflow
 
             self.go_submitter = cdll.LoadLibrary("./submit.so")
@@ -67,30 +417,29 @@ class ArgoSubmitter(object):
                 self.proto_path = tmp_file.name
                 proto_wf = get_default_proto_workflow()
                 tmp_file.write(proto_wf.SerializeToString())
+        elif (
+            custom_object_api_client is not None
+            and core_api_client is not None
+        ):
+            self._clients = None
+            self._custom_object_api_client = custom_object_api_client
+            self._core_api_client = core_api_client
         else:
-            try:
-                config.load_kube_config(
-                    config_file, context, client_configuration, persist_config
-                )
-                logging.info(
-                    "Found local kubernetes config. "
-                    "Initialized with kube_config."
-                )
-                if client_configuration is not None:
-                    logging.info(
-                        "Setting default k8s client config as provided"
-                    )
-                    k8s_client.Configuration.set_default(client_configuration)
-            except Exception:
-                logging.info(
-                    "Cannot find local k8s config. "
-                    "Trying in-cluster config."
-                )
-                config.load_incluster_config()
-                logging.info("Initialized with in-cluster config.")
-
-            self._custom_object_api_client = k8s_client.CustomObjectsApi()
-            self._core_api_client = k8s_client.CoreV1Api()
+            # The kube config is loaded once per process and the clients
+            # are shared by all the submitters using it
+            self._clients = client_registry.get_clients(
+                namespace,
+                config_file,
+                context,
+                client_configuration,
+                persist_config,
+            )
+            self._custom_object_api_client = (
+                custom_object_api_client or self._clients.custom_objects_api
+            )
+            self._core_api_client = (
+                core_api_client or self._clients.core_v1_api
+            )
 
     @staticmethod
     def check_name(name):
@@ -118,12 +467,63 @@ class ArgoSubmitter(object):
     def get_core_api_client(self):
         return self._core_api_client
 
-    def submit(self, workflow_yaml, secrets=None):
-        wf_name = (
+    def get_secret_cache(self):
+        if self._secret_cache is None:
+            clients = self._clients
+            if clients is not None and clients.secret_cache is not None:
+                self._secret_cache = clients.secret_cache
+            else:
+                self._secret_cache = SecretCache(
+                    self._core_api_client,
+                    self.namespace,
+                    watch=self.watch_secrets,
+                    watch_factory=self._watch_factory,
+                    call_api=self._call_api,
+                    call_create_api=self._call_create_api,
+                )
+                if (
+                    clients is not None
+                    and self._core_api_client is clients.core_v1_api
+                ):
+                    # Shared with the other submitters of the namespace
+                    clients.secret_cache = self._secret_cache
+        return self._secret_cache
+
+    def _call_api(self, func, *args, **kwargs):
+        return self.retry_policy.call(self._limited(func), *args, **kwargs)
+
+    def _call_create_api(self, func, *args, **kwargs):
+        return self.retry_policy.call_create(
+            self._limited(func), *args, **kwargs
+        )
+
+    def _limited(self, func):
+        def attempt(*args, **kwargs):
+            # Every attempt takes a token, retries included
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            return func(*args, **kwargs)
+
+        return attempt
+
+    @staticmethod
+    def _workflow_name(workflow_yaml):
+        return (
             workflow_yaml["metadata"]["name"]
             if "name" in workflow_yaml["metadata"]
             else workflow_yaml["metadata"]["generateName"]
         )
+
+    def submit(
+        self,
+        workflow_yaml,
+        secrets=None,
+        config_maps=None,
+        workflow_templates=None,
+    ):
+        """Submit a workflow, after creating the secrets, config maps and
+        workflow templates it uses."""
+        wf_name = self._workflow_name(workflow_yaml)
         if self.go_impl:
             resp = self.go_submitter.Submit(
                 self.proto_path.encode("utf-8"),
@@ -133,24 +533,386 @@ class ArgoSubmitter(object):
             logging.info("Response: %s" % resp.decode("utf-8"))
         else:
             if secrets:
-                for secret in secrets:
-                    self._create_secret(secret.to_yaml())
+                for error in self.get_secret_cache().ensure(secrets).values():
+                    if error is not None:
+                        raise error
+            for config_map in config_maps or []:
+                self._create_config_map(config_map)
+            for workflow_template in workflow_templates or []:
+                self._create_workflow_template(workflow_template)
             logging.info("Checking workflow name/generatedName %s" % wf_name)
             self.check_name(wf_name)
-            return self._create_workflow(workflow_yaml)
+            response = self._create_workflow(workflow_yaml)
+            self._own_config_maps(config_maps, response)
+            return response
+
+    def create_workflow_template(
+        self,
+        workflow_template,
+        secrets=None,
+        config_maps=None,
+        workflow_templates=None,
+    ):
+        """Create a named workflow template, after creating the secrets,
+        config maps and workflow templates it uses. An existing template of
+        the same name is replaced, unless its spec is the same."""
+        if self.go_impl:
+            raise ValueError(
+                "Workflow templates are not supported by the Go submitter"
+            )
+        if secrets:
+            for error in self.get_secret_cache().ensure(secrets).values():
+                if error is not None:
+                    raise error
+        for config_map in config_maps or []:
+            self._create_config_map(config_map)
+        for dependency in workflow_templates or []:
+            self._create_workflow_template(dependency)
+        name = workflow_template["metadata"]["name"]
+        self.check_name(name)
+
+        body = _annotate_content_hash(workflow_template)
+        api = self._custom_object_api_client
+        crd = (
+            WorkflowTemplateCRD.GROUP,
+            WorkflowTemplateCRD.VERSION,
+            self.namespace,
+            WorkflowTemplateCRD.PLURAL,
+        )
+        try:
+            response = self._call_create_api(
+                api.create_namespaced_custom_object, *crd, body
+            )
+        except ApiException as e:
+            if e.status != 409:
+                raise
+            response = self._call_api(
+                api.get_namespaced_custom_object, *crd, name
+            )
+            if _same_content(response, body):
+                logging.info("Workflow template %s is up to date" % name)
+            else:
+                body["metadata"]["resourceVersion"] = response["metadata"][
+                    "resourceVersion"
+                ]
+                logging.info("Updating workflow template %s" % name)
+                response = self._call_api(
+                    api.replace_namespaced_custom_object, *crd, name, body
+                )
+        self._own_config_maps(config_maps, response)
+        return response
+
+    def submit_many(
+        self, workflows, secrets=None, max_concurrency=_DEFAULT_MAX_CONCURRENCY
+    ):
+        """Submit a batch of workflows concurrently.
+
+        `workflows` is a list of workflow dicts or of
+        `(workflow_yaml, secrets)` pairs, and `secrets` are shared by all of
+        them. Each distinct secret is created once for the whole batch.
+        Returns one `SubmitResult` per workflow, in the same order; a
+        failure only affects the workflows it belongs to.
+        """
+        if self.go_impl:
+            raise ValueError(
+                "submit_many is not supported by the Go submitter"
+            )
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        batch, batch_secrets = _split_batch(workflows, secrets)
+
+        secret_errors = self.get_secret_cache().ensure(batch_secrets.values())
+        for name, error in secret_errors.items():
+            if error is not None:
+                logging.error("Failed to create secret %s" % name)
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(
+                executor.map(
+                    self._try_submit,
+                    [workflow_yaml for workflow_yaml, _ in batch],
+                    [names for _, names in batch],
+                    [secret_errors] * len(batch),
+                )
+            )
+
+    def list_workflows(
+        self,
+        label_selector=None,
+        field_selector=None,
+        limit=_DEFAULT_PAGE_SIZE,
+    ):
+        """Yield the workflows of the namespace, fetching `limit` of them
+        per request."""
+        kwargs = {}
+        if label_selector is not None:
+            kwargs["label_selector"] = label_selector
+        if field_selector is not None:
+            kwargs["field_selector"] = field_selector
+        for page in _list_pages(
+            functools.partial(
+                self._call_api,
+                self._custom_object_api_client.list_namespaced_custom_object,
+            ),
+            WorkflowCRD.GROUP,
+            WorkflowCRD.VERSION,
+            self.namespace,
+            WorkflowCRD.PLURAL,
+            limit=limit,
+            **kwargs
+        ):
+            for workflow in page["items"]:
+                yield workflow
+
+    def delete_many(
+        self,
+        names=None,
+        label_selector=None,
+        phases=None,
+        older_than=None,
+        max_concurrency=_DEFAULT_MAX_CONCURRENCY,
+        on_progress=None,
+        grace_period_seconds=5,
+        propagation_policy="Background",
+    ):
+        """Delete workflows concurrently.
+
+        Either the given `names` are deleted, or the workflows are listed
+        page by page and the ones matching `label_selector`, one of the
+        `phases` and finished more than `older_than` ago (a timedelta) are
+        deleted. Workflows that are still running are never deleted for
+        their age. `on_progress(name,
+        error)` is called after each deletion. Returns an OrderedDict from
+        name to the error raised when deleting it, or None; workflows that
+        are already gone count as deleted.
+        """
+        if names is None and not (label_selector or phases or older_than):
+            raise ValueError(
+                "Either names or a label selector, phases or age is required"
+            )
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if names is None:
+            # List all the pages before deleting, as deleting while paging
+            # can outlast the continue token of the listing
+            names = list(
+                self._find_workflows(label_selector, phases, older_than)
+            )
+        body = k8s_client.V1DeleteOptions(
+            grace_period_seconds=grace_period_seconds,
+            propagation_policy=propagation_policy,
+        )
+
+        results = {}
+        lock = threading.Lock()
+        # Bound the number of queued deletes, the names may be a listing
+        # of the whole namespace
+        slots = threading.BoundedSemaphore(max_concurrency)
+
+        def delete(name):
+            try:
+                self._call_api(
+                    self._custom_object_api_client.delete_namespaced_custom_object,  # noqa: E501
+                    WorkflowCRD.GROUP,
+                    WorkflowCRD.VERSION,
+                    self.namespace,
+                    WorkflowCRD.PLURAL,
+                    name,
+                    body=body,
+                )
+                error = None
+            except ApiException as e:
+                error = None if e.status == 404 else e
+            except Exception as e:
+                error = e
+            finally:
+                slots.release()
+            with lock:
+                results[name] = error
+                done = len(results)
+            if error is not None:
+                logging.error(
+                    "Failed to delete workflow %s: %s" % (name, error)
+                )
+            if done % 1000 == 0:
+                logging.info("Processed %d workflow deletions" % done)
+            if on_progress is not None:
+                on_progress(name, error)
+
+        found = []
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for name in names:
+                found.append(name)
+                slots.acquire()
+                executor.submit(delete, name)
+        # Report in the order the workflows were found
+        return OrderedDict((name, results[name]) for name in found)
+
+    def _find_workflows(self, label_selector, phases, older_than):
+        phases = None if phases is None else set(phases)
+        deadline = None
+        if older_than is not None:
+            deadline = datetime.datetime.utcnow() - older_than
+        for workflow in self.list_workflows(label_selector=label_selector):
+            status = workflow.get("status") or {}
+            if phases is not None and status.get("phase") not in phases:
+                continue
+            if deadline is not None:
+                # Only finished workflows are aged, from when they finished
+                timestamp = status.get("finishedAt")
+                if not timestamp:
+                    if status.get("phase") not in _FINAL_PHASES:
+                        continue
+                    timestamp = workflow["metadata"].get("creationTimestamp")
+                if not timestamp or (
+                    datetime.datetime.strptime(timestamp, _TIMESTAMP_FORMAT)
+                    > deadline
+                ):
+                    continue
+            yield workflow["metadata"]["name"]
+
+    def wait(self, name, timeout=None, on_transition=None):
+        """Wait for a workflow to finish and return its status."""
+        statuses = self.wait_many([name], timeout, on_transition=on_transition)
+        return statuses[name]
+
+    def wait_many(
+        self, names, timeout=None, label_selector=None, on_transition=None
+    ):
+        """Wait for the given workflows to finish.
+
+        All of them are followed through a single watch, which resumes from
+        the last seen resourceVersion and backs off as `retry_policy` does
+        when the connection fails. A single workflow is watched by name.
+        Every phase transition is logged and passed to
+        `on_transition(name, old_phase, new_phase)`. Returns an OrderedDict
+        from name to the final status, a workflow deleted in the meantime
+        keeps its last status. Raises TimeoutError after `timeout` seconds.
+        """
+        pending = set(names)
+        phases = {}
+        statuses = {}
+        deadline = None if timeout is None else time.time() + timeout
+
+        def observe(event_type, obj):
+            name = obj["metadata"]["name"]
+            if name not in pending:
+                return
+            status = obj.get("status") or {}
+            phase = status.get("phase")
+            if phase != phases.get(name):
+                logging.info(
+                    "Workflow %s: %s -> %s" % (name, phases.get(name), phase)
+                )
+                if on_transition is not None:
+                    on_transition(name, phases.get(name), phase)
+                phases[name] = phase
+            statuses[name] = status
+            if phase in _FINAL_PHASES or event_type == "DELETED":
+                pending.discard(name)
+
+        list_func = (
+            self._custom_object_api_client.list_namespaced_custom_object
+        )
+        args = (
+            WorkflowCRD.GROUP,
+            WorkflowCRD.VERSION,
+            self.namespace,
+            WorkflowCRD.PLURAL,
+        )
+        kwargs = {}
+        if label_selector is not None:
+            kwargs["label_selector"] = label_selector
+        if len(pending) == 1:
+            # Only the events of that workflow, not the whole namespace
+            kwargs["field_selector"] = "metadata.name=%s" % next(iter(pending))
+        resource_version = None
+        attempt = 1
+        while pending:
+            remaining = _WATCH_TIMEOUT_SECONDS
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        "Timed out waiting for workflows: %s"
+                        % ", ".join(sorted(pending))
+                    )
+            try:
+                if resource_version is None:
+                    for page in _list_pages(
+                        functools.partial(self._call_api, list_func),
+                        *args,
+                        **kwargs
+                    ):
+                        for obj in page["items"]:
+                            observe("ADDED", obj)
+                        # All the pages share the resource version
+                        resource_version = page["metadata"]["resourceVersion"]
+                    continue
+                w = self._watch_factory()
+                for event in w.stream(
+                    list_func,
+                    *args,
+                    resource_version=resource_version,
+                    timeout_seconds=max(
+                        1, int(min(remaining, _WATCH_TIMEOUT_SECONDS))
+                    ),
+                    **kwargs
+                ):
+                    obj = event["object"]
+                    if event["type"] == "ERROR":
+                        if obj.get("code") == 410:
+                            # Too old to resume from, list again
+                            resource_version = None
+                            break
+                        raise ApiException(
+                            status=obj.get("code"), reason=obj.get("message")
+                        )
+                    resource_version = obj["metadata"]["resourceVersion"]
+                    observe(event["type"], obj)
+                    if not pending or (
+                        deadline is not None and time.time() >= deadline
+                    ):
+                        w.stop()
+                        break
+                attempt = 1
+                continue
+            except ApiException as e:
+                if e.status == 410:
+                    resource_version = None
+                    continue
+                error = e
+            except Exception as e:
+                error = e
+            logging.warning("Workflow watch failed: %s" % error)
+            time.sleep(min(self.retry_policy.delay(attempt, error), remaining))
+            # The delay is capped at max_backoff long before this, stop
+            # counting so that the backoff cannot overflow
+            attempt = min(attempt + 1, _WATCH_MAX_ATTEMPT)
+        return OrderedDict((name, statuses.get(name)) for name in names)
+
+    def _try_submit(self, workflow_yaml, secret_names, secret_errors):
+        for name in secret_names:
+            if secret_errors[name] is not None:
+                return SubmitResult(workflow_yaml, error=secret_errors[name])
+        try:
+            self.check_name(self._workflow_name(workflow_yaml))
+            response = self._create_workflow(workflow_yaml)
+        except Exception as e:
+            return SubmitResult(workflow_yaml, error=e)
+        return SubmitResult(workflow_yaml, response=response)
 
     def _create_workflow(self, workflow_yaml):
-        yaml_str = pyaml.dump(workflow_yaml)
-        workflow_yaml = yaml.safe_load(yaml_str)
+        workflow_yaml = to_plain_objects(workflow_yaml)
         logging.info("Submitting workflow to Argo")
         try:
-            response = self._custom_object_api_client.create_namespaced_custom_object(  # noqa: E501
+            response = self._call_create_api(
+                self._custom_object_api_client.create_namespaced_custom_object,  # noqa: E501
                 WorkflowCRD.GROUP,
                 WorkflowCRD.VERSION,
                 self.namespace,
-                WorkflowCRD.PLURAL
-                if workflow_yaml["kind"] == WorkflowCRD.KIND
-                else CronWorkflowCRD.PLURAL,
+                _PLURALS[workflow_yaml["kind"]],
                 workflow_yaml,
             )
             logging.info(
@@ -162,9 +924,64 @@ class ArgoSubmitter(object):
             logging.error("Failed to submit workflow")
             raise e
 
-    def _create_secret(self, secret_yaml):
-        yaml_str = pyaml.dump(secret_yaml)
-        secret_yaml = yaml.safe_load(yaml_str)
-        return self._core_api_client.create_namespaced_secret(  # noqa: E501
-            self.namespace, secret_yaml
-        )
+    def _create_workflow_template(self, workflow_template):
+        name = workflow_template["metadata"]["name"]
+        if name in self._workflow_templates:
+            return
+        try:
+            self._call_create_api(
+                self._custom_object_api_client.create_namespaced_custom_object,  # noqa: E501
+                WorkflowTemplateCRD.GROUP,
+                WorkflowTemplateCRD.VERSION,
+                self.namespace,
+                WorkflowTemplateCRD.PLURAL,
+                to_plain_objects(workflow_template),
+            )
+        except ApiException as e:
+            # Workflow templates are named after their content
+            if e.status != 409:
+                raise
+        self._workflow_templates.add(name)
+
+    def _create_config_map(self, config_map):
+        try:
+            self._call_create_api(
+                self._core_api_client.create_namespaced_config_map,
+                self.namespace,
+                to_plain_objects(config_map.to_yaml()),
+            )
+        except ApiException as e:
+            # Config maps are named after their content
+            if e.status != 409:
+                raise
+
+    def _own_config_maps(self, config_maps, owner):
+        """Make the created workflow or workflow template an owner of the
+        config maps it uses, so that they are deleted with it, or with the
+        last one of them using the same content."""
+        if not config_maps:
+            return
+        patches = _owner_patches(owner)
+        for config_map in config_maps:
+            try:
+                self._add_owner(config_map, *patches)
+            except Exception as e:
+                # The workflow exists already, so this is not an error
+                logging.warning(
+                    "Failed to set the owner of config map %s: %s"
+                    % (config_map.name, e)
+                )
+
+    def _add_owner(self, config_map, append, create):
+        patch = self._core_api_client.patch_namespaced_config_map
+        try:
+            self._call_create_api(
+                patch, config_map.name, self.namespace, append
+            )
+        except ApiException as e:
+            # The config map has no owners yet
+            if e.status != 422:
+                raise
+            self._call_create_api(
+                patch, config_map.name, self.namespace, create
+            )
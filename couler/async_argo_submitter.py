@@ -0,0 +1,433 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import logging
+import ssl
+
+from kubernetes.client.rest import ApiException
+
+from couler import client_registry
+from couler.argo_submitter import (
+    _DEFAULT_MAX_CONCURRENCY,
+    _PLURALS,
+    ArgoSubmitter,
+    SubmitResult,
+    _annotate_content_hash,
+    _owner_patches,
+    _same_content,
+    _split_batch,
+)
+from couler.core.constants import WorkflowCRD, WorkflowTemplateCRD
+from couler.core.plain_objects import to_plain_objects
+from couler.retry_policy import RetryPolicy
+
+try:
+    import aiohttp
+
+    _AIOHTTP_INSTALLED = True
+except ImportError:
+    _AIOHTTP_INSTALLED = False
+
+_DEFAULT_CONNECTION_LIMIT = 100
+_JSON_PATCH = "application/json-patch+json"
+
+
+def _dumps(obj):
+    return json.dumps(to_plain_objects(obj))
+
+
+class AsyncArgoSubmitter(object):
+    """A submitter which submits workflows to Argo from asyncio code.
+
+    It talks to the Kubernetes REST API with aiohttp over one connection
+    pool, so that many submissions can be in flight at the same time
+    without blocking the event loop. If `client_configuration` is given,
+    it is used as is instead of loading the kube config. The requests are
+    retried and throttled like those of `ArgoSubmitter`, with
+    `retry_policy` and `rate_limiter`.
+    """
+
+    def __init__(
+        self,
+        namespace="default",
+        config_file=None,
+        context=None,
+        client_configuration=None,
+        persist_config=True,
+        connection_limit=_DEFAULT_CONNECTION_LIMIT,
+        retry_policy=None,
+        rate_limiter=None,
+    ):
+        if not _AIOHTTP_INSTALLED:
+            raise ImportError(
+                "AsyncArgoSubmitter requires aiohttp, "
+                "please install it with `pip install aiohttp`"
+            )
+        self.namespace = namespace
+        logging.info("Async Argo submitter namespace: %s" % self.namespace)
+        if client_configuration is None:
+            client_configuration = client_registry.get_api_client(
+                config_file, context, persist_config=persist_config
+            ).configuration
+        self._configuration = client_configuration
+        self.connection_limit = connection_limit
+        self.retry_policy = (
+            retry_policy if retry_policy is not None else RetryPolicy()
+        )
+        self.rate_limiter = rate_limiter
+        self._session = None
+        # Names of the workflow templates known to exist
+        self._workflow_templates = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        # The session binds to the running event loop, so it is created
+        # on first use rather than in the constructor.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit, ssl=self._ssl_context()
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _ssl_context(self):
+        cfg = self._configuration
+        if not cfg.host.startswith("https"):
+            return None
+        context = ssl.create_default_context(cafile=cfg.ssl_ca_cert)
+        if cfg.cert_file:
+            context.load_cert_chain(cfg.cert_file, cfg.key_file)
+        if not cfg.verify_ssl:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    async def _request(
+        self, method, path, body=None, content_type="application/json"
+    ):
+        attempt = 1
+        while True:
+            # Every attempt takes a token, retries included
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+            try:
+                return await self._send(method, path, body, content_type)
+            except (
+                ApiException,
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+            ) as e:
+                # Only creates may have been processed despite an error,
+                # unless the connection could not even be opened
+                idempotent = method not in ("POST", "PATCH") or isinstance(
+                    e, aiohttp.ClientConnectorError
+                )
+                delay = self.retry_policy.retry_delay(attempt, e, idempotent)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _send(self, method, path, body, content_type):
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": content_type,
+        }
+        for auth in self._configuration.auth_settings().values():
+            if auth["in"] == "header" and auth["value"]:
+                headers[auth["key"]] = auth["value"]
+        url = self._configuration.host.rstrip("/") + path
+        async with self._get_session().request(
+            method, url, data=body, headers=headers
+        ) as resp:
+            text = await resp.text()
+            if resp.status >= 400:
+                e = ApiException(status=resp.status, reason=resp.reason)
+                e.body = text
+                e.headers = resp.headers
+                raise e
+            return json.loads(text) if text else None
+
+    def _objects_path(self, plural):
+        return "/apis/%s/%s/namespaces/%s/%s" % (
+            WorkflowCRD.GROUP,
+            WorkflowCRD.VERSION,
+            self.namespace,
+            plural,
+        )
+
+    async def submit(
+        self,
+        workflow_yaml,
+        secrets=None,
+        config_maps=None,
+        workflow_templates=None,
+    ):
+        wf_name = ArgoSubmitter._workflow_name(workflow_yaml)
+        if secrets:
+            await asyncio.gather(
+                *[self._create_secret(secret.to_yaml()) for secret in secrets]
+            )
+        if config_maps:
+            await asyncio.gather(
+                *[
+                    self._create_config_map(config_map)
+                    for config_map in config_maps
+                ]
+            )
+        if workflow_templates:
+            await asyncio.gather(
+                *[
+                    self._create_workflow_template(workflow_template)
+                    for workflow_template in workflow_templates
+                ]
+            )
+        logging.info("Checking workflow name/generatedName %s" % wf_name)
+        ArgoSubmitter.check_name(wf_name)
+        response = await self._create_workflow(workflow_yaml)
+        await self._own_config_maps(config_maps, response)
+        return response
+
+    async def submit_many(
+        self, workflows, secrets=None, max_concurrency=_DEFAULT_MAX_CONCURRENCY
+    ):
+        """Submit a batch of workflows concurrently.
+
+        Same as `ArgoSubmitter.submit_many`: each distinct secret is created
+        once, and one `SubmitResult` is returned per workflow.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        batch, batch_secrets = _split_batch(workflows, secrets)
+
+        async def create_secret(secret):
+            async with semaphore:
+                try:
+                    await self._create_secret(secret.to_yaml())
+                except Exception as e:
+                    logging.error("Failed to create secret %s" % secret.name)
+                    return e
+                return None
+
+        async def submit(workflow_yaml, secret_names):
+            for name in secret_names:
+                if secret_errors[name] is not None:
+                    return SubmitResult(
+                        workflow_yaml, error=secret_errors[name]
+                    )
+            async with semaphore:
+                try:
+                    ArgoSubmitter.check_name(
+                        ArgoSubmitter._workflow_name(workflow_yaml)
+                    )
+                    response = await self._create_workflow(workflow_yaml)
+                except Exception as e:
+                    return SubmitResult(workflow_yaml, error=e)
+                return SubmitResult(workflow_yaml, response=response)
+
+        errors = await asyncio.gather(
+            *[create_secret(secret) for secret in batch_secrets.values()]
+        )
+        secret_errors = dict(zip(batch_secrets, errors))
+        return list(
+            await asyncio.gather(*[submit(wf, names) for wf, names in batch])
+        )
+
+    async def delete(
+        self, name, grace_period_seconds=5, propagation_policy="Background"
+    ):
+        body = json.dumps(
+            {
+                "gracePeriodSeconds": grace_period_seconds,
+                "propagationPolicy": propagation_policy,
+            }
+        )
+        try:
+            return await self._request(
+                "DELETE",
+                "%s/%s" % (self._objects_path(WorkflowCRD.PLURAL), name),
+                body,
+            )
+        except ApiException as e:
+            raise Exception("Exception when deleting the workflow: %s\n" % e)
+
+    async def get_status(self, name):
+        response = await self._request(
+            "GET", "%s/%s" % (self._objects_path(WorkflowCRD.PLURAL), name)
+        )
+        return response.get("status", {})
+
+    async def _create_workflow(self, workflow_yaml):
+        # Large workflows take a while to serialize, keep that off the loop
+        body = await asyncio.get_event_loop().run_in_executor(
+            None, _dumps, workflow_yaml
+        )
+        plural = _PLURALS[workflow_yaml["kind"]]
+        logging.info("Submitting workflow to Argo")
+        try:
+            response = await self._request(
+                "POST", self._objects_path(plural), body
+            )
+            logging.info(
+                'Workflow %s has been submitted in "%s" namespace!'
+                % (response.get("metadata", {}).get("name"), self.namespace)
+            )
+            return response
+        except Exception as e:
+            logging.error("Failed to submit workflow")
+            raise e
+
+    async def create_workflow_template(
+        self,
+        workflow_template,
+        secrets=None,
+        config_maps=None,
+        workflow_templates=None,
+    ):
+        """Create a named workflow template, after creating the secrets,
+        config maps and workflow templates it uses. An existing template of
+        the same name is replaced, unless its spec is the same."""
+        if secrets:
+            await asyncio.gather(
+                *[self._create_secret(secret.to_yaml()) for secret in secrets]
+            )
+        if config_maps:
+            await asyncio.gather(
+                *[
+                    self._create_config_map(config_map)
+                    for config_map in config_maps
+                ]
+            )
+        if workflow_templates:
+            await asyncio.gather(
+                *[
+                    self._create_workflow_template(dependency)
+                    for dependency in workflow_templates
+                ]
+            )
+        name = workflow_template["metadata"]["name"]
+        ArgoSubmitter.check_name(name)
+
+        body = _annotate_content_hash(workflow_template)
+        path = self._objects_path(WorkflowTemplateCRD.PLURAL)
+        try:
+            response = await self._request("POST", path, json.dumps(body))
+        except ApiException as e:
+            if e.status != 409:
+                raise
+            response = await self._request("GET", "%s/%s" % (path, name))
+            if not _same_content(response, body):
+                body["metadata"]["resourceVersion"] = response["metadata"][
+                    "resourceVersion"
+                ]
+                response = await self._request(
+                    "PUT", "%s/%s" % (path, name), json.dumps(body)
+                )
+        await self._own_config_maps(config_maps, response)
+        return response
+
+    async def _create_workflow_template(self, workflow_template):
+        name = workflow_template["metadata"]["name"]
+        if name in self._workflow_templates:
+            return
+        try:
+            await self._request(
+                "POST",
+                self._objects_path(WorkflowTemplateCRD.PLURAL),
+                _dumps(workflow_template),
+            )
+        except ApiException as e:
+            # Workflow templates are named after their content
+            if e.status != 409:
+                raise
+        self._workflow_templates.add(name)
+
+    async def _create_config_map(self, config_map):
+        try:
+            await self._request(
+                "POST",
+                "/api/v1/namespaces/%s/configmaps" % self.namespace,
+                _dumps(config_map.to_yaml()),
+            )
+        except ApiException as e:
+            # Config maps are named after their content
+            if e.status != 409:
+                raise
+
+    async def _own_config_maps(self, config_maps, owner):
+        """Like `ArgoSubmitter._own_config_maps`."""
+        if not config_maps:
+            return
+        patches = _owner_patches(owner)
+        results = await asyncio.gather(
+            *[
+                self._add_owner(config_map, *patches)
+                for config_map in config_maps
+            ],
+            return_exceptions=True
+        )
+        for config_map, result in zip(config_maps, results):
+            if isinstance(result, Exception):
+                # The workflow exists already, so this is not an error
+                logging.warning(
+                    "Failed to set the owner of config map %s: %s"
+                    % (config_map.name, result)
+                )
+
+    async def _add_owner(self, config_map, append, create):
+        path = "/api/v1/namespaces/%s/configmaps/%s" % (
+            self.namespace,
+            config_map.name,
+        )
+        try:
+            await self._request("PATCH", path, json.dumps(append), _JSON_PATCH)
+        except ApiException as e:
+            # The config map has no owners yet
+            if e.status != 422:
+                raise
+            await self._request("PATCH", path, json.dumps(create), _JSON_PATCH)
+
+    async def _create_secret(self, secret_yaml):
+        path = "/api/v1/namespaces/%s/secrets" % self.namespace
+        try:
+            await self._request("POST", path, _dumps(secret_yaml))
+        except ApiException as e:
+            if e.status != 409:
+                raise
+            # Like ArgoSubmitter, an existing secret with the same content
+            # was created by an earlier submission
+            try:
+                existing = await self._request(
+                    "GET", "%s/%s" % (path, secret_yaml["metadata"]["name"])
+                )
+            except ApiException as read_error:
+                if read_error.status != 403:
+                    raise e
+                # Without the permission to read it, keep the existing one
+                return
+            if (existing.get("data") or {}) != dict(secret_yaml["data"]):
+                raise
@@ -0,0 +1,136 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A process-wide registry of Kubernetes API clients.
+
+The kube config is loaded once per (config file, context) and the
+resulting `ApiClient`, with its HTTP connection pool, is shared by every
+submitter, deletion and status query that uses the same config.
+"""
+
+import logging
+import threading
+
+from kubernetes import client as k8s_client
+from kubernetes import config
+from kubernetes.client import rest
+
+_lock = threading.RLock()
+# (config file, context, client configuration id) -> ApiClient
+_api_clients = {}
+# (config file, context, client configuration id, namespace) -> clients
+_clients = {}
+_pool_size = None
+
+
+class KubernetesClients(object):
+    """The API clients of one namespace, plus the state that the
+    submitters of that namespace share, such as the secret cache."""
+
+    def __init__(self, api_client, namespace):
+        self.api_client = api_client
+        self.namespace = namespace
+        self.custom_objects_api = k8s_client.CustomObjectsApi(api_client)
+        self.core_v1_api = k8s_client.CoreV1Api(api_client)
+        self.secret_cache = None
+
+
+def _key(config_file, context, client_configuration):
+    return (
+        config_file,
+        context,
+        None if client_configuration is None else id(client_configuration),
+    )
+
+
+def get_api_client(
+    config_file=None,
+    context=None,
+    client_configuration=None,
+    persist_config=True,
+):
+    """Return the shared `ApiClient` of the given kube config, loading the
+    config the first time. Falls back to the in-cluster config."""
+    key = _key(config_file, context, client_configuration)
+    with _lock:
+        api_client = _api_clients.get(key)
+        if api_client is not None:
+            return api_client
+        configuration = client_configuration
+        if configuration is None:
+            configuration = k8s_client.Configuration()
+        try:
+            config.load_kube_config(
+                config_file, context, configuration, persist_config
+            )
+            logging.info(
+                "Found local kubernetes config. Initialized with kube_config."
+            )
+        except Exception:
+            logging.info(
+                "Cannot find local k8s config. Trying in-cluster config."
+            )
+            config.load_incluster_config(configuration)
+            logging.info("Initialized with in-cluster config.")
+        # Loading the config used to set the default one, keep doing so
+        # for the code that builds its own clients
+        k8s_client.Configuration.set_default(configuration)
+        if _pool_size is not None:
+            configuration.connection_pool_maxsize = _pool_size
+        api_client = k8s_client.ApiClient(configuration)
+        _api_clients[key] = api_client
+        return api_client
+
+
+def get_clients(
+    namespace="default",
+    config_file=None,
+    context=None,
+    client_configuration=None,
+    persist_config=True,
+):
+    """Return the shared `KubernetesClients` of a namespace."""
+    key = _key(config_file, context, client_configuration) + (namespace,)
+    with _lock:
+        clients = _clients.get(key)
+        if clients is None:
+            clients = KubernetesClients(
+                get_api_client(
+                    config_file, context, client_configuration, persist_config
+                ),
+                namespace,
+            )
+            _clients[key] = clients
+        return clients
+
+
+def set_pool_size(pool_size):
+    """Set the maximum number of HTTP connections kept by each client,
+    for the clients in the registry and the ones created later."""
+    global _pool_size
+    if pool_size < 1:
+        raise ValueError("pool_size must be at least 1")
+    with _lock:
+        _pool_size = pool_size
+        for api_client in _api_clients.values():
+            api_client.configuration.connection_pool_maxsize = pool_size
+            api_client.rest_client = rest.RESTClientObject(
+                api_client.configuration
+            )
+
+
+def clear():
+    """Drop all the clients, the configs are loaded again on next use."""
+    with _lock:
+        _api_clients.clear()
+        _clients.clear()
@@ -39,6 +39,9 @@ def config_workflow(
     cluster_config_file=None,
     cron_config=None,
     service_account=None,
+    intern_templates=None,
+    shared_templates=None,
+    arguments=None,
 ):
     """
     Config some workflow-level information.
@@ -50,9 +53,18 @@ def config_workflow(
     :param cron_config: for cron scheduling
     :param service_account: name of the Kubernetes ServiceAccount which
         runs this workflow
+    :param intern_templates: whether to render identical templates once,
+        e.g. the same container run from several functions
+    :param shared_templates: names of the templates to submit once as
+        WorkflowTemplates referenced with `templateRef`, or the number of
+        steps that have to run a template for it to be submitted so
+    :param arguments: the workflow parameters by name, with their default
+        values, or None for the parameters without one. The templates
+        read them as `{{workflow.parameters.<name>}}`
     :return:
     """
     if name is not None:
+        states.workflow.base_name = name
         states.workflow.name = states._workflow_name_salter(name)
 
     if user_id is not None:
@@ -64,6 +76,19 @@ def config_workflow(
     if time_to_clean is not None:
         states.workflow.clean_ttl = time_to_clean
 
+    if intern_templates is not None:
+        states.workflow.intern_templates = intern_templates
+
+    if shared_templates is not None:
+        states.workflow.shared_templates = shared_templates
+
+    if arguments is not None:
+        for key, value in arguments.items():
+            parameter = OrderedDict({"name": key})
+            if value is not None:
+                parameter["value"] = utils.parameter_value(value)
+            states.workflow.add_parameter(parameter)
+
     if cluster_config_file is not None:
         import os
 
@@ -19,6 +19,17 @@ OVERWRITE_GPU_ENVS = {
     "NVIDIA_DRIVER_CAPABILITIES": "",
 }
 
+# The maximum size of an etcd request is 1.5MiB:
+# https://github.com/etcd-io/etcd/blob/master/Documentation/dev-guide/limit.md#request-size-limit # noqa: E501
+ETCD_REQUEST_SIZE_LIMIT = 1573000
+# The items of a map kept out of the workflow spec are split into chunks
+# of at most this size, each in its own ConfigMap (limited to 1MiB)
+MAP_ITEMS_CHUNK_BYTES = 256 * 1024
+
+# The label of the secrets created by couler, the submitters only list and
+# watch the secrets having it
+COULER_MANAGED_LABEL = "couler/managed"
+
 
 class WorkflowCRD(object):
     PLURAL = "workflows"
@@ -34,6 +45,11 @@ class CronWorkflowCRD(WorkflowCRD):
     KIND = "CronWorkflow"
 
 
+class WorkflowTemplateCRD(WorkflowCRD):
+    PLURAL = "workflowtemplates"
+    KIND = "WorkflowTemplate"
+
+
 class ImagePullPolicy(Enum):
     IfNotPresent = "IfNotPresent"
     Always = "Always"
@@ -0,0 +1,94 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Convert rendered workflows into the plain objects sent to the API."""
+
+import functools
+import io
+from collections import OrderedDict
+
+import pyaml
+import yaml
+
+# The number of strings whose plain value is cached by `to_plain_objects()`.
+_SCALAR_CACHE_SIZE = 4096
+_STR_TAG = "tag:yaml.org,2002:str"
+_resolver = yaml.resolver.Resolver()
+_emitter = yaml.emitter.Emitter(io.StringIO(), allow_unicode=True)
+
+
+@functools.lru_cache(maxsize=_SCALAR_CACHE_SIZE)
+def _load_str(value, is_key=False):
+    """Return what `value` becomes after a pyaml dump and a yaml load.
+
+    pyaml writes short strings without spaces as plain scalars, so e.g.
+    '"{{inputs.parameters.p}}"' comes back without the quotes and "123"
+    comes back as an int. Only those strings need the slow path.
+    """
+    if (
+        "\n" in value
+        or " " in value
+        or value in ("", "-")
+        or value[0] in "!&*["
+        or "#" in value
+        or (value.endswith(":") and not is_key)
+    ):
+        # pyaml quotes or uses a block style, which round trips as-is
+        return value
+    if (
+        _emitter.analyze_scalar(value).allow_block_plain
+        and _resolver.resolve(yaml.ScalarNode, value, (True, False))
+        == _STR_TAG
+    ):
+        return value
+    if is_key:
+        return next(iter(yaml.safe_load(pyaml.dump({value: None}))))
+    return yaml.safe_load(pyaml.dump([value]))[0]
+
+
+def to_plain_objects(obj, is_key=False):
+    """Convert a workflow or secret into plain dicts and lists that can be
+    sent to the Kubernetes API.
+
+    The result is the same as dumping the object with `pyaml.dump` and
+    loading it back with `yaml.safe_load`, but it takes a single walk over
+    the object: OrderedDicts keep their order, the keys of other dicts are
+    sorted like pyaml does, tuples, sets and array-likes become lists, and
+    strings are only re-parsed when pyaml would write them unquoted.
+    """
+    if obj is None or type(obj) in (bool, int, float):
+        return obj
+    if type(obj) is str:
+        return _load_str(obj, is_key)
+    if isinstance(obj, OrderedDict):
+        items = obj.items()
+    elif isinstance(obj, dict):
+        items = list(obj.items())
+        try:
+            items = sorted(items)
+        except TypeError:
+            pass
+    elif isinstance(obj, tuple) and hasattr(obj, "_asdict"):
+        # namedtuple
+        items = obj._asdict().items()
+    elif isinstance(obj, (list, tuple, set)):
+        return [to_plain_objects(v) for v in obj]
+    elif callable(getattr(obj, "tolist", None)):
+        return to_plain_objects(obj.tolist())
+    elif isinstance(obj, (str, bytes)):
+        return _load_str(str(obj), is_key)
+    else:
+        return obj
+    return {
+        to_plain_objects(k, is_key=True): to_plain_objects(v) for k, v in items
+    }
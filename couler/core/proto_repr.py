@@ -18,6 +18,8 @@ from couler.core.templates.output import OutputArtifact, OutputJob
 from couler.proto import couler_pb2
 
 DEFAULT_WORKFLOW = None
+# Step name -> index of its concurrent step group in DEFAULT_WORKFLOW.steps
+STEP_INDEX = {}
 STEP_ID = 0
 
 
@@ -31,8 +33,10 @@ def get_default_proto_workflow():
 
 def cleanup_proto_workflow():
     global DEFAULT_WORKFLOW
+    global STEP_INDEX
     global STEP_ID
     DEFAULT_WORKFLOW = None
+    STEP_INDEX = {}
     STEP_ID = 0
 
 
@@ -176,6 +180,7 @@ def step_repr(
         concurrent_step = wf.steps.add()
         inner_step = concurrent_step.steps.add()
         inner_step.CopyFrom(pb_step)
+        STEP_INDEX.setdefault(pb_step.name, len(wf.steps) - 1)
     return pb_step
 
 
@@ -189,15 +194,20 @@ def _add_env_to_step(pb_step, env):
 
 
 def add_deps_to_step(step_name):
-    dag_task = states.workflow.get_dag_task(step_name)
-    deps = dag_task.get("dependencies") if dag_task is not None else None
-    if deps is not None:
-        proto_wf = get_default_proto_workflow()
-        step_id = None
-        for i, step in enumerate(proto_wf.steps):
-            if step.steps[0].name == step_name:
-                step_id = i
-                break
+    add_deps_to_steps([step_name])
+
+
+def add_deps_to_steps(step_names):
+    """Attach the DAG dependencies of the given steps to their protobuf
+    representation. Steps are looked up by name in O(1).
+    """
+    proto_wf = get_default_proto_workflow()
+    for step_name in step_names:
+        dag_task = states.workflow.get_dag_task(step_name)
+        deps = dag_task.get("dependencies") if dag_task is not None else None
+        if deps is None:
+            continue
+        step_id = STEP_INDEX.get(step_name)
         if step_id is not None:
             proto_wf.steps[step_id].steps[0].dependencies.extend(deps)
 
@@ -59,6 +59,7 @@ def run_script(
     working_dir=None,
     node_selector=None,
     cache=None,
+    source_from="inline",
 ):
     """
     Generate an Argo script template.  For example,
@@ -79,10 +80,18 @@ def run_script(
     :param pool:
     :param enable_ulogfs:
     :param daemon:
+    :param source_from: either "inline" to embed the source in the
+        template, or "configmap" to store it in a ConfigMap named after its
+        content, created once by the submitter and mounted into the step.
+        Argo does not substitute the parameters of a mounted source.
     :return:
     """
     if source is None:
         raise ValueError("Source must be provided")
+    if source_from not in ("inline", "configmap"):
+        raise ValueError(
+            "source_from should be either 'inline' or 'configmap'"
+        )
     func_name, caller_line = utils.invocation_location()
     func_name = (
         utils.argo_safe_name(step_name) if step_name is not None else func_name
@@ -160,6 +169,7 @@ def run_script(
             working_dir=working_dir,
             node_selector=node_selector,
             cache=cache,
+            source_from=source_from,
         )
         states.workflow.add_template(template)
 
@@ -168,9 +178,9 @@ def run_script(
     )
 
     # TODO: need to switch to use field `output` directly
-    step_templ = states.workflow.get_template(func_name)
-    _output = step_templ.to_dict().get("outputs", None)
-    _input = step_templ.to_dict().get("inputs", None)
+    step_templ = states.workflow.get_template(func_name).to_dict()
+    _output = step_templ.get("outputs", None)
+    _input = step_templ.get("inputs", None)
     rets = _script_output(step_name, func_name, _output)
     states._steps_outputs[step_name] = rets
 
@@ -323,9 +333,9 @@ def run_container(
     )
 
     # TODO: need to switch to use field `output` directly
-    step_templ = states.workflow.get_template(func_name)
-    _output = step_templ.to_dict().get("outputs", None)
-    _input = step_templ.to_dict().get("inputs", None)
+    step_templ = states.workflow.get_template(func_name).to_dict()
+    _output = step_templ.get("outputs", None)
+    _input = step_templ.get("inputs", None)
 
     rets = _container_output(step_name, func_name, _output)
     states._steps_outputs[step_name] = rets
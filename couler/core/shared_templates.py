@@ -0,0 +1,162 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Move the templates shared by workflows into WorkflowTemplates.
+
+Each shared template becomes a WorkflowTemplate named after its content,
+and the steps and tasks running it refer to it with `templateRef`. The
+submitter creates a WorkflowTemplate once, so a workflow submitted again
+only sends the templates that changed.
+"""
+
+import hashlib
+import json
+import re
+from collections import Counter, OrderedDict
+
+from couler.core.constants import WorkflowCRD, WorkflowTemplateCRD
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-z0-9-]+")
+# The templates running other templates, which stay in the workflow
+_CALLER_FIELDS = ("steps", "dag")
+
+
+def extract_shared_templates(workflow, shared):
+    """Move the shared templates of the workflow into WorkflowTemplates.
+
+    `shared` is a list of template names, or the number of steps and tasks
+    that have to run a template for it to be shared. Returns the workflow
+    to submit and the WorkflowTemplates it refers to, which have to be
+    created first. Step and DAG templates are not shared.
+    """
+    if not shared:
+        return workflow, []
+    spec = _workflow_spec(workflow)
+    templates = spec["templates"]
+    if isinstance(shared, int) and not isinstance(shared, bool):
+        uses = _template_uses(templates)
+        names = {name for name, n in uses.items() if n >= shared}
+    else:
+        names = set(shared)
+        known = {t["name"] for t in templates if not _is_caller(t)}
+        unknown = names - known
+        if unknown:
+            raise ValueError(
+                "No container, script or resource templates named %s"
+                % ", ".join(sorted(unknown))
+            )
+
+    refs = OrderedDict()
+    kept = []
+    workflow_templates = []
+    for template in templates:
+        if template["name"] in names and not _is_caller(template):
+            workflow_template = _workflow_template(template)
+            workflow_templates.append(workflow_template)
+            refs[template["name"]] = OrderedDict(
+                [
+                    ("name", workflow_template["metadata"]["name"]),
+                    ("template", template["name"]),
+                ]
+            )
+        else:
+            kept.append(template)
+    if not refs:
+        return workflow, []
+
+    spec = OrderedDict(spec)
+    spec["templates"] = [_refer_template(t, refs) for t in kept]
+    workflow = OrderedDict(workflow)
+    if workflow["kind"] == WorkflowCRD.KIND:
+        workflow["spec"] = spec
+    else:
+        workflow["spec"] = OrderedDict(workflow["spec"])
+        workflow["spec"]["workflowSpec"] = spec
+    return workflow, workflow_templates
+
+
+def _workflow_spec(workflow):
+    if workflow["kind"] == WorkflowCRD.KIND:
+        return workflow["spec"]
+    # A CronWorkflow
+    return workflow["spec"]["workflowSpec"]
+
+
+def _is_caller(template):
+    return any(field in template for field in _CALLER_FIELDS)
+
+
+def _callees(template):
+    """Return the steps or tasks of the template."""
+    if template.get("steps"):
+        return [
+            step
+            for group in template["steps"]
+            for step in (group if isinstance(group, list) else [group])
+        ]
+    if template.get("dag"):
+        return template["dag"]["tasks"]
+    return []
+
+
+def _template_uses(templates):
+    uses = Counter()
+    for template in templates:
+        for step in _callees(template):
+            uses[step.get("template")] += 1
+    return uses
+
+
+def _workflow_template(template):
+    digest = hashlib.sha1(
+        json.dumps(template, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:10]
+    prefix = _INVALID_NAME_CHARS.sub("-", template["name"].lower())
+    prefix = prefix[: WorkflowCRD.NAME_MAX_LENGTH - 11].strip("-")
+    return OrderedDict(
+        [
+            ("apiVersion", "argoproj.io/v1alpha1"),
+            ("kind", WorkflowTemplateCRD.KIND),
+            ("metadata", {"name": "%s-%s" % (prefix, digest)}),
+            ("spec", {"templates": [template]}),
+        ]
+    )
+
+
+def _refer(step, refs):
+    """Return the step running the shared template with `templateRef`."""
+    if not isinstance(step, dict) or step.get("template") not in refs:
+        return step
+    return OrderedDict(
+        ("templateRef", refs[value]) if key == "template" else (key, value)
+        for key, value in step.items()
+    )
+
+
+def _refer_template(template, refs):
+    if not _is_caller(template):
+        return template
+    template = OrderedDict(template)
+    if template.get("steps"):
+        template["steps"] = [
+            [_refer(step, refs) for step in group]
+            if isinstance(group, list)
+            else _refer(group, refs)
+            for group in template["steps"]
+        ]
+    if template.get("dag"):
+        template["dag"] = dict(
+            template["dag"],
+            tasks=[_refer(task, refs) for task in template["dag"]["tasks"]],
+        )
+    return template
@@ -69,6 +69,8 @@ _exit_handler_enable = False
 # step output results
 _steps_outputs: OrderedDict = OrderedDict()
 _secrets: dict = {}
+# config maps created along with the workflow, e.g. the items of a map
+_config_maps: OrderedDict = OrderedDict()
 # for passing the artifact implicitly
 _outputs_tmp = None
 # print yaml at exit
@@ -91,9 +93,10 @@ def get_secret(name: str):
 def _cleanup():
     """Cleanup the cached fields, just used for unit test.
     """
-    global _secrets, _update_steps_lock, _dag_caller_line, _upstream_dag_task, _upstream_dag_depends_logic, workflow, _steps_outputs  # noqa: E501
+    global _secrets, _config_maps, _update_steps_lock, _dag_caller_line, _upstream_dag_task, _upstream_dag_depends_logic, workflow, _steps_outputs  # noqa: E501
     global _exit_handler_enable, _when_prefix, _when_task, _while_steps, _concurrent_func_line  # noqa: E501
     _secrets = {}
+    _config_maps = OrderedDict()
     _update_steps_lock = True
     _dag_caller_line = None
     _upstream_dag_task = None
@@ -110,18 +110,13 @@ def _update_dag_tasks(
     if states._exit_handler_enable:
         if states._when_prefix is not None:
             step.when = states._when_prefix
-        if function_id in states.workflow.exit_handler_step:
-            states.workflow.exit_handler_step.get(function_id).append(
-                step.to_dict()
-            )
-        else:
-            states.workflow.exit_handler_step[function_id] = [step.to_dict()]
+        states.workflow.add_exit_handler_step(function_id, step.to_dict())
     elif states._when_prefix is not None:
         step.when = states._when_prefix
         if step.name not in states.workflow.dag_tasks.keys():
             step_spec = step.to_dict()
             step_spec["dependencies"] = [states._when_task]
-            states.workflow.dag_tasks[step.name] = step_spec
+            states.workflow.update_dag_task(step.name, step_spec)
     else:
         states.workflow.update_dag_task(function_id, task_template)
 
@@ -184,14 +179,9 @@ def _update_steps(function_name, caller_line, args=None, template_name=None):
                 else:
                     states._sub_steps[function_id] = [step.to_dict()]
             elif states._exit_handler_enable is True:
-                if function_id in states.workflow.exit_handler_step:
-                    states.workflow.exit_handler_step.get(function_id).append(
-                        step.to_dict()
-                    )
-                else:
-                    states.workflow.exit_handler_step[function_id] = [
-                        step.to_dict()
-                    ]
+                states.workflow.add_exit_handler_step(
+                    function_id, step.to_dict()
+                )
             else:
                 states.workflow.add_step(function_id, step)
 
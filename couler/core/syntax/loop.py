@@ -11,24 +11,74 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import inspect
+import json
+import re
+import shlex
 
 import pyaml
 import yaml
 
-from couler.core import states
-from couler.core.templates import Step, output
+from couler.core import states, utils
+from couler.core.constants import MAP_ITEMS_CHUNK_BYTES
+from couler.core.plain_objects import to_plain_objects
+from couler.core.templates import Artifact, ConfigMap, Container, Step, output
 
+_ITEMS_KEY = "items"
+_INPUT_PARAMETER = re.compile(r"{{\s*inputs\.parameters\.([\w-]+)\s*}}")
+# Where a batch writes the source of a script template for each item
+_BATCH_SOURCE_PATH = "/tmp/couler-batch-source"
 
-def map(function, input_list):
+
+def map(
+    function,
+    input_list,
+    items_from="inline",
+    max_chunk_bytes=MAP_ITEMS_CHUNK_BYTES,
+    batch_size=None,
+    batch_duration=None,
+    item_duration=None,
+):
     """
     map operation of Couler
+
+    With `items_from="inline"` the items are listed in the workflow spec
+    with `withItems`. With `items_from="configmap"` they are stored in
+    ConfigMaps created by the submitter and fanned out with `withParam`,
+    so that a large input does not exceed the size limit of the workflow.
+    The items are then split into chunks of at most `max_chunk_bytes` of
+    JSON, each fanned out by its own step of the same step group, and the
+    list of these steps is returned if there is more than one.
+
+    With `batch_size`, or `batch_duration` and the estimated `item_duration`
+    in seconds, the items are grouped in batches that each run in a single
+    pod, which runs the command of the template once per item. The loop
+    over the items is in the batch template, and each batch only passes
+    the values of its items. The output parameter `o` of item `i` of a
+    batch is then its output `o-i`.
+
+    `input_list` is a list or any iterable of items, a NumPy array, or a
+    dict of equal-length columns (lists or arrays) keyed by the keyword
+    arguments of `function`. Tuple items, and the rows of a 2-D array, are
+    passed to `function` as positional arguments. The values of a row are
+    the input parameters of the template, in order, and the columns are
+    ordered like the arguments of `function`. The items of columns are
+    built in bulk as the JSON of `withParam`, without a dict per item.
     """
+    if items_from not in ("inline", "configmap"):
+        raise ValueError("items_from should be either 'inline' or 'configmap'")
+    rows, columns = _rows(function, input_list)
+    if not rows:
+        raise ValueError("input_list is empty")
     # Enforce the function to run and lock to add into step
     if callable(function):
         states._update_steps_lock = False
-        # TODO (terrytangyuan): Support functions with multiple arguments.
-        para = input_list[0]
-        inner = function(para)
+        if columns is not None:
+            inner = function(**dict(zip(columns, rows[0])))
+        elif isinstance(rows[0], tuple):
+            inner = function(*rows[0])
+        else:
+            inner = function(rows[0])
         if inner is None:
             raise SyntaxError("require function return value")
         states._update_steps_lock = True
@@ -56,7 +106,7 @@ def map(function, input_list):
         function_template = states.workflow.get_template(template_name)
         function_template.manifest = pyaml.dump(manifest_dict)
         # Append this items parameter to input parameters in the template
-        function_template.args.append(items_param_dict)
+        function_template.args = function_template.args + [items_param_dict]
         states.workflow.add_template(function_template)
         input_parameters = [items_param_dict]
     else:
@@ -72,19 +122,309 @@ def map(function, input_list):
 
     inner_step.arguments = {"parameters": parameters}
 
-    with_items = []
-    for para_values in input_list:
-        item = {}
-        if not isinstance(para_values, list):
-            para_values = [para_values]
+    names = [para_name["name"] for para_name in input_parameters]
+    rows = _parameter_rows(rows, names)
+
+    if batch_duration is not None:
+        if not item_duration:
+            raise ValueError("item_duration is required with batch_duration")
+        batch_size = max(1, int(batch_duration // item_duration))
+    if batch_size is not None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if "resource" in function_template_dict:
+            raise ValueError("Resource templates cannot run in batches")
+        batch_template = _batch_template(function_template, names, batch_size)
+        states.workflow.add_template(batch_template)
+        batch_param_name = utils.input_parameter_name(batch_template.name, 0)
+        inner_step.template = batch_template.name
+        inner_step.arguments = {
+            "parameters": [
+                {
+                    "name": batch_param_name,
+                    "value": '"{{item.%s}}"' % batch_param_name,
+                }
+            ]
+        }
+        # Each batch only passes the values of its items
+        rows = [
+            (
+                " ".join(
+                    shlex.quote(utils.parameter_value(value))
+                    for row in rows[i : i + batch_size]  # noqa: E203
+                    for value in row
+                ),
+            )
+            for i in range(0, len(rows), batch_size)
+        ]
+        names = [batch_param_name]
+        columns = None
+        template_name = batch_template.name
+
+    if items_from == "inline":
+        if columns is None:
+            inner_step.with_items = [dict(zip(names, row)) for row in rows]
+        else:
+            inner_step.with_param = _items_json(_encode_items(rows, names))
+        states.workflow.add_step(inner_dict["id"], inner_step)
+        return inner_step
+
+    chunks = _chunk_items(_encode_items(rows, names), max_chunk_bytes)
+    chunk_steps = []
+    for i, chunk in enumerate(chunks):
+        if len(chunks) == 1:
+            step = inner_step
+        else:
+            step = Step(
+                name="%s-%d" % (inner_dict["id"], i),
+                template=template_name,
+                arguments=inner_step.arguments,
+            )
+        config_map = ConfigMap({_ITEMS_KEY: _items_json(chunk)})
+        states._config_maps.setdefault(config_map.name, config_map)
+        items_param_name = "%s-items" % step.name
+        states.workflow.add_parameter(
+            {
+                "name": items_param_name,
+                "valueFrom": config_map.key_ref(_ITEMS_KEY),
+            }
+        )
+        step.with_param = '"{{workflow.parameters.%s}}"' % items_param_name
+        states.workflow.add_step(inner_dict["id"], step)
+        chunk_steps.append(step)
+
+    return chunk_steps[0] if len(chunk_steps) == 1 else chunk_steps
+
+
+def _to_list(values):
+    # NumPy arrays convert to lists of plain Python values in one go
+    if hasattr(values, "tolist"):
+        return values.tolist()
+    return list(values)
+
+
+def _rows(function, input_list):
+    """Return the rows of the input, and the names of its columns, in the
+    order of the arguments of `function`, if it is a dict of columns."""
+    if isinstance(input_list, dict):
+        names = _argument_names(function, input_list)
+        columns = [_to_list(input_list[name]) for name in names]
+        if len({len(column) for column in columns}) > 1:
+            raise ValueError("The columns should have the same length")
+        return list(zip(*columns)), names
+    if getattr(input_list, "ndim", 1) > 1:
+        return [tuple(row) for row in input_list.tolist()], None
+    return _to_list(input_list), None
+
+
+def _argument_names(function, columns):
+    """Return the names of the columns in the order of the arguments of
+    the function they are passed to."""
+    try:
+        parameters = inspect.signature(function).parameters.values()
+    except (TypeError, ValueError):
+        # No signature, e.g. of a builtin
+        return list(columns)
+    names = [
+        p.name
+        for p in parameters
+        if p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)
+    ]
+    missing = [
+        p.name
+        for p in parameters
+        if p.name not in columns
+        and p.default is p.empty
+        and p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)
+    ]
+    if missing:
+        raise ValueError("No columns for arguments %s" % ", ".join(missing))
+    unknown = [name for name in columns if name not in names]
+    if unknown and not any(p.kind == p.VAR_KEYWORD for p in parameters):
+        raise ValueError("No arguments for columns %s" % ", ".join(unknown))
+    return [name for name in names if name in columns] + unknown
+
+
+def _parameter_rows(rows, names):
+    """Return the rows as tuples of the values of the parameters `names`,
+    in order."""
+    if len(names) == 1 and not any(
+        isinstance(row, (list, tuple)) for row in rows
+    ):
+        return [(row,) for row in rows]
+    rows = [
+        row
+        if isinstance(row, tuple)
+        else tuple(row)
+        if isinstance(row, list)
+        else (row,)
+        for row in rows
+    ]
+    lengths = {len(row) for row in rows}
+    if min(lengths) < len(names):
+        row = next(row for row in rows if len(row) < len(names))
+        raise ValueError(
+            "%d values are required, got %d: %s" % (len(names), len(row), row)
+        )
+    if max(lengths) > len(names):
+        rows = [row[: len(names)] for row in rows]
+    return rows
+
+
+def _encode_items(rows, names):
+    """Return the JSON of the items of the rows, each the same as
+    `json.dumps(dict(zip(names, row)))`, encoded a column at a time."""
+    columns = []
+    for name, column in zip(names, zip(*rows)):
+        key = "%s: " % json.dumps(name)
+        columns.append([key + value for value in _encode_column(column)])
+    return ["{%s}" % ", ".join(values) for values in zip(*columns)]
+
+
+def _encode_column(column):
+    """Return the JSON of each value of the column."""
+    # Encode the column in a single call, with a separator that escaped
+    # JSON cannot contain. The values holding lists or dicts of several
+    # elements get separators of their own, and are encoded one by one.
+    values = json.dumps(column, separators=("\0", ": "))[1:-1].split("\0")
+    if len(values) == len(column):
+        return values
+    return [json.dumps(value) for value in column]
+
+
+def _items_json(items):
+    # The JSON list of the JSON items
+    return "[%s]" % ", ".join(items)
+
+
+def _output_paths(template_dict):
+    outputs = template_dict.get("outputs") or {}
+    if outputs.get("artifacts"):
+        raise ValueError(
+            "Templates with output artifacts cannot run in batches"
+        )
+    return [
+        (o["name"], o["valueFrom"]["path"])
+        for o in outputs.get("parameters") or []
+    ]
 
-        for j in range(len(input_parameters)):
-            para_name = input_parameters[j]["name"]
-            item[para_name] = para_values[j]
 
-        with_items.append(item)
+def _batch_template(template, names, batch_size):
+    """Return a container template running a batch of items, the values
+    of which are its only input parameter."""
+    if not isinstance(template, Container):
+        raise ValueError(
+            "Only container and script templates can run in batches"
+        )
+    if not names:
+        raise ValueError(
+            "Templates without input parameters cannot run in batches"
+        )
+    # What Argo receives once the workflow is dumped
+    template_dict = to_plain_objects(template.to_dict())
+    outputs = []
+    for name, path in _output_paths(template_dict):
+        for i in range(batch_size):
+            artifact = Artifact(path="%s.%d" % (path, i), type="parameters")
+            artifact.id = "%s-%d" % (name, i)
+            outputs.append(artifact)
+    return Container(
+        name="%s-batch" % template.name,
+        image=template.image,
+        command=["sh", "-c", _batch_script(template_dict, names, batch_size)],
+        args=["batch"],
+        env=template.env,
+        env_from=template.env_from,
+        secret=template.secret,
+        resources=template.resources,
+        image_pull_policy=template.image_pull_policy,
+        retry=template.retry,
+        timeout=template.timeout,
+        pool=template.pool,
+        output=outputs or None,
+        input=template.input,
+        enable_ulogfs=template.enable_ulogfs,
+        volume_mounts=template.volume_mounts,
+        working_dir=template.working_dir,
+        node_selector=template.node_selector,
+        volumes=template.volumes,
+    )
+
+
+def _shell_word(value, variables):
+    """Return the shell word of the value, with its input parameters
+    replaced by the shell variables holding their values."""
+    value = str(value)
+    parts = []
+    position = 0
+    for match in _INPUT_PARAMETER.finditer(value):
+        variable = variables.get(match.group(1))
+        if variable is None:
+            continue
+        if match.start() > position:
+            literal = value[position : match.start()]  # noqa: E203
+            parts.append(shlex.quote(literal))
+        parts.append('"$%s"' % variable)
+        position = match.end()
+    if position < len(value) or not parts:
+        parts.append(shlex.quote(value[position:]))
+    return "".join(parts)
+
+
+def _batch_script(template_dict, names, batch_size):
+    """Return the shell script running the template once per item of a
+    batch. The script gets the values of the items, in the order of the
+    input parameters `names`, as shell words in `$0`."""
+    outputs = _output_paths(template_dict)
+    variables = {name: "COULER_ITEM_%d" % i for i, name in enumerate(names)}
+    lines = ["set -e"]
+    if "script" in template_dict:
+        script = template_dict["script"]
+        lines.extend(
+            [
+                "couler_source() {",
+                "printf '%%s' %s" % _shell_word(script["source"], variables),
+                "}",
+            ]
+        )
+        # Argo passes the source file after the arguments
+        argv = (
+            script["command"] + script.get("args", []) + [_BATCH_SOURCE_PATH]
+        )
+    else:
+        container = template_dict["container"]
+        argv = container["command"] + container.get("args", [])
+    lines.extend(['eval "set -- $0"', "i=0", "while [ $# -gt 0 ]; do"])
+    lines.extend(
+        '%s="$%d"' % (variables[name], i + 1) for i, name in enumerate(names)
+    )
+    lines.append("shift %d" % len(names))
+    if "script" in template_dict:
+        lines.append("couler_source > %s" % _BATCH_SOURCE_PATH)
+    lines.append(" ".join(_shell_word(arg, variables) for arg in argv))
+    for _, path in outputs:
+        lines.append("mv -f %s %s.$i" % (shlex.quote(path), shlex.quote(path)))
+    lines.extend(["i=$((i + 1))", "done"])
+    if outputs:
+        # The last batch may be short, its missing outputs are empty
+        lines.append("while [ $i -lt %d ]; do" % batch_size)
+        lines.extend(": > %s.$i" % shlex.quote(path) for _, path in outputs)
+        lines.extend(["i=$((i + 1))", "done"])
+    return "\n".join(lines) + "\n"
 
-    inner_step.with_items = with_items
-    states.workflow.add_step(inner_dict["id"], inner_step)
 
-    return inner_step
+def _chunk_items(items, max_chunk_bytes):
+    """Split the JSON encoded items into lists whose JSON is at most
+    max_chunk_bytes of UTF-8, an item larger than that gets a list of its
+    own."""
+    chunks = [[]]
+    size = 2
+    for item in items:
+        # The item plus the separator
+        item_size = len(item.encode("utf-8")) + 2
+        if chunks[-1] and size + item_size > max_chunk_bytes:
+            chunks.append([])
+            size = 2
+        chunks[-1].append(item)
+        size += item_size
+    return chunks
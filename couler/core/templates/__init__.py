@@ -19,6 +19,7 @@ from couler.core.templates.artifact import (  # noqa: F401
     TypedArtifact,
 )
 from couler.core.templates.cache import Cache  # noqa: F401
+from couler.core.templates.config_map import ConfigMap  # noqa: F401
 from couler.core.templates.container import Container  # noqa: F401
 from couler.core.templates.job import Job  # noqa: F401
 from couler.core.templates.output import (  # noqa: F401
@@ -0,0 +1,55 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+from collections import OrderedDict
+
+
+class ConfigMap(object):
+    """Data that a workflow reads at runtime instead of carrying it in its
+    spec. It is created by the submitter in the namespace of the workflow.
+    """
+
+    def __init__(self, data, name=None):
+
+        if not isinstance(data, dict):
+            raise TypeError("The config map data is required to be a dict")
+        if not data:
+            raise ValueError("The config map data is empty")
+
+        # Named after the content, so the same data is created once
+        if name is None:
+            cypher_md5 = hashlib.md5(
+                json.dumps(data, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+            self.name = "couler-%s" % cypher_md5
+        else:
+            self.name = name
+
+        self.data = data
+
+    def to_yaml(self):
+        """Covert the config map to a ConfigMap specification."""
+        return OrderedDict(
+            {
+                "apiVersion": "v1",
+                "kind": "ConfigMap",
+                "metadata": {"name": self.name},
+                "data": dict(self.data),
+            }
+        )
+
+    def key_ref(self, key):
+        """Return the `valueFrom` of a parameter reading the given key."""
+        return {"configMapKeyRef": {"name": self.name, "key": key}}
@@ -77,8 +77,11 @@ class Container(Template):
     def get_volume_mounts(self):
         return self.volume_mounts
 
-    def to_dict(self):
-        template = Template.to_dict(self)
+    def _render_key(self):
+        return states._overwrite_nvidia_gpu_envs
+
+    def _to_dict(self):
+        template = Template._to_dict(self)
         # Inputs
         parameters = []
         if self.args is not None:
@@ -47,8 +47,8 @@ class Job(Template):
         self.success_condition = success_condition
         self.failure_condition = failure_condition
 
-    def to_dict(self):
-        template = Template.to_dict(self)
+    def _to_dict(self):
+        template = Template._to_dict(self)
         if utils.non_empty(self.args):
             template["inputs"] = {"parameters": self.args}
         template["resource"] = self.resource_dict()
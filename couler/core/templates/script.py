@@ -16,8 +16,13 @@ from collections import OrderedDict
 
 from couler.core import states, utils
 from couler.core.constants import OVERWRITE_GPU_ENVS
+from couler.core.templates.config_map import ConfigMap
 from couler.core.templates.container import Container
 from couler.core.templates.secret import Secret
+from couler.core.templates.volume import ConfigMapVolume, VolumeMount
+
+_SOURCE_KEY = "source"
+_SOURCE_MOUNT_PATH = "/couler/script"
 
 
 class Script(Container):
@@ -44,6 +49,7 @@ class Script(Container):
         node_selector=None,
         volumes=None,
         cache=None,
+        source_from="inline",
     ):
         Container.__init__(
             self,
@@ -75,9 +81,43 @@ class Script(Container):
         self.secret = secret
         self.resources = resources
         self.image_pull_policy = image_pull_policy
+        # With `source_from="configmap"` the source is stored in a config
+        # map mounted into the step, and the template runs it from there
+        self.config_map = None
+        if source_from == "configmap":
+            self._store_source()
 
-    def to_dict(self):
-        template = Container.to_dict(self)
+    def __setattr__(self, name, value):
+        # The source code is extracted again once it is needed
+        if name in ("source", "command"):
+            self.__dict__.pop("_source_code", None)
+        Container.__setattr__(self, name, value)
+        if (
+            name in ("source", "command")
+            and self.__dict__.get("config_map") is not None
+        ):
+            self._store_source()
+
+    def _store_source(self):
+        """Store the current source in a config map of the workflow, and
+        mount it into the step instead of the previous one."""
+        previous = self.config_map
+        self.config_map = ConfigMap({_SOURCE_KEY: self.source_code()})
+        volume_mounts = [
+            mount
+            for mount in self.volume_mounts or []
+            if previous is None or mount.name != previous.name
+        ]
+        self.volume_mounts = volume_mounts + [
+            VolumeMount(self.config_map.name, _SOURCE_MOUNT_PATH)
+        ]
+        states._config_maps.setdefault(self.config_map.name, self.config_map)
+        states.workflow.add_volume(
+            ConfigMapVolume(self.config_map.name, self.config_map.name)
+        )
+
+    def _to_dict(self):
+        template = Container._to_dict(self)
         if (
             not utils.gpu_requested(self.resources)
             and states._overwrite_nvidia_gpu_envs
@@ -85,20 +125,28 @@ class Script(Container):
             if self.env is None:
                 self.env = {}
             self.env.update(OVERWRITE_GPU_ENVS)
+        if self.config_map is not None:
+            container = template["container"]
+            container.update(self.script_dict())
+            del container["source"]
+            # Argo passes the source file after the arguments
+            container["args"] = container.get("args", []) + [
+                "%s/%s" % (_SOURCE_MOUNT_PATH, _SOURCE_KEY)
+            ]
+            return template
         if "container" in template:
             template["script"] = template.pop("container")
         template["script"].update(self.script_dict())
         return template
 
-    def script_dict(self):
-        if isinstance(self.command, list):
-            script = OrderedDict(
-                {"image": self.image, "command": self.command}
-            )
-        else:
-            script = OrderedDict(
-                {"image": self.image, "command": [self.command]}
-            )
+    def source_code(self):
+        """Return the source code run by the script. It is extracted once,
+        as the template is rendered many times."""
+        if "_source_code" not in self.__dict__:
+            self._source_code = self._extract_source_code()
+        return self._source_code
+
+    def _extract_source_code(self):
         source_code_string = None
         if callable(self.source):
             source_code_string = utils.body(self.source)
@@ -111,9 +159,20 @@ class Script(Container):
         command = (
             self.command[0] if isinstance(self.command, list) else self.command
         )
-        script["source"] = (
+        return (
             source_code_string if command.lower() == "python" else self.source
         )
+
+    def script_dict(self):
+        if isinstance(self.command, list):
+            script = OrderedDict(
+                {"image": self.image, "command": self.command}
+            )
+        else:
+            script = OrderedDict(
+                {"image": self.image, "command": [self.command]}
+            )
+        script["source"] = self.source_code()
         if utils.non_empty(self.env):
             script["env"] = utils.convert_dict_to_env_list(self.env)
 
@@ -16,6 +16,7 @@ import json
 from collections import OrderedDict
 
 from couler.core import utils
+from couler.core.constants import COULER_MANAGED_LABEL
 
 
 class Secret(object):
@@ -45,7 +46,11 @@ class Secret(object):
             {
                 "apiVersion": "v1",
                 "kind": "Secret",
-                "metadata": {"name": self.name, "namespace": self.namespace},
+                "metadata": {
+                    "name": self.name,
+                    "namespace": self.namespace,
+                    "labels": {COULER_MANAGED_LABEL: "true"},
+                },
                 "type": "Opaque",
                 "data": {},
             }
@@ -19,12 +19,19 @@ from couler.core.templates.template import Template
 
 class Step(object):
     def __init__(
-        self, name, template=None, arguments=None, when=None, with_itmes=None
+        self,
+        name,
+        template=None,
+        arguments=None,
+        when=None,
+        with_itmes=None,
+        with_param=None,
     ):
         self.name = name
         self.template = template
         self.arguments = arguments
         self.with_items = with_itmes
+        self.with_param = with_param
         self.when = when
 
     def to_dict(self):
@@ -37,6 +44,8 @@ class Step(object):
             d.update({"arguments": self.arguments})
         if utils.non_empty(self.with_items):
             d.update({"withItems": self.with_items})
+        if self.with_param is not None:
+            d.update({"withParam": self.with_param})
         return d
 
 
@@ -45,7 +54,7 @@ class Steps(Template):
         Template.__init__(self, name=name)
         self.steps = steps
 
-    def to_dict(self):
-        template = Template.to_dict(self)
+    def _to_dict(self):
+        template = Template._to_dict(self)
         template["steps"] = self.steps
         return template
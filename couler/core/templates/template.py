@@ -11,12 +11,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import weakref
 from collections import OrderedDict
 
 from couler.core import utils
 
 
 class Template(object):
+    # Templates whose fields were reassigned since the workflow was last
+    # rendered, which lets the workflow re-render only those templates.
+    _changed = weakref.WeakSet()
+
     def __init__(
         self,
         name,
@@ -41,7 +46,31 @@ class Template(object):
         self.cache = cache
         self.parallelism: int = parallelism
 
+    def __setattr__(self, name, value):
+        # Changing any public field invalidates the rendered template.
+        if not name.startswith("_"):
+            self.__dict__["_rendered"] = None
+            Template._changed.add(self)
+        object.__setattr__(self, name, value)
+
     def to_dict(self):
+        """Return the rendered template. The result is memoized until one
+        of the template fields is reassigned, so callers must treat it as
+        read-only and reassign fields, e.g. `template.args = new_args`,
+        instead of mutating them in place.
+        """
+        key = self._render_key()
+        rendered = self.__dict__.get("_rendered")
+        if rendered is None or rendered[0] != key:
+            rendered = (key, self._to_dict())
+            self.__dict__["_rendered"] = rendered
+        return rendered[1]
+
+    def _render_key(self):
+        """Return the global settings the rendered template depends on."""
+        return None
+
+    def _to_dict(self):
         template = OrderedDict({"name": self.name})
         if self.daemon:
             template["daemon"] = True
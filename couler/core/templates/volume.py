@@ -35,3 +35,14 @@ class VolumeMount(object):
 
     def to_dict(self):
         return OrderedDict({"name": self.name, "mountPath": self.mount_path})
+
+
+class ConfigMapVolume(object):
+    def __init__(self, name, config_map_name):
+        self.name = name
+        self.config_map_name = config_map_name
+
+    def to_dict(self):
+        return OrderedDict(
+            {"name": self.name, "configMap": {"name": self.config_map_name}}
+        )
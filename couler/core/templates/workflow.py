@@ -11,21 +11,56 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import hashlib
+import json
+import re
 from collections import OrderedDict
 from inspect import getfullargspec
 
-from couler.core import utils
+from couler.core import states, utils
 from couler.core.templates import Container, Job, Script, Step, Template
 from couler.core.templates.volume import Volume
 from couler.core.templates.volume_claim import VolumeClaimTemplate
 
+_INPUT_PARAMETER_REF = re.compile(r"(inputs\.parameters\.)([\w-]+)")
+
+
+def _copy_spec(obj):
+    """Copy the dicts and lists of a rendered spec. The other values are
+    scalars, so sharing them is much cheaper than `copy.deepcopy`.
+    """
+    if isinstance(obj, dict):
+        copied = obj.copy()
+        for key, value in copied.items():
+            if isinstance(value, (dict, list)):
+                copied[key] = _copy_spec(value)
+        return copied
+    if isinstance(obj, list):
+        return [_copy_spec(value) for value in obj]
+    return obj
+
 
 class Workflow(object):
-    """Class that keeps workflow-related information."""
+    """Class that keeps workflow-related information.
+
+    The spec rendered by `to_dict()` is cached. Only the templates, steps,
+    DAG tasks and volumes that changed since the last render are rebuilt,
+    so calling `to_dict()` repeatedly on a large workflow is cheap.
+
+    Templates are registered under the name of the function creating them,
+    so the same container run from several functions gives several
+    templates. With `intern_templates` set, they are interned when
+    rendering: templates with the same content, up to the names of their
+    input parameters, are rendered once and the steps and tasks using them
+    refer to the first one.
+    """
 
     def __init__(self, workflow_filename):
         self.generate_name = workflow_filename
         self.name = None
+        # The name given to `config_workflow`, before it is salted
+        self.base_name = None
         self.templates = dict()
         self.steps = OrderedDict()
         self.dag_tasks = OrderedDict()
@@ -36,13 +71,51 @@ class Workflow(object):
         self.user_id = None
         self.cluster_config = utils.load_cluster_config()
         self.cron_config = None
-        self.volumes = []
-        self.pvcs = []
+        # Volume name -> volume, and claim name -> volume claim template.
+        # Lookups are O(1) and the order of registration is kept.
+        self.volumes = OrderedDict()
+        self.pvcs = OrderedDict()
         self.service_account = None
         self.security_context = None
+        # Parameter name -> workflow-level parameter
+        self.parameters = OrderedDict()
+        self.intern_templates = False
+        # Template names, or the minimum number of uses, of the templates
+        # submitted as WorkflowTemplates
+        self.shared_templates = None
+        self._reset_render_cache()
+
+    def __setattr__(self, name, value):
+        # Changing any workflow-level field invalidates the rendered spec.
+        if not name.startswith("_"):
+            self.__dict__["_spec"] = None
+            if name == "cluster_config":
+                # Templates need to be configured for the new cluster.
+                self.__dict__["_rendered_templates"] = OrderedDict()
+        object.__setattr__(self, name, value)
+
+    def _reset_render_cache(self):
+        self._spec = None
+        # Template name -> (rendered template, final dict, volume mounts)
+        self._rendered_templates = OrderedDict()
+        self._dirty_templates = OrderedDict()
+        self._templates_key = None
+        self._volumes_changed = False
+        self._rendered_template_list = []
+        # Volume name -> auto-generated emptyDir volume
+        self._auto_volumes = OrderedDict()
+        # Step name -> rendered step group, or None if it needs a rebuild
+        self._rendered_steps = OrderedDict()
+        self._dirty_steps = OrderedDict()
+        self._rendered_step_list = []
+        self._rendered_dag_tasks = None
+        # (rendered templates, interned templates, template aliases)
+        self._interned = None
 
     def add_template(self, template: Template):
         self.templates.update({template.name: template})
+        self._dirty_templates[template.name] = None
+        self._spec = None
 
     def get_template(self, name):
         return self.templates.get(name, None)
@@ -50,25 +123,43 @@ class Workflow(object):
     def add_step(self, name, step: Step):
         if name not in self.steps:
             self.steps.update({name: []})
+            self._rendered_steps[name] = None
         self.steps.get(name).append(step)
+        self._dirty_steps[name] = None
+        self._spec = None
+
+    def add_parameter(self, parameter):
+        """Add a workflow-level parameter, available to all the templates
+        as `{{workflow.parameters.<name>}}`."""
+        self.parameters[parameter["name"]] = parameter
+        self._spec = None
+
+    def add_exit_handler_step(self, name, step):
+        if name in self.exit_handler_step:
+            self.exit_handler_step.get(name).append(step)
+        else:
+            self.exit_handler_step[name] = [step]
+        self._spec = None
 
     def add_pvc_template(self, pvc: VolumeClaimTemplate):
-        self.pvcs.append(pvc.to_dict())
+        # A claim template registered twice replaces the previous one
+        # but keeps its position.
+        self.pvcs[pvc.claim_name] = pvc.to_dict()
+        self._volumes_changed = True
+        self._spec = None
 
     def has_pvc_template(self, name):
-        for pvc in self.pvcs:
-            if pvc["metadata"]["name"] == name:
-                return True
-        return False
+        return name in self.pvcs
 
     def add_volume(self, volume: Volume):
-        self.volumes.append(volume.to_dict())
+        # A volume registered twice replaces the previous one but keeps
+        # its position.
+        self.volumes[volume.name] = volume.to_dict()
+        self._volumes_changed = True
+        self._spec = None
 
     def has_volume(self, name):
-        for volume in self.volumes:
-            if volume["name"] == name:
-                return True
-        return False
+        return name in self.volumes or name in self._auto_volumes
 
     def get_step(self, name):
         return self.steps.get(name, None)
@@ -76,13 +167,20 @@ class Workflow(object):
     def get_steps_dict(self):
         if len(self.steps) == 0:
             return {}
-        steps_list = list()
-        for step in self.steps.values():
-            step_list = []
-            for sub_step in step:
-                step_list.append(sub_step.to_dict())
-            steps_list.append(step_list)
-        return steps_list
+        if len(self._rendered_steps) != len(self.steps):
+            # Steps were added without `add_step()`, rebuild all of them.
+            self._rendered_steps = OrderedDict(
+                (name, None) for name in self.steps
+            )
+            self._dirty_steps = OrderedDict.fromkeys(self.steps)
+        if self._dirty_steps:
+            for name in self._dirty_steps:
+                self._rendered_steps[name] = [
+                    sub_step.to_dict() for sub_step in self.steps[name]
+                ]
+            self._dirty_steps = OrderedDict()
+            self._rendered_step_list = list(self._rendered_steps.values())
+        return self._rendered_step_list
 
     def enable_dag_mode(self):
         self.dag_mode = True
@@ -95,6 +193,8 @@ class Workflow(object):
 
     def update_dag_task(self, name, task):
         self.dag_tasks.update({name: task})
+        self._rendered_dag_tasks = None
+        self._spec = None
 
     def get_cluster_config_name(self):
         return (
@@ -104,6 +204,29 @@ class Workflow(object):
         )
 
     def to_dict(self):
+        """Render the workflow. The rendered spec is cached, every call
+        returns a copy of it that callers are free to change.
+        """
+        if (
+            self._spec is None
+            or self._spec[0] != self._render_key()
+            or Template._changed
+        ):
+            self._spec = (self._render_key(), self._render())
+        return _copy_spec(self._spec[1])
+
+    def _render_key(self):
+        # Cheap fingerprint of the state that can change without going
+        # through one of the `add_*` or `update_*` methods.
+        return (
+            states._overwrite_nvidia_gpu_envs,
+            len(self.templates),
+            len(self.steps),
+            len(self.dag_tasks),
+            len(self.exit_handler_step),
+        )
+
+    def _render(self):
         d = OrderedDict(
             {
                 "apiVersion": "argoproj.io/v1alpha1",
@@ -129,80 +252,55 @@ class Workflow(object):
 
         workflow_spec = {"entrypoint": entrypoint}
 
+        if self.parameters:
+            workflow_spec["arguments"] = {
+                "parameters": list(self.parameters.values())
+            }
+
         if self.security_context:
             workflow_spec["securityContext"] = dict()
             for key, value in self.security_context.items():
                 workflow_spec["securityContext"][key] = value
 
-        if self.volumes:
-            workflow_spec.update({"volumes": self.volumes})
-        if self.pvcs:
-            workflow_spec.update({"volumeClaimTemplates": self.pvcs})
+        templates, aliases = self._get_template_dicts(), {}
+        if self.intern_templates:
+            templates, aliases = self._intern_templates(templates)
         if self.dag_mode_enabled():
-            dag = {"tasks": list(self.dag_tasks.values())}
+            if self._rendered_dag_tasks is None or len(
+                self._rendered_dag_tasks
+            ) != len(self.dag_tasks):
+                self._rendered_dag_tasks = list(self.dag_tasks.values())
+            dag = {"tasks": _alias_steps(self._rendered_dag_tasks, aliases)}
             ts = [OrderedDict({"name": entrypoint, "dag": dag})]
         else:
-            ts = [{"name": entrypoint, "steps": self.get_steps_dict()}]
-        for template in self.templates.values():
-            template_dict = template.to_dict()
-            if (
-                isinstance(template, Container)
-                or isinstance(template, Job)
-                or isinstance(template, Script)
-            ) and self.cluster_config is not None:
-                sig = getfullargspec(self.cluster_config.config_pod)
-                num_args = len(sig.args)
-                # This is to support cluster configuration whose
-                # implementation has the following signature:
-                # `config_pod(self, template)`.
-                if num_args == 2:
-                    template_dict = self.cluster_config.config_pod(
-                        template_dict
-                    )
-                # This is to support old cluster configuration whose
-                # implementation has the following signature:
-                # `config_pod(self, template, pool, enable_ulogfs)`.
-                # TODO (terrytangyuan): Remove sensitive words here.
-                else:
-                    # The try-except here is necessary in case the
-                    # implementation of `config_pod` supports additional
-                    # arguments with default values.
-                    try:
-                        template_dict = self.cluster_config.config_pod(
-                            template_dict,
-                            template.pool,
-                            template.enable_ulogfs,
-                        )
-                    except Exception:
-                        raise ValueError(
-                            "Unsupported signature for cluster spec: %s" % sig
-                        )
-            ts.append(template_dict)
-            # check volumes
-            if isinstance(template, Container) or isinstance(template, Script):
-                volume_mounts = template.get_volume_mounts()
-                if volume_mounts is not None:
-                    for volume_mount in volume_mounts:
-                        if (
-                            self.has_pvc_template(volume_mount.name) is False
-                            and self.has_volume(volume_mount.name) is False
-                        ):
-                            # Auto-generate emptyDir volume
-                            self.volumes.append(
-                                {"name": volume_mount.name, "emptyDir": {}}
-                            )
-
+            steps = self.get_steps_dict()
+            if steps:
+                steps = [_alias_steps(group, aliases) for group in steps]
+            ts = [{"name": entrypoint, "steps": steps}]
+        ts.extend(templates)
+
+        # Auto-generated emptyDir volumes are appended after the volumes
+        # added by users.
+        volumes = list(self.volumes.values())
+        volumes.extend(self._auto_volumes.values())
         if self.volumes:
-            workflow_spec.update({"volumes": self.volumes})
+            workflow_spec.update({"volumes": volumes})
         if self.pvcs:
-            workflow_spec.update({"volumeClaimTemplates": self.pvcs})
+            workflow_spec.update(
+                {"volumeClaimTemplates": list(self.pvcs.values())}
+            )
+        if volumes:
+            workflow_spec.update({"volumes": volumes})
         if len(self.exit_handler_step) > 0:
             workflow_spec["onExit"] = "exit-handler"
             ts.extend(
                 [
                     {
                         "name": "exit-handler",
-                        "steps": list(self.exit_handler_step.values()),
+                        "steps": [
+                            _alias_steps(group, aliases)
+                            for group in self.exit_handler_step.values()
+                        ],
                     }
                 ]
             )
@@ -235,15 +333,156 @@ class Workflow(object):
                     "Unsupported signature for cluster spec: %s" % sig
                 )
         if self.cron_config is not None:
-            d["spec"] = self.cron_config
-            for key, value in self.cron_config.items():
-                d["spec"][key] = value
+            d["spec"] = dict(self.cron_config)
             d["spec"]["workflowSpec"] = workflow_spec
         else:
             d["spec"] = workflow_spec
 
         return d
 
+    def _get_template_dicts(self):
+        """Return the rendered templates, re-rendering only the templates
+        that were added or changed since the last call.
+        """
+        dirty = self._dirty_templates
+        for template in list(Template._changed):
+            if self.templates.get(template.name) is template:
+                dirty[template.name] = None
+        Template._changed.clear()
+        if self._templates_key != states._overwrite_nvidia_gpu_envs:
+            self._rendered_templates = OrderedDict()
+            self._templates_key = states._overwrite_nvidia_gpu_envs
+        if len(self._rendered_templates) + len(dirty) < len(self.templates):
+            # Templates were added without `add_template()`.
+            self._rendered_templates = OrderedDict()
+        if not self._rendered_templates:
+            dirty = OrderedDict.fromkeys(self.templates)
+        if not dirty and not self._volumes_changed:
+            return self._rendered_template_list
+
+        mounts_changed = self._volumes_changed
+        for name in dirty:
+            template = self.templates.get(name)
+            cached = self._rendered_templates.get(name)
+            if cached is not None:
+                mounts_changed = mounts_changed or bool(cached[2])
+            if template is None:
+                self._rendered_templates.pop(name, None)
+                continue
+            template_dict = template.to_dict()
+            if cached is not None and cached[0] is template_dict:
+                final_dict = cached[1]
+            else:
+                final_dict = self._config_template(template, template_dict)
+            mount_names = []
+            if isinstance(template, Container) or isinstance(template, Script):
+                volume_mounts = template.get_volume_mounts()
+                if volume_mounts is not None:
+                    mount_names = [vm.name for vm in volume_mounts]
+            mounts_changed = mounts_changed or bool(mount_names)
+            self._rendered_templates[name] = (
+                template_dict,
+                final_dict,
+                mount_names,
+            )
+        if list(self._rendered_templates) != list(self.templates):
+            # Keep the order in which templates were first added.
+            self._rendered_templates = OrderedDict(
+                (name, self._rendered_templates[name])
+                for name in self.templates
+            )
+
+        if mounts_changed:
+            self._auto_volumes = OrderedDict()
+            for _, _, mount_names in self._rendered_templates.values():
+                for mount_name in mount_names:
+                    if (
+                        self.has_pvc_template(mount_name) is False
+                        and self.has_volume(mount_name) is False
+                    ):
+                        # Auto-generate emptyDir volume
+                        self._auto_volumes[mount_name] = {
+                            "name": mount_name,
+                            "emptyDir": {},
+                        }
+
+        self._dirty_templates = OrderedDict()
+        self._volumes_changed = False
+        self._rendered_template_list = [
+            rendered[1] for rendered in self._rendered_templates.values()
+        ]
+        return self._rendered_template_list
+
+    def _intern_templates(self, template_dicts):
+        """Return the rendered templates without duplicates, and the name
+        of each duplicate -> the name of the template it duplicates and
+        the names of its input parameters -> those of that template.
+        """
+        if self._interned is not None and self._interned[0] is template_dicts:
+            return self._interned[1], self._interned[2]
+        aliases = OrderedDict()
+        digests = dict()
+        interned = dict()
+        # Step and DAG templates are interned after the templates they run
+        for template in sorted(
+            template_dicts, key=lambda t: "steps" in t or "dag" in t
+        ):
+            template = _alias_template(template, aliases)
+            digest, parameters = _template_digest(template)
+            if digest in digests:
+                name, canonical_parameters = digests[digest]
+                aliases[template["name"]] = (
+                    name,
+                    dict(zip(parameters, canonical_parameters)),
+                )
+            else:
+                digests[digest] = (template["name"], parameters)
+                interned[template["name"]] = template
+        templates = [
+            interned[t["name"]]
+            for t in template_dicts
+            if t["name"] in interned
+        ]
+        self._interned = (template_dicts, templates, aliases)
+        return templates, aliases
+
+    def _config_template(self, template, template_dict):
+        """Apply the cluster configuration to a rendered template."""
+        if (
+            isinstance(template, Container)
+            or isinstance(template, Job)
+            or isinstance(template, Script)
+        ) and self.cluster_config is not None:
+            # The rendered template is memoized, so the cluster
+            # configuration gets its own copy to modify.
+            template_dict = copy.deepcopy(template_dict)
+            sig = getfullargspec(self.cluster_config.config_pod)
+            num_args = len(sig.args)
+            # This is to support cluster configuration whose
+            # implementation has the following signature:
+            # `config_pod(self, template)`.
+            if num_args == 2:
+                template_dict = self.cluster_config.config_pod(template_dict)
+            # This is to support old cluster configuration whose
+            # implementation has the following signature:
+            # `config_pod(self, template, pool, enable_ulogfs)`.
+            # TODO (terrytangyuan): Remove sensitive words here.
+            else:
+                # The try-except here is necessary in case the
+                # implementation of `config_pod` supports additional
+                # arguments with default values.
+                try:
+                    template_dict = self.cluster_config.config_pod(
+                        template_dict,
+                        template.pool,
+                        template.enable_ulogfs,
+                    )
+                except Exception:
+                    raise ValueError(
+                        "Unsupported signature for cluster spec: %s" % sig
+                    )
+        return template_dict
+
     def config_cron_workflow(self, cron_config):
         self.cron_config = cron_config
 
@@ -254,6 +493,7 @@ class Workflow(object):
 
     def cleanup(self):
         self.name = None
+        self.base_name = None
         self.timeout = None
         self.clean_ttl = None
         self.templates = dict()
@@ -264,7 +504,84 @@ class Workflow(object):
         self.user_id = None
         self.cluster_config = None
         self.cron_config = None
-        self.volumes = []
-        self.pvcs = []
+        self.volumes = OrderedDict()
+        self.pvcs = OrderedDict()
         self.service_account = None
         self.security_context = None
+        self.parameters = OrderedDict()
+        self.intern_templates = False
+        # Template names, or the minimum number of uses, of the templates
+        # submitted as WorkflowTemplates
+        self.shared_templates = None
+        self._reset_render_cache()
+
+
+def _template_digest(template):
+    """Return the hash of the template content, with the names of its
+    input parameters replaced by their positions, and these names."""
+    inputs = template.get("inputs") or {}
+    parameters = [p["name"] for p in inputs.get("parameters") or []]
+    positions = {name: "%d" % i for i, name in enumerate(parameters)}
+    content = OrderedDict((k, v) for k, v in template.items() if k != "name")
+    if parameters:
+        content["inputs"] = dict(
+            inputs,
+            parameters=[
+                dict(p, name=positions[p["name"]])
+                for p in inputs["parameters"]
+            ],
+        )
+    text = _INPUT_PARAMETER_REF.sub(
+        lambda m: m.group(1) + positions.get(m.group(2), m.group(2)),
+        json.dumps(content, sort_keys=True, default=str),
+    )
+    return hashlib.sha1(text.encode("utf-8")).hexdigest(), parameters
+
+
+def _alias_step(step, aliases):
+    """Return the step running the template its template duplicates."""
+    if not isinstance(step, dict) or step.get("template") not in aliases:
+        return step
+    name, parameters = aliases[step["template"]]
+    step = OrderedDict(step)
+    step["template"] = name
+    arguments = step.get("arguments") or {}
+    if arguments.get("parameters"):
+        step["arguments"] = dict(
+            arguments,
+            parameters=[
+                dict(p, name=parameters.get(p["name"], p["name"]))
+                for p in arguments["parameters"]
+            ],
+        )
+    return step
+
+
+def _alias_steps(steps, aliases):
+    # The list itself is returned if no step changes
+    if not aliases or not steps:
+        return steps
+    aliased = [_alias_step(step, aliases) for step in steps]
+    if all(a is step for a, step in zip(aliased, steps)):
+        return steps
+    return aliased
+
+
+def _alias_template(template, aliases):
+    """Return the step or DAG template running the interned templates."""
+    if template.get("steps"):
+        steps = [
+            _alias_steps(group, aliases)
+            if isinstance(group, list)
+            else _alias_step(group, aliases)
+            for group in template["steps"]
+        ]
+        if any(a is not group for a, group in zip(steps, template["steps"])):
+            template = OrderedDict(template)
+            template["steps"] = steps
+    if template.get("dag"):
+        tasks = _alias_steps(template["dag"]["tasks"], aliases)
+        if tasks is not template["dag"]["tasks"]:
+            template = OrderedDict(template)
+            template["dag"] = dict(template["dag"], tasks=tasks)
+    return template
@@ -12,9 +12,12 @@
 # limitations under the License.
 
 import base64
+import functools
 import inspect
+import json
 import os
 import re
+import sys
 import textwrap
 import uuid
 from importlib import util
@@ -23,6 +26,12 @@ from couler.core.constants import ImagePullPolicy
 from couler.core.templates import Output
 from couler.core.templates.output import parse_argo_output
 
+# The number of distinct call sites whose derived names are cached by
+# `invocation_location()`.
+_CALL_SITE_CACHE_SIZE = 4096
+# The number of function sources cached by `body()`.
+_SOURCE_CACHE_SIZE = 1024
+
 
 def argo_safe_name(name):
     """Some names are to be used in the Argo YAML file. For example,
@@ -53,16 +62,21 @@ def invocation_location():
 
     :return: a tuple of (function_name, invocation_line)
     """
-    stack = inspect.stack()
-    if len(stack) < 4:
-        line_number = stack[len(stack) - 1][2]
-        func_name = "%s-%d" % (
-            argo_safe_name(workflow_filename()),
-            line_number,
+    # Walk the raw frames instead of calling `inspect.stack()`, which
+    # builds a `FrameInfo` for every frame and reads source context lines
+    # from disk. Frame 0 is this function and frame 1 is function C.
+    frame = sys._getframe(1)
+    caller = frame.f_back
+    invoker = caller.f_back if caller is not None else None
+    if invoker is None:
+        # Fewer than four frames on the stack, so the outermost frame
+        # is the invocation site.
+        outermost = caller if caller is not None else frame
+        func_name, line_number = _module_call_site(
+            outermost.f_code.co_filename, outermost.f_lineno
         )
     else:
-        func_name = argo_safe_name(stack[2][3])
-        line_number = stack[3][2]
+        func_name, line_number = _call_site(caller.f_code, invoker.f_lineno)
     # We need to strip the unnecessary "<>" pattern that appears when the
     # function is invoked:
     # 1. at module-level, e.g. `python -m module_name`, where `func_name`
@@ -74,13 +88,51 @@ def invocation_location():
     return func_name, line_number
 
 
+@functools.lru_cache(maxsize=_CALL_SITE_CACHE_SIZE)
+def _call_site(code, line_number):
+    """Derive the `(func_name, line)` pair of an invocation from the code
+    object of the calling function and the line it is invoked from.
+    """
+    return argo_safe_name(code.co_name), line_number
+
+
+@functools.lru_cache(maxsize=_CALL_SITE_CACHE_SIZE)
+def _module_call_site(co_filename, line_number):
+    """Derive the `(func_name, line)` pair of an invocation made directly
+    from the workflow file.
+    """
+    func_name = "%s-%d" % (
+        argo_safe_name(_safe_filename(co_filename)),
+        line_number,
+    )
+    return func_name, line_number
+
+
 def body(func_obj):
     """If a function A calls body(), the call returns the Python source code of
     the function definition body (not including the signature) of A.
     """
     if func_obj is None:
         return None
-    code = inspect.getsource(func_obj)
+    func = inspect.unwrap(func_obj)
+    code = getattr(getattr(func, "__func__", func), "__code__", None)
+    if code is None:
+        return _source_body(inspect.getsource(func_obj))
+    try:
+        mtime = os.path.getmtime(code.co_filename)
+    except OSError:
+        mtime = None
+    return _code_body(code, mtime)
+
+
+@functools.lru_cache(maxsize=_SOURCE_CACHE_SIZE)
+def _code_body(code, mtime):
+    # Cached by code object and modification time of its file, so that
+    # the source is only read again once the file is edited
+    return _source_body(inspect.getsource(code))
+
+
+def _source_body(code):
     # Remove function signature
     code = code[code.find(":") + 1 :]  # noqa: E203
     # Function might be defined in some indented scope
@@ -90,14 +142,17 @@ def body(func_obj):
 
 
 def workflow_filename():
-    """Return the Python file that defines the workflow.
-    """
-    stacks = inspect.stack()
-    frame = inspect.stack()[len(stacks) - 1]
-    full_path = frame[0].f_code.co_filename
+    """Return the Python file that defines the workflow."""
+    frame = sys._getframe(0)
+    while frame.f_back is not None:
+        frame = frame.f_back
+    return _safe_filename(frame.f_code.co_filename)
+
+
+@functools.lru_cache(maxsize=None)
+def _safe_filename(full_path):
     filename, _ = os.path.splitext(os.path.basename(full_path))
-    filename = argo_safe_name(filename)
-    return filename
+    return argo_safe_name(filename)
 
 
 def input_parameter_name(name, var_pos):
@@ -145,6 +200,12 @@ def encode_base64(s):
     return str(bencode, "utf-8")
 
 
+def parameter_value(value):
+    """Return the value as a parameter value, which is a string. Other
+    values are encoded as JSON, the way Argo renders the loop items."""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
 def generate_parameters_run_job(env):
     """
     Generate the inputs parameter for running kubernetes resource
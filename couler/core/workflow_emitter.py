@@ -0,0 +1,260 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streaming YAML and JSON emitters for rendered workflows.
+
+The emitters write a workflow to a file-like sink one template (and one
+step group or DAG task) at a time while keeping a running byte count, so
+a workflow that does not fit into a size budget, e.g. the etcd request
+size limit, is rejected as soon as the budget is exceeded instead of
+after the whole document has been serialized.
+"""
+
+import json
+from collections import OrderedDict
+
+import pyaml
+
+# The line width PyYAML wraps long scalars at.
+_YAML_WIDTH = 80
+# The number of largest templates named when the size budget is exceeded.
+_NUM_REPORTED_TEMPLATES = 5
+
+
+class WorkflowSizeError(ValueError):
+    """Raised when a workflow does not fit into the size budget.
+
+    `contributors` lists `(template_name, num_bytes)` of the templates
+    emitted before the budget was exceeded, largest first.
+    """
+
+    def __init__(self, message, contributors):
+        super().__init__(message)
+        self.contributors = contributors
+
+
+class _Emitter(object):
+    def __init__(self, stream, max_bytes=None):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        # Template name -> number of bytes emitted for the template
+        self.template_bytes = OrderedDict()
+
+    def write(self, chunk, template_name=None):
+        size = len(chunk.encode("utf-8"))
+        self.num_bytes += size
+        if template_name is not None:
+            self.template_bytes[template_name] = (
+                self.template_bytes.get(template_name, 0) + size
+            )
+        if self.max_bytes is not None and self.num_bytes > self.max_bytes:
+            contributors = sorted(
+                self.template_bytes.items(), key=lambda x: x[1], reverse=True
+            )[:_NUM_REPORTED_TEMPLATES]
+            raise WorkflowSizeError(
+                "The size of the workflow exceeds %d bytes. The largest "
+                "templates emitted so far are: %s"
+                % (
+                    self.max_bytes,
+                    ", ".join("%s (%d bytes)" % c for c in contributors),
+                ),
+                contributors,
+            )
+        self.stream.write(chunk)
+
+
+def _templates_path(workflow):
+    if workflow.get("kind") == "CronWorkflow":
+        return ("spec", "workflowSpec", "templates")
+    return ("spec", "templates")
+
+
+def _streamed_key(template):
+    """Return the key of the step groups or DAG tasks of the template
+    that are emitted one by one, or None.
+    """
+    keys = list(template)
+    if len(keys) < 2 or keys[0] != "name":
+        return None
+    if isinstance(template.get("steps"), list) and template["steps"]:
+        return "steps"
+    dag = template.get("dag")
+    if (
+        isinstance(dag, dict)
+        and list(dag) == ["tasks"]
+        and isinstance(dag["tasks"], list)
+        and dag["tasks"]
+    ):
+        return "dag"
+    return None
+
+
+def _items(mapping):
+    # PyYAML sorts the keys of plain dicts, but keeps the order of
+    # OrderedDicts.
+    if isinstance(mapping, OrderedDict):
+        return list(mapping.items())
+    return sorted(mapping.items())
+
+
+class _YamlEmitter(_Emitter):
+    def dump(self, value, indent):
+        """Dump the value as if it was nested `indent` spaces deep."""
+        text = pyaml.dump(
+            value,
+            force_embed=True,
+            width=max(_YAML_WIDTH - indent, 2 * 2 + 1),
+        )
+        if indent == 0:
+            return text
+        prefix = " " * indent
+        return "".join(
+            prefix + line if line.strip() else line
+            for line in text.splitlines(True)
+        )
+
+    def emit(self, workflow):
+        self.emit_mapping(workflow, (), 0, _templates_path(workflow))
+
+    def emit_mapping(self, mapping, path, indent, templates_path):
+        for key, value in _items(mapping):
+            key_path = path + (key,)
+            if key_path == templates_path and isinstance(value, list):
+                self.write("%s%s:\n" % (" " * indent, key))
+                for template in value:
+                    self.emit_template(template, indent + 2)
+            elif key_path == templates_path[: len(key_path)] and isinstance(
+                value, dict
+            ):
+                self.write("%s%s:\n" % (" " * indent, key))
+                self.emit_mapping(value, key_path, indent + 2, templates_path)
+            else:
+                self.write(self.dump(OrderedDict([(key, value)]), indent))
+
+    def emit_template(self, template, indent):
+        name = template.get("name") if isinstance(template, dict) else None
+        streamed_key = (
+            _streamed_key(template) if isinstance(template, dict) else None
+        )
+        if streamed_key is None:
+            self.write(self.dump([template], indent), name)
+            return
+        items = _items(template)
+        keys = [k for k, _ in items]
+        position = keys.index(streamed_key)
+        head = OrderedDict(items[:position])
+        self.write(self.dump([head], indent), name)
+        item_indent = indent + 2
+        if streamed_key == "steps":
+            self.write("%ssteps:\n" % (" " * item_indent), name)
+            entries = template["steps"]
+            entry_indent = item_indent + 2
+        else:
+            self.write("%sdag:\n" % (" " * item_indent), name)
+            self.write("%stasks:\n" % (" " * (item_indent + 2)), name)
+            entries = template["dag"]["tasks"]
+            entry_indent = item_indent + 4
+        for entry in entries:
+            self.write(self.dump([entry], entry_indent), name)
+        for key, value in items[position + 1 :]:  # noqa: E203
+            self.write(
+                self.dump(OrderedDict([(key, value)]), item_indent), name
+            )
+
+
+class _JsonEmitter(_Emitter):
+    def emit(self, workflow):
+        self.emit_mapping(workflow, (), _templates_path(workflow))
+
+    def emit_mapping(self, mapping, path, templates_path):
+        self.write("{")
+        for i, (key, value) in enumerate(mapping.items()):
+            key_path = path + (key,)
+            self.write("%s%s: " % (", " if i > 0 else "", json.dumps(key)))
+            if key_path == templates_path and isinstance(value, list):
+                self.write("[")
+                for j, template in enumerate(value):
+                    name = (
+                        template.get("name")
+                        if isinstance(template, dict)
+                        else None
+                    )
+                    if j > 0:
+                        self.write(", ", name)
+                    self.emit_template(template, name)
+                self.write("]")
+            elif key_path == templates_path[: len(key_path)] and isinstance(
+                value, dict
+            ):
+                self.emit_mapping(value, key_path, templates_path)
+            else:
+                self.write(json.dumps(value))
+        self.write("}")
+
+    def emit_template(self, template, name):
+        streamed_key = (
+            _streamed_key(template) if isinstance(template, dict) else None
+        )
+        if streamed_key is None:
+            self.write(json.dumps(template), name)
+            return
+        self.write("{", name)
+        for i, (key, value) in enumerate(template.items()):
+            self.write(
+                "%s%s: " % (", " if i > 0 else "", json.dumps(key)), name
+            )
+            if key != streamed_key:
+                self.write(json.dumps(value), name)
+                continue
+            if key == "dag":
+                self.write('{"tasks": ', name)
+                entries = value["tasks"]
+            else:
+                entries = value
+            self.write("[", name)
+            for j, entry in enumerate(entries):
+                self.write(("" if j == 0 else ", ") + json.dumps(entry), name)
+            self.write("]", name)
+            if key == "dag":
+                self.write("}", name)
+        self.write("}", name)
+
+
+def dump_yaml(workflow, stream, max_bytes=None):
+    """Write the rendered workflow as YAML to the text stream.
+
+    :param workflow: the workflow dict, e.g. from `couler.workflow_yaml()`
+    :param stream: a file-like object with a `write(str)` method
+    :param max_bytes: the size budget in UTF-8 encoded bytes. A
+        `WorkflowSizeError` is raised as soon as it is exceeded.
+    :return: the number of bytes written
+    """
+    emitter = _YamlEmitter(stream, max_bytes)
+    emitter.emit(workflow)
+    return emitter.num_bytes
+
+
+def dump_json(workflow, stream, max_bytes=None):
+    """Write the rendered workflow as JSON to the text stream. The output
+    is the same as `json.dumps(workflow)`.
+
+    :param workflow: the workflow dict, e.g. from `couler.workflow_yaml()`
+    :param stream: a file-like object with a `write(str)` method
+    :param max_bytes: the size budget in UTF-8 encoded bytes. A
+        `WorkflowSizeError` is raised as soon as it is exceeded.
+    :return: the number of bytes written
+    """
+    emitter = _JsonEmitter(stream, max_bytes)
+    emitter.emit(workflow)
+    return emitter.num_bytes
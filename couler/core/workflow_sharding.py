@@ -0,0 +1,609 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Split a workflow that is too large for etcd into child workflows.
+
+The step groups or DAG tasks of the entrypoint are packed into shards.
+Each shard, with the templates it uses, becomes a WorkflowTemplate, and
+the parent workflow runs the shards in order, or following the
+dependencies of their tasks, through resource templates that create a
+workflow from the WorkflowTemplate and wait for it to finish.
+
+The output parameters used across shards are exported by the producing
+shard as global outputs, read by the parent from the status of the child
+workflow and passed to the consuming shard as workflow parameters. Steps
+passing artifacts or script results to each other, and tasks related by a
+`depends` expression, are kept in the same shard. Note that the volume
+claim templates are created per child workflow, so data written to them
+does not cross shards.
+"""
+
+import copy
+import hashlib
+import heapq
+import io
+import json
+import re
+from collections import OrderedDict
+
+import pyaml
+
+from couler.core import workflow_emitter
+from couler.core.constants import (
+    ETCD_REQUEST_SIZE_LIMIT,
+    WorkflowCRD,
+    WorkflowTemplateCRD,
+)
+
+_REFERENCE = re.compile(
+    r"{{\s*(steps|tasks)\.([\w-]+)\.([\w.-]+?)\s*}}", re.ASCII
+)
+_OUTPUT_PARAMETER = re.compile(r"^outputs\.parameters\.([\w-]+)$")
+_DEPENDS_NAME = re.compile(r"[\w-]+")
+# The fields of the workflow spec that are not copied to the children
+_PARENT_ONLY_FIELDS = frozenset(
+    [
+        "entrypoint",
+        "templates",
+        "arguments",
+        "onExit",
+        "activeDeadlineSeconds",
+    ]
+)
+
+# The fields of the workflow spec that the parent keeps only for the
+# volumes its own templates mount
+_VOLUME_FIELDS = frozenset(["volumes", "volumeClaimTemplates"])
+
+
+class _Discard(io.StringIO):
+    def write(self, chunk):
+        return len(chunk)
+
+
+def fits(workflow, max_bytes=ETCD_REQUEST_SIZE_LIMIT):
+    """Return whether the YAML of the workflow fits in max_bytes."""
+    try:
+        workflow_emitter.dump_yaml(workflow, _Discard(), max_bytes=max_bytes)
+    except workflow_emitter.WorkflowSizeError:
+        return False
+    return True
+
+
+def _size_error(workflow, max_bytes):
+    """Return the `WorkflowSizeError` of a workflow that does not fit in
+    max_bytes of JSON, the body of the request creating it, or None."""
+    # The C encoder sizes most workflows much faster than the emitter,
+    # which only runs to name the largest templates. With the non-ASCII
+    # characters escaped, the length is at least the UTF-8 size.
+    if len(json.dumps(workflow)) <= max_bytes:
+        return None
+    try:
+        workflow_emitter.dump_json(workflow, _Discard(), max_bytes=max_bytes)
+    except workflow_emitter.WorkflowSizeError as e:
+        return e
+    return None
+
+
+def shard_workflow(workflow, max_bytes=ETCD_REQUEST_SIZE_LIMIT, error=None):
+    """Split the workflow if it does not fit in max_bytes.
+
+    Returns the workflow to submit and the list of WorkflowTemplates it
+    runs, which have to be created first. A workflow that fits is returned
+    as is, with no WorkflowTemplates. The shards are packed up to half of
+    max_bytes of JSON, which leaves room for the YAML indentation.
+
+    `error` is the `WorkflowSizeError` raised when the workflow was
+    emitted with the budget, if it was. Otherwise the size of its JSON is
+    checked. A workflow that cannot be split raises a `WorkflowSizeError`.
+    """
+    if error is None:
+        error = _size_error(workflow, max_bytes)
+        if error is None:
+            return workflow, []
+    if workflow["kind"] != WorkflowCRD.KIND:
+        raise error
+    spec = workflow["spec"]
+    templates = OrderedDict((t["name"], t) for t in spec["templates"])
+    entrypoint = templates[spec["entrypoint"]]
+    if "dag" in entrypoint:
+        units = OrderedDict(
+            (task["name"], task) for task in entrypoint["dag"]["tasks"]
+        )
+        scope = "tasks"
+    else:
+        units = OrderedDict(
+            (group[0]["name"], group) for group in entrypoint["steps"]
+        )
+        scope = "steps"
+    if len(units) < 2:
+        raise error
+
+    # Step name -> unit name, a step group is named after its first step
+    owners = OrderedDict()
+    for name, unit in units.items():
+        for step in unit if scope == "steps" else [unit]:
+            owners[step["name"]] = name
+    soft, hard = _dependencies(units, owners, scope)
+    shards = _pack(units, templates, soft, hard, max_bytes // 2)
+    if len(shards) < 2:
+        raise error
+    return _build(
+        workflow, templates, units, owners, shards, soft, hard, scope
+    )
+
+
+def _dependencies(units, owners, scope):
+    """Return the units each unit depends on. The hard ones cannot be
+    cut, such as artifacts or script results passed between units."""
+    soft = OrderedDict((name, set()) for name in units)
+    hard = OrderedDict((name, set()) for name in units)
+    names = list(units)
+    for i, (name, unit) in enumerate(units.items()):
+        if scope == "steps" and i > 0:
+            # Step groups run one after the other
+            soft[name].add(names[i - 1])
+        for ref_scope, step_name, path in _REFERENCE.findall(json.dumps(unit)):
+            owner = owners.get(step_name)
+            if ref_scope != scope or owner is None or owner == name:
+                continue
+            if _OUTPUT_PARAMETER.match(path):
+                soft[name].add(owner)
+            else:
+                hard[name].add(owner)
+        if scope == "tasks":
+            for dependency in unit.get("dependencies") or []:
+                if dependency in units:
+                    soft[name].add(dependency)
+            for token in _DEPENDS_NAME.findall(unit.get("depends") or ""):
+                if token in units:
+                    hard[name].add(token)
+    return soft, hard
+
+
+def _template_closure(names, templates):
+    """Return the templates used by the given ones, these included."""
+    closure = OrderedDict()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in closure or name not in templates:
+            continue
+        template = templates[name]
+        closure[name] = template
+        steps = template.get("steps") or []
+        for group in steps:
+            pending.extend(step.get("template") for step in group)
+        if "dag" in template:
+            pending.extend(
+                task.get("template") for task in template["dag"]["tasks"]
+            )
+    return closure
+
+
+def _unit_templates(unit):
+    return [step.get("template") for step in _unit_steps(unit)]
+
+
+def _unit_steps(unit):
+    return unit if isinstance(unit, list) else [unit]
+
+
+def _blocks(units, soft, hard):
+    """Group the units joined by hard dependencies, and the units in
+    between them, into blocks that are ordered by their dependencies."""
+    position = {name: i for i, name in enumerate(units)}
+    # Union-find of the units that must stay together
+    parent = {name: name for name in units}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            # Keep the earliest unit as the representative
+            if position[a] > position[b]:
+                a, b = b, a
+            parent[b] = a
+
+    def block_edges():
+        edges = OrderedDict((find(name), set()) for name in units)
+        for name in units:
+            for dependency in soft[name] | hard[name]:
+                if find(dependency) != find(name):
+                    edges[find(name)].add(find(dependency))
+        return edges
+
+    for name in units:
+        for dependency in hard[name]:
+            union(name, dependency)
+    # Blocks depending on each other are merged, which leaves a DAG
+    for component in _strongly_connected(block_edges()):
+        for name in component[1:]:
+            union(component[0], name)
+    edges = block_edges()
+    members = OrderedDict()
+    for name in units:
+        members.setdefault(find(name), []).append(name)
+    # Order the blocks topologically, in the order of the units otherwise
+    dependents = {block: [] for block in edges}
+    num_pending = {block: len(deps) for block, deps in edges.items()}
+    for block, deps in edges.items():
+        for dependency in deps:
+            dependents[dependency].append(block)
+    ready = [(position[b], b) for b, n in num_pending.items() if n == 0]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        _, block = heapq.heappop(ready)
+        ordered.append(members[block])
+        for dependent in dependents[block]:
+            num_pending[dependent] -= 1
+            if num_pending[dependent] == 0:
+                heapq.heappush(ready, (position[dependent], dependent))
+    return ordered
+
+
+def _strongly_connected(edges):
+    """Return the strongly connected components of the graph with more
+    than one node, with Tarjan's algorithm."""
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    counter = 0
+    for start in edges:
+        if start in index:
+            continue
+        work = [(start, iter(edges[start]))]
+        index[start] = low[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack.add(start)
+        while work:
+            node, children = work[-1]
+            child = next(children, None)
+            if child is not None:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(edges[child])))
+                elif child in on_stack:
+                    low[node] = min(low[node], index[child])
+                continue
+            work.pop()
+            if work:
+                low[work[-1][0]] = min(low[work[-1][0]], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1:
+                    components.append(component)
+    return components
+
+
+def _pack(units, templates, soft, hard, budget):
+    """Pack the blocks of units into shards of at most budget bytes."""
+    sizes = {name: len(json.dumps(t)) for name, t in templates.items()}
+    shards = []
+    shard, shard_templates, size = [], set(), 0
+    for block in _blocks(units, soft, hard):
+        block_templates = set(
+            _template_closure(
+                [t for name in block for t in _unit_templates(units[name])],
+                templates,
+            )
+        )
+        block_size = sum(len(json.dumps(units[name])) for name in block)
+        added = sum(sizes[t] for t in block_templates - shard_templates)
+        if shard and size + block_size + added > budget:
+            shards.append(shard)
+            shard, shard_templates, size = [], set(), 0
+            added = sum(sizes[t] for t in block_templates)
+        if block_size + added > budget:
+            contributors = sorted(
+                ((t, sizes[t]) for t in block_templates),
+                key=lambda x: x[1],
+                reverse=True,
+            )[: workflow_emitter._NUM_REPORTED_TEMPLATES]
+            raise workflow_emitter.WorkflowSizeError(
+                "The steps %s exceed %d bytes and cannot be split. "
+                "Their largest templates are: %s"
+                % (
+                    ", ".join(block),
+                    budget,
+                    ", ".join("%s (%d bytes)" % c for c in contributors),
+                ),
+                contributors,
+            )
+        shard.extend(block)
+        shard_templates |= block_templates
+        size += block_size + added
+    shards.append(shard)
+    return shards
+
+
+def _global_name(step_name, parameter):
+    return "%s-%s" % (step_name, parameter)
+
+
+def _build(workflow, templates, units, owners, shards, soft, hard, scope):
+    spec = workflow["spec"]
+    base_name = (
+        workflow["metadata"].get("name")
+        or workflow["metadata"]["generateName"]
+    ).rstrip("-")
+    shard_of = {}
+    for i, shard in enumerate(shards):
+        for name in shard:
+            shard_of[name] = i
+    # Shard -> global name -> (step name, parameter)
+    exports = [OrderedDict() for _ in shards]
+    imports = [OrderedDict() for _ in shards]
+    bodies = []
+    for i, shard in enumerate(shards):
+
+        def rewrite(match, i=i):
+            ref_scope, step_name, path = match.groups()
+            owner = owners.get(step_name)
+            if ref_scope != scope or owner is None or shard_of[owner] == i:
+                return match.group(0)
+            parameter = _OUTPUT_PARAMETER.match(path).group(1)
+            global_name = _global_name(step_name, parameter)
+            exports[shard_of[owner]][global_name] = (step_name, parameter)
+            imports[i][global_name] = shard_of[owner]
+            return "{{workflow.parameters.%s}}" % global_name
+
+        body = []
+        for name in shard:
+            unit = json.loads(
+                _REFERENCE.sub(rewrite, json.dumps(units[name])),
+                object_pairs_hook=OrderedDict,
+            )
+            if scope == "tasks" and "dependencies" in unit:
+                # The parent runs the shards of the dependencies first
+                unit["dependencies"] = [
+                    d for d in unit["dependencies"] if shard_of.get(d) == i
+                ]
+                if not unit["dependencies"]:
+                    del unit["dependencies"]
+            body.append(unit)
+        bodies.append(body)
+
+    children = []
+    for i, body in enumerate(bodies):
+        children.append(
+            _child(spec, templates, body, exports[i], imports[i], scope)
+        )
+    names = []
+    for child in children:
+        digest = hashlib.sha1(
+            json.dumps(child, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:10]
+        names.append(
+            "%s-%s"
+            % (
+                base_name[: WorkflowCRD.NAME_MAX_LENGTH - 11].rstrip("-"),
+                digest,
+            )
+        )
+    workflow_templates = []
+    for name, child in zip(names, children):
+        workflow_templates.append(
+            OrderedDict(
+                [
+                    ("apiVersion", "argoproj.io/v1alpha1"),
+                    ("kind", WorkflowTemplateCRD.KIND),
+                    ("metadata", {"name": name}),
+                    ("spec", child),
+                ]
+            )
+        )
+    # Shard -> the shards it depends on
+    shard_dependencies = [
+        sorted(
+            {
+                shard_of[dependency]
+                for name in shard
+                for dependency in soft[name] | hard[name]
+            }
+            - {i}
+        )
+        for i, shard in enumerate(shards)
+    ]
+    return (
+        _parent(
+            workflow,
+            templates,
+            names,
+            exports,
+            imports,
+            shard_dependencies,
+            scope,
+        ),
+        workflow_templates,
+    )
+
+
+def _child(spec, templates, body, exports, imports, scope):
+    templates = OrderedDict(templates)
+    # Export the output parameters used by other shards, from a copy of
+    # the template of each exporting step
+    for global_name, (step_name, parameter) in exports.items():
+        for unit in body:
+            for step in _unit_steps(unit):
+                if step["name"] != step_name:
+                    continue
+                template = copy.deepcopy(templates[step["template"]])
+                template["name"] = "%s-%s" % (template["name"], step_name)
+                for output in template["outputs"]["parameters"]:
+                    if output["name"] == parameter:
+                        output["globalName"] = global_name
+                templates[template["name"]] = template
+                step["template"] = template["name"]
+    templates = _template_closure(
+        [t for unit in body for t in _unit_templates(unit)], templates
+    )
+    entrypoint = spec["entrypoint"]
+    if scope == "tasks":
+        main = OrderedDict([("name", entrypoint), ("dag", {"tasks": body})])
+    else:
+        main = OrderedDict([("name", entrypoint), ("steps", body)])
+    child = OrderedDict(
+        (key, value)
+        for key, value in spec.items()
+        if key not in _PARENT_ONLY_FIELDS
+    )
+    child["entrypoint"] = entrypoint
+    parameters = list((spec.get("arguments") or {}).get("parameters") or [])
+    parameters.extend({"name": name} for name in imports)
+    if parameters:
+        child["arguments"] = {"parameters": parameters}
+    child["templates"] = [main] + [
+        t for name, t in templates.items() if name != entrypoint
+    ]
+    return child
+
+
+def _parent(
+    workflow, templates, names, exports, imports, shard_dependencies, scope
+):
+    spec = workflow["spec"]
+    shard_templates = []
+    entries = []
+    for i, name in enumerate(names):
+        manifest_spec = OrderedDict([("workflowTemplateRef", {"name": name})])
+        if imports[i]:
+            manifest_spec["arguments"] = {
+                "parameters": [
+                    {"name": g, "value": "{{inputs.parameters.%s}}" % g}
+                    for g in imports[i]
+                ]
+            }
+        manifest = OrderedDict(
+            [
+                ("apiVersion", "argoproj.io/v1alpha1"),
+                ("kind", WorkflowCRD.KIND),
+                ("metadata", {"generateName": "%s-" % name}),
+                ("spec", manifest_spec),
+            ]
+        )
+        template = OrderedDict([("name", "shard-%d" % i)])
+        if imports[i]:
+            template["inputs"] = {
+                "parameters": [{"name": g} for g in imports[i]]
+            }
+        template["resource"] = OrderedDict(
+            [
+                ("action", "create"),
+                ("setOwnerReference", True),
+                ("successCondition", "status.phase == Succeeded"),
+                ("failureCondition", "status.phase in (Failed, Error)"),
+                # Quoted, as Argo substitutes the inputs before parsing it
+                ("manifest", pyaml.dump(manifest, string_val_style='"')),
+            ]
+        )
+        if exports[i]:
+            template["outputs"] = {
+                "parameters": [
+                    {
+                        "name": g,
+                        "valueFrom": {
+                            # Quoted, so the filter uses single quotes
+                            "jsonPath": '"{.status.outputs.parameters'
+                            "[?(@.name=='%s')].value}\"" % g
+                        },
+                    }
+                    for g in exports[i]
+                ]
+            }
+        shard_templates.append(template)
+
+        entry = OrderedDict(
+            [("name", "shard-%d" % i), ("template", "shard-%d" % i)]
+        )
+        if imports[i]:
+            entry["arguments"] = {
+                "parameters": [
+                    {
+                        "name": g,
+                        "value": '"{{%s.shard-%d.outputs.parameters.%s}}"'
+                        % (scope, j, g),
+                    }
+                    for g, j in imports[i].items()
+                ]
+            }
+        entries.append(entry)
+
+    if scope == "tasks":
+        for entry, dependencies in zip(entries, shard_dependencies):
+            if dependencies:
+                entry["dependencies"] = ["shard-%d" % j for j in dependencies]
+        main = OrderedDict(
+            [("name", spec["entrypoint"]), ("dag", {"tasks": entries})]
+        )
+    else:
+        main = OrderedDict(
+            [("name", spec["entrypoint"]), ("steps", [[e] for e in entries])]
+        )
+
+    parent_templates = [main] + shard_templates
+    if "onExit" in spec:
+        parent_templates.extend(
+            _template_closure([spec["onExit"]], templates).values()
+        )
+    parent_spec = OrderedDict()
+    mounted = _mounted_volumes(parent_templates)
+    for key, value in spec.items():
+        if key == "templates":
+            continue
+        if key in _VOLUME_FIELDS:
+            # The volumes mounted only by the steps belong to the shards
+            value = [v for v in value if _volume_name(v) in mounted]
+            if not value:
+                continue
+        parent_spec[key] = value
+    parent_spec["templates"] = parent_templates
+    parent = OrderedDict(workflow)
+    parent["spec"] = parent_spec
+    return parent
+
+
+def _mounted_volumes(templates):
+    """Return the names of the volumes mounted by the templates."""
+    names = set()
+    for template in templates:
+        containers = [template.get("container"), template.get("script")]
+        containers.extend(template.get("initContainers") or [])
+        containers.extend(template.get("sidecars") or [])
+        for container in containers:
+            for mount in (container or {}).get("volumeMounts") or []:
+                names.add(mount.get("name"))
+    return names
+
+
+def _volume_name(volume):
+    # Volume claim templates are named in their metadata
+    return volume.get("name") or (volume.get("metadata") or {}).get("name")
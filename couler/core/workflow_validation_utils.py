@@ -11,79 +11,159 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import copy
+import hashlib
 import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from argo.workflows import client
-    from argo.workflows.client.models import (
-        V1alpha1DAGTemplate,
-        V1alpha1ResourceTemplate,
-        V1alpha1ScriptTemplate,
-        V1alpha1WorkflowStep,
-    )
 
     _ARGO_INSTALLED = True
 except ImportError:
     _ARGO_INSTALLED = False
 
+_VALIDATION_CACHE_SIZE = 65536
+_default_validator = None
 
-def validate_workflow_yaml(original_wf):
-    if _ARGO_INSTALLED:
-        wf = copy.deepcopy(original_wf)
-        if (
-            "spec" not in wf
-            or "templates" not in wf["spec"]
-            or len(wf["spec"]["templates"]) <= 0
-        ):
-            if wf["kind"] == "CronWorkflow":
-                if (
-                    "workflowSpec" not in wf["spec"]
-                    or "templates" not in wf["spec"]["workflowSpec"]
-                    or len(wf["spec"]["workflowSpec"]["templates"]) <= 0
-                ):
-                    raise Exception(
-                        "CronWorkflow yaml must contain "
-                        "spec.workflowSpec.templates"
-                    )
-            else:
-                raise Exception("Workflow yaml must contain spec.templates")
-        if wf["kind"] == "CronWorkflow":
-            templates = wf["spec"]["workflowSpec"]["templates"]
-        else:
-            templates = wf["spec"]["templates"]
-        # Note that currently direct deserialization of `V1alpha1Template` is
-        # problematic so here we validate them individually instead.
-        for template in templates:
+
+class WorkflowValidator(object):
+    """Validate workflow templates against the Argo models.
+
+    One API client is reused for all the deserialization, and the content
+    hash of every validated section is remembered so that validating the
+    workflow again only checks the steps, tasks and templates that changed.
+    The sections that need checking can be spread over a thread pool.
+    """
+
+    def __init__(
+        self,
+        api_client=None,
+        max_workers=1,
+        cache_size=_VALIDATION_CACHE_SIZE,
+    ):
+        if api_client is None and _ARGO_INSTALLED:
+            api_client = client.ApiClient()
+        self._api_client = api_client
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self._validated = OrderedDict()
+        self._lock = threading.Lock()
+
+    def validate(self, wf):
+        if self._api_client is None:
+            return
+        # Deserialization only reads the sections, so the workflow is
+        # not copied.
+        sections = []
+        for template in _get_templates(wf):
+            # Note that currently direct deserialization of
+            # `V1alpha1Template` is problematic so here we validate
+            # them individually instead.
             if "steps" in template:
                 if template["steps"] is None or len(template["steps"]) <= 0:
                     raise Exception(
                         "At least one step definition must exist in steps"
                     )
                 for step in template["steps"]:
-                    _deserialize_wrapper(step, V1alpha1WorkflowStep)
+                    sections.append((step, "V1alpha1WorkflowStep"))
             elif "dag" in template:
+                dag = template["dag"]
                 if (
-                    template["dag"] is None
-                    or "tasks" not in template["dag"]
-                    or template["dag"]["tasks"] is None
-                    or len(template["dag"]["tasks"]) <= 0
+                    dag is None
+                    or "tasks" not in dag
+                    or dag["tasks"] is None
+                    or len(dag["tasks"]) <= 0
                 ):
                     raise Exception(
                         "At least one task definition must exist in dag.tasks"
                     )
-                _deserialize_wrapper(template["dag"], V1alpha1DAGTemplate)
+                # Validate the tasks one by one so that a new task does
+                # not invalidate the whole DAG.
+                dag_spec = dict(dag)
+                dag_spec["tasks"] = []
+                sections.append((dag_spec, "V1alpha1DAGTemplate"))
+                for task in dag["tasks"]:
+                    sections.append((task, "V1alpha1DAGTask"))
             elif "resource" in template:
-                _deserialize_wrapper(
-                    template["resource"], V1alpha1ResourceTemplate
+                sections.append(
+                    (template["resource"], "V1alpha1ResourceTemplate")
                 )
             elif "script" in template:
-                _deserialize_wrapper(
-                    template["script"], V1alpha1ScriptTemplate
+                sections.append((template["script"], "V1alpha1ScriptTemplate"))
+
+        pending = OrderedDict()
+        for content, response_type in sections:
+            data = json.dumps(content)
+            key = (
+                response_type,
+                hashlib.sha1(data.encode("utf-8")).hexdigest(),
+            )
+            if key not in pending and not self._is_validated(key):
+                pending[key] = data
+        if not pending:
+            return
+
+        if self.max_workers > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # Consume the results to raise the first validation error
+                list(executor.map(self._validate_section, pending.items()))
+        else:
+            for item in pending.items():
+                self._validate_section(item)
+
+    def clear_cache(self):
+        with self._lock:
+            self._validated.clear()
+
+    def _is_validated(self, key):
+        with self._lock:
+            if key in self._validated:
+                self._validated.move_to_end(key)
+                return True
+        return False
+
+    def _validate_section(self, item):
+        key, data = item
+        attr = type("Response", (), {"data": data})
+        self._api_client.deserialize(attr, key[0])
+        with self._lock:
+            self._validated[key] = True
+            while len(self._validated) > self.cache_size:
+                self._validated.popitem(last=False)
+
+
+def _get_templates(wf):
+    if (
+        "spec" not in wf
+        or "templates" not in wf["spec"]
+        or len(wf["spec"]["templates"]) <= 0
+    ):
+        if wf["kind"] == "CronWorkflow":
+            if (
+                "workflowSpec" not in wf["spec"]
+                or "templates" not in wf["spec"]["workflowSpec"]
+                or len(wf["spec"]["workflowSpec"]["templates"]) <= 0
+            ):
+                raise Exception(
+                    "CronWorkflow yaml must contain "
+                    "spec.workflowSpec.templates"
                 )
+        else:
+            raise Exception("Workflow yaml must contain spec.templates")
+    if wf["kind"] == "CronWorkflow":
+        return wf["spec"]["workflowSpec"]["templates"]
+    return wf["spec"]["templates"]
+
 
+def get_default_validator():
+    global _default_validator
+    if _default_validator is None:
+        _default_validator = WorkflowValidator()
+    return _default_validator
 
-def _deserialize_wrapper(dict_content, response_type):
-    body = {"data": json.dumps(dict_content)}
-    attr = type("Response", (), body)
-    client.ApiClient().deserialize(attr, response_type)
+
+def validate_workflow_yaml(original_wf):
+    if _ARGO_INSTALLED:
+        get_default_validator().validate(original_wf)
@@ -0,0 +1,196 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import datetime
+import email.utils
+import logging
+import random
+import threading
+import time
+
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    HTTPError,
+    MaxRetryError,
+    NewConnectionError,
+)
+
+# Too many requests, and the server errors that are usually transient
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# A create rejected with these statuses was not processed by the server
+_CREATE_RETRY_STATUSES = (429,)
+
+
+class RetryPolicy(object):
+    """Retry Kubernetes API calls that fail with a throttling or transient
+    server error, or a connection error.
+
+    The n-th retry waits `initial_backoff * multiplier ** (n - 1)` seconds,
+    capped at `max_backoff`, of which a random `jitter` fraction is taken
+    off so that concurrent callers do not retry in lockstep. A
+    `Retry-After` header sent by the server takes precedence, capped at
+    `max_backoff` too.
+    A 5xx error or a dropped connection on a create call may hide a
+    request that was processed, and retrying a workflow with
+    `generateName` would create it twice. So `call_create` only retries
+    the `create_retry_statuses` and the connections that failed before
+    the request was sent.
+    """
+
+    def __init__(
+        self,
+        max_attempts=5,
+        initial_backoff=0.5,
+        max_backoff=30,
+        multiplier=2,
+        jitter=0.5,
+        retry_statuses=_RETRY_STATUSES,
+        create_retry_statuses=_CREATE_RETRY_STATUSES,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.create_retry_statuses = frozenset(create_retry_statuses)
+
+    def call(self, func, *args, **kwargs):
+        """Call an idempotent API function, e.g. a get or a delete."""
+        return self._call(True, func, args, kwargs)
+
+    def call_create(self, func, *args, **kwargs):
+        """Call an API function creating an object."""
+        return self._call(False, func, args, kwargs)
+
+    def _call(self, idempotent, func, args, kwargs):
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except (ApiException, HTTPError, ConnectionError) as e:
+                delay = self.retry_delay(attempt, e, idempotent)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    def retry_delay(self, attempt, error, idempotent=True):
+        """Return how long to wait before retrying the call that failed
+        with the error at the given attempt, or None to give up."""
+        if attempt >= self.max_attempts or not self.is_retryable(
+            error, idempotent
+        ):
+            return None
+        delay = self.delay(attempt, error)
+        logging.warning(
+            "Kubernetes API call failed (%s), retrying in %.2fs"
+            % (_describe(error), delay)
+        )
+        return delay
+
+    def is_retryable(self, error, idempotent=True):
+        if isinstance(error, ApiException):
+            if idempotent:
+                return error.status in self.retry_statuses
+            return error.status in self.create_retry_statuses
+        return idempotent or _not_sent(error)
+
+    def delay(self, attempt, error=None):
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after)
+        backoff = min(
+            self.max_backoff,
+            self.initial_backoff * self.multiplier ** (attempt - 1),
+        )
+        return backoff * (1 - self.jitter * random.random())
+
+
+class RateLimiter(object):
+    """A token bucket shared by the threads of a submitter: up to `burst`
+    calls go through at once, then `rate` calls per second."""
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        wait = self._take()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Same as `acquire`, without blocking the event loop."""
+        wait = self._take()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _take(self):
+        """Take a token and return how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Take the token now, possibly going negative, so that the
+            # waiting callers are served in order
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+
+def _not_sent(error):
+    """Return whether the connection failed before the request was sent."""
+    if isinstance(error, MaxRetryError):
+        error = error.reason
+    return isinstance(
+        error,
+        (NewConnectionError, ConnectTimeoutError, ConnectionRefusedError),
+    )
+
+
+def _describe(error):
+    if isinstance(error, ApiException):
+        return "%s %s" % (error.status, error.reason)
+    return str(error)
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.datetime.now(date.tzinfo)
+    return max(0.0, (date - now).total_seconds())
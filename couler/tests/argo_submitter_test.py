@@ -0,0 +1,759 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from unittest import mock
+
+import pyaml
+import yaml
+from kubernetes import client as k8s_client
+from kubernetes.client.rest import ApiException
+
+import couler.argo as couler
+from couler.argo_submitter import ArgoSubmitter, SecretCache, to_plain_objects
+from couler.core import states
+from couler.core.templates import ConfigMap, Secret
+from couler.tests.argo_test import ArgoBaseTestCase
+
+
+def _round_trip(obj):
+    return yaml.safe_load(pyaml.dump(obj))
+
+
+class FakeCustomObjectsApi(object):
+    def __init__(self, fail_names=()):
+        self.fail_names = fail_names
+        self.created = []
+        self.lists = []
+        self.deleted_names = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.items = [
+            {
+                "metadata": {"name": "wf-0", "resourceVersion": "3"},
+                "status": {"phase": "Running"},
+            },
+            {
+                "metadata": {"name": "wf-1", "resourceVersion": "4"},
+                "status": {"phase": "Succeeded"},
+            },
+        ]
+        self._lock = threading.Lock()
+
+    def list_namespaced_custom_object(
+        self, group, version, namespace, plural, **kwargs
+    ):
+        self.lists.append(kwargs)
+        start = int(kwargs.get("_continue") or 0)
+        end = start + kwargs.get("limit", len(self.items))
+        page = {
+            "metadata": {"resourceVersion": "10"},
+            "items": self.items[start:end],
+        }
+        if end < len(self.items):
+            page["metadata"]["continue"] = str(end)
+        return page
+
+    def delete_namespaced_custom_object(
+        self, group, version, namespace, plural, name, body
+    ):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.005)
+        with self._lock:
+            self.in_flight -= 1
+            if name in self.fail_names:
+                raise RuntimeError("cannot delete %s" % name)
+            if name not in self.deleted_names and not any(
+                item["metadata"]["name"] == name for item in self.items
+            ):
+                raise ApiException(status=404, reason="NotFound")
+            self.deleted_names.append(name)
+        return {"status": "Success"}
+
+    def create_namespaced_custom_object(
+        self, group, version, namespace, plural, body
+    ):
+        name = body["metadata"].get("name") or body["metadata"]["generateName"]
+        if name in self.fail_names:
+            raise RuntimeError("cannot create %s" % name)
+        with self._lock:
+            uid = "uid-%d" % len(self.created)
+            self.created.append((namespace, plural, body))
+        response = copy.deepcopy(body)
+        response["metadata"]["name"] = name
+        response["metadata"]["uid"] = uid
+        return response
+
+
+class FakeCoreV1Api(object):
+    def __init__(self, fail_names=()):
+        self.fail_names = fail_names
+        self.secrets = []
+        self.existing = {}
+        self.config_maps = {}
+        # config map name -> owner references
+        self.owners = {}
+        self.lists = 0
+        self._lock = threading.Lock()
+
+    def _secret(self, name):
+        return k8s_client.V1Secret(
+            metadata=k8s_client.V1ObjectMeta(name=name, resource_version="1"),
+            data=self.existing[name],
+        )
+
+    def create_namespaced_secret(self, namespace, body):
+        name = body["metadata"]["name"]
+        if name in self.fail_names:
+            raise RuntimeError("cannot create secret %s" % name)
+        with self._lock:
+            if name in self.existing:
+                raise ApiException(status=409, reason="AlreadyExists")
+            self.secrets.append(name)
+            self.existing[name] = body["data"]
+        return body
+
+    def create_namespaced_config_map(self, namespace, body):
+        with self._lock:
+            if body["metadata"]["name"] in self.config_maps:
+                raise ApiException(status=409, reason="AlreadyExists")
+            self.config_maps[body["metadata"]["name"]] = body["data"]
+        return body
+
+    def patch_namespaced_config_map(self, name, namespace, body):
+        (operation,) = body
+        with self._lock:
+            if operation["path"] == "/metadata/ownerReferences":
+                self.owners[name] = list(operation["value"])
+            elif name not in self.owners:
+                raise ApiException(status=422, reason="Invalid")
+            else:
+                self.owners[name].append(operation["value"])
+        return {}
+
+    def read_namespaced_secret(self, name, namespace):
+        return self._secret(name)
+
+    def list_namespaced_secret(self, namespace, **kwargs):
+        self.lists += 1
+        self.list_kwargs = kwargs
+        return k8s_client.V1SecretList(
+            metadata=k8s_client.V1ListMeta(resource_version="1"),
+            items=[self._secret(name) for name in self.existing],
+        )
+
+
+class ScriptedWatch(object):
+    """Each stream call replays the next batch of events, an exception in
+    place of a batch is raised instead."""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.calls = []
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, *args, **kwargs):
+        self.calls.append(kwargs)
+        if not self.batches:
+            # Like a real watch that sees no events before it times out
+            time.sleep(0.01)
+            return
+        batch = self.batches.pop(0)
+        if isinstance(batch, Exception):
+            raise batch
+        for event in batch:
+            yield event
+
+    def stop(self):
+        pass
+
+
+def _workflow_event(event_type, name, phase, resource_version):
+    return {
+        "type": event_type,
+        "object": {
+            "metadata": {"name": name, "resourceVersion": resource_version},
+            "status": {"phase": phase},
+        },
+    }
+
+
+class FakeWatch(object):
+    """Yields the events queued on the class, then ends the stream."""
+
+    events = []
+
+    def stream(self, func, namespace, **kwargs):
+        while FakeWatch.events:
+            yield FakeWatch.events.pop(0)
+        time.sleep(0.01)
+
+    def stop(self):
+        pass
+
+
+def _workflow(name):
+    return {
+        "apiVersion": "argoproj.io/v1alpha1",
+        "kind": "Workflow",
+        "metadata": {"name": name},
+        "spec": {"entrypoint": "main", "templates": [{"name": "main"}]},
+    }
+
+
+def _failing_first(func, errors):
+    """Raise the given errors on the first calls, then call func."""
+
+    def wrapper(*args, **kwargs):
+        if errors:
+            raise errors.pop(0)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+class ArgoSubmitterTest(ArgoBaseTestCase):
+    def assertSameBody(self, obj):
+        expected = _round_trip(obj)
+        body = to_plain_objects(obj)
+        self.assertEqual(expected, body)
+        self.assertEqual(json.dumps(expected), json.dumps(body))
+
+    def test_to_plain_objects(self):
+        Point = namedtuple("Point", ["y", "x"])
+        self.assertSameBody(
+            OrderedDict(
+                [
+                    ("b", {"z": (1, 2.5), "a": [None, True, "x: y"]}),
+                    ("a", Point(1, 2)),
+                    ("c", {3, 1}),
+                    ("d", "multi\nline\n"),
+                    ("e", {1: "one", 0: "zero"}),
+                    ("f", ['"{{inputs.parameters.p}}"', "'q'", "123", "x:"]),
+                    ("g", {"x:": "a b", "0x1F": "- a", "~": ""}),
+                ]
+            )
+        )
+
+    def test_workflow_and_secret_body(self):
+        secret_name = couler.create_secret({"user": "u", "pass": "p"})
+        couler.run_container(
+            image="docker/whalesay:latest",
+            command=["cowsay"],
+            args=["hello"],
+            secret=couler.get_secret(secret_name),
+        )
+        self.assertSameBody(couler.workflow_yaml())
+        for secret in states._secrets.values():
+            self.assertSameBody(secret.to_yaml())
+
+    def test_submit_many(self):
+        custom_api = FakeCustomObjectsApi(fail_names=["wf-3"])
+        core_api = FakeCoreV1Api(fail_names=["bad"])
+        submitter = ArgoSubmitter(
+            custom_object_api_client=custom_api,
+            core_api_client=core_api,
+            watch_secrets=False,
+        )
+        shared = Secret("default", {"user": "u"})
+        bad = Secret("default", {"user": "v"}, name="bad")
+        workflows = [
+            (_workflow("wf-0"), [shared]),
+            (_workflow("wf-1"), [shared]),
+            (_workflow("wf-2"), [bad]),
+            _workflow("wf-3"),
+            _workflow("wf_4"),
+            _workflow("wf-5"),
+        ]
+
+        results = submitter.submit_many(workflows, max_concurrency=3)
+
+        self.assertEqual(
+            [True, True, False, False, False, True],
+            [r.succeeded for r in results],
+        )
+        self.assertEqual(["wf-0", "wf-1"], [r.name for r in results[:2]])
+        self.assertIn("secret bad", str(results[2].error))
+        self.assertIn("cannot create wf-3", str(results[3].error))
+        self.assertIsInstance(results[4].error, ValueError)
+        # The shared secret is created only once for the batch
+        self.assertEqual(1, core_api.secrets.count(shared.name))
+        self.assertEqual(
+            ["wf-0", "wf-1", "wf-5"],
+            sorted(
+                body["metadata"]["name"] for _, _, body in custom_api.created
+            ),
+        )
+
+    def test_secret_cache(self):
+        core_api = FakeCoreV1Api()
+        existing = Secret("default", {"user": "u"})
+        core_api.existing[existing.name] = existing.data
+        cache = SecretCache(core_api, "default", watch=False)
+        secrets = [Secret("default", {"user": str(i)}) for i in range(5)]
+
+        errors = cache.ensure([existing] + secrets + secrets)
+        self.assertEqual([None] * 6, list(errors.values()))
+        self.assertEqual(
+            sorted(s.name for s in secrets), sorted(core_api.secrets)
+        )
+        self.assertEqual(1, core_api.lists)
+
+        # Everything is known locally now
+        core_api.secrets = []
+        cache.ensure([existing] + secrets)
+        self.assertEqual([], core_api.secrets)
+        self.assertEqual(1, core_api.lists)
+
+    def test_secret_cache_conflict(self):
+        core_api = FakeCoreV1Api()
+        cache = SecretCache(core_api, "default", watch=False)
+        cache.ensure([Secret("default", {"a": "b"})])
+        same = Secret("default", {"user": "u"})
+        other = Secret("default", {"user": "u"}, name="named")
+        # Created behind the back of the cache
+        core_api.existing[same.name] = same.data
+        core_api.existing["named"] = {"user": "dg=="}
+
+        errors = cache.ensure([same, other])
+        self.assertIsNone(errors[same.name])
+        self.assertEqual(409, errors["named"].status)
+        # The conflict dropped the local view, so it is listed again
+        cache.ensure([same])
+        self.assertEqual(2, core_api.lists)
+        with self.assertRaises(ApiException):
+            ArgoSubmitter(
+                custom_object_api_client=FakeCustomObjectsApi(),
+                core_api_client=core_api,
+                watch_secrets=False,
+            ).submit(_workflow("wf"), secrets=[other])
+
+    def test_secret_cache_forbidden(self):
+        core_api = FakeCoreV1Api()
+        same = Secret("default", {"user": "u"})
+        core_api.existing[same.name] = same.data
+        cache = SecretCache(core_api, "default", watch=False)
+        cache.ensure([Secret("default", {"a": "b"})])
+        self.assertEqual(
+            {"label_selector": "couler/managed=true"}, core_api.list_kwargs
+        )
+
+        def forbidden(*args, **kwargs):
+            raise ApiException(status=403, reason="Forbidden")
+
+        # Without the permission to list or read the secrets, they are
+        # created and the existing ones are kept
+        core_api.list_namespaced_secret = forbidden
+        core_api.read_namespaced_secret = forbidden
+        cache = SecretCache(core_api, "default")
+        new = Secret("default", {"user": "v"})
+        errors = cache.ensure([same, new])
+        self.assertEqual({same.name: None, new.name: None}, dict(errors))
+        self.assertIn(new.name, core_api.secrets)
+        self.assertIsNone(cache._watch_thread)
+        # Both are known locally now
+        core_api.secrets = []
+        cache.ensure([same, new])
+        self.assertEqual([], core_api.secrets)
+
+    def test_secret_cache_watch(self):
+        core_api = FakeCoreV1Api()
+        secret = Secret("default", {"user": "u"})
+        cache = SecretCache(core_api, "default", watch_factory=FakeWatch)
+        self.addCleanup(cache.stop)
+        cache.ensure([Secret("default", {"a": "b"})])
+        FakeWatch.events.append(
+            {
+                "type": "ADDED",
+                "object": k8s_client.V1Secret(
+                    metadata=k8s_client.V1ObjectMeta(
+                        name=secret.name, resource_version="2"
+                    ),
+                    data=secret.data,
+                ),
+            }
+        )
+        for _ in range(100):
+            if secret.name in cache._secrets:
+                break
+            time.sleep(0.01)
+        # Known from the watch event, so it is not created again
+        self.assertEqual({secret.name: None}, dict(cache.ensure([secret])))
+        self.assertEqual(1, len(core_api.secrets))
+
+    def test_wait_many(self):
+        watch = ScriptedWatch(
+            [
+                [
+                    _workflow_event("MODIFIED", "other", "Running", "11"),
+                    _workflow_event("ADDED", "wf-2", "Pending", "12"),
+                    _workflow_event("MODIFIED", "wf-2", "Running", "13"),
+                ],
+                RuntimeError("connection reset"),
+                [
+                    _workflow_event("MODIFIED", "wf-0", "Failed", "14"),
+                    {"type": "ERROR", "object": {"code": 410}},
+                ],
+                [_workflow_event("DELETED", "wf-2", "Running", "20")],
+            ]
+        )
+        custom_api = FakeCustomObjectsApi()
+        submitter = ArgoSubmitter(
+            custom_object_api_client=custom_api,
+            core_api_client=FakeCoreV1Api(),
+            watch_factory=watch,
+        )
+        transitions = []
+        with mock.patch("couler.argo_submitter.time.sleep"):
+            statuses = submitter.wait_many(
+                ["wf-0", "wf-1", "wf-2"],
+                on_transition=lambda *args: transitions.append(args),
+            )
+
+        self.assertEqual(
+            ["Failed", "Succeeded", "Running"],
+            [status["phase"] for status in statuses.values()],
+        )
+        self.assertEqual(
+            [
+                ("wf-0", None, "Running"),
+                ("wf-1", None, "Succeeded"),
+                ("wf-2", None, "Pending"),
+                ("wf-2", "Pending", "Running"),
+                ("wf-0", "Running", "Failed"),
+            ],
+            transitions,
+        )
+        # Resumed from the last event after the failure, and listed again
+        # after the resource version expired
+        self.assertEqual(
+            ["10", "13", "13", "10"],
+            [kwargs["resource_version"] for kwargs in watch.calls],
+        )
+        self.assertEqual(2, len(custom_api.lists))
+
+    def test_wait_watches_by_name(self):
+        watch = ScriptedWatch(
+            [
+                [{"type": "ERROR", "object": {"code": 500}}],
+                [{"type": "ERROR", "object": {"code": 500}}],
+                [_workflow_event("MODIFIED", "wf-0", "Succeeded", "11")],
+            ]
+        )
+        custom_api = FakeCustomObjectsApi()
+        submitter = ArgoSubmitter(
+            custom_object_api_client=custom_api,
+            core_api_client=FakeCoreV1Api(),
+            watch_factory=watch,
+            retry_policy=couler.RetryPolicy(initial_backoff=1, jitter=0),
+        )
+        with mock.patch("couler.argo_submitter.time.sleep") as sleep:
+            status = submitter.wait("wf-0")
+
+        self.assertEqual("Succeeded", status["phase"])
+        selectors = [kwargs["field_selector"] for kwargs in custom_api.lists]
+        selectors += [kwargs["field_selector"] for kwargs in watch.calls]
+        self.assertEqual(["metadata.name=wf-0"] * 4, selectors)
+        # The error events back off instead of reconnecting right away
+        self.assertEqual([1, 2], [args[0] for args, _ in sleep.call_args_list])
+
+    def test_wait_timeout(self):
+        submitter = ArgoSubmitter(
+            custom_object_api_client=FakeCustomObjectsApi(),
+            core_api_client=FakeCoreV1Api(),
+            watch_factory=ScriptedWatch([]),
+        )
+        self.assertEqual(
+            "Succeeded", submitter.wait("wf-1", timeout=1)["phase"]
+        )
+        with self.assertRaisesRegex(TimeoutError, "wf-0"):
+            submitter.wait("wf-0", timeout=0.05)
+
+    def test_delete_many(self):
+        custom_api = FakeCustomObjectsApi(fail_names=["wf-3"])
+        old = "2020-01-01T00:00:00Z"
+        new = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        custom_api.items = [
+            {
+                "metadata": {
+                    "name": "wf-%d" % i,
+                    "creationTimestamp": old,
+                    "labels": {"team": "a"},
+                },
+                "status": {
+                    "phase": "Succeeded" if i % 2 else "Failed",
+                    "finishedAt": new if i == 5 else old,
+                },
+            }
+            for i in range(10)
+        ]
+        submitter = ArgoSubmitter(
+            custom_object_api_client=custom_api,
+            core_api_client=FakeCoreV1Api(),
+        )
+        progress = []
+
+        results = submitter.delete_many(
+            label_selector="team=a",
+            phases=["Succeeded"],
+            older_than=datetime.timedelta(days=7),
+            max_concurrency=2,
+            on_progress=lambda name, error: progress.append(name),
+        )
+
+        self.assertEqual(["wf-1", "wf-3", "wf-7", "wf-9"], list(results))
+        self.assertIsInstance(results["wf-3"], RuntimeError)
+        self.assertEqual(
+            ["wf-1", "wf-7", "wf-9"], sorted(custom_api.deleted_names)
+        )
+        self.assertEqual(sorted(results), sorted(progress))
+        self.assertLessEqual(custom_api.max_in_flight, 2)
+        self.assertEqual("team=a", custom_api.lists[0]["label_selector"])
+
+        # Running workflows are not deleted for their age
+        custom_api.items = [
+            {
+                "metadata": {"name": "running", "creationTimestamp": old},
+                "status": {"phase": "Running", "startedAt": old},
+            },
+            {
+                "metadata": {"name": "pending", "creationTimestamp": old},
+            },
+            {
+                "metadata": {"name": "finished", "creationTimestamp": old},
+                "status": {"phase": "Error"},
+            },
+        ]
+        results = submitter.delete_many(older_than=datetime.timedelta(days=7))
+        self.assertEqual(["finished"], list(results))
+
+        # Deleting by name, workflows that are already gone are fine
+        results = submitter.delete_many(names=["wf-0", "unknown"])
+        self.assertEqual({"wf-0": None, "unknown": None}, dict(results))
+        with self.assertRaises(ValueError):
+            submitter.delete_many()
+
+    def test_submit_config_maps(self):
+        core_api = FakeCoreV1Api()
+        submitter = ArgoSubmitter(
+            custom_object_api_client=FakeCustomObjectsApi(),
+            core_api_client=core_api,
+            watch_secrets=False,
+        )
+        config_map = ConfigMap({"items": "[1, 2]"})
+        for _ in range(2):
+            # Already created config maps are reused
+            submitter.submit(_workflow("wf"), config_maps=[config_map])
+        self.assertEqual(
+            {config_map.name: {"items": "[1, 2]"}}, core_api.config_maps
+        )
+        # Owned by both workflows, it is deleted with the last of them
+        self.assertEqual(
+            ["uid-0", "uid-1"],
+            [ref["uid"] for ref in core_api.owners[config_map.name]],
+        )
+        self.assertEqual(
+            "Workflow", core_api.owners[config_map.name][0]["kind"]
+        )
+
+    def test_submit_workflow_templates(self):
+        custom_api = FakeCustomObjectsApi()
+        submitter = ArgoSubmitter(
+            custom_object_api_client=custom_api,
+            core_api_client=FakeCoreV1Api(),
+            watch_secrets=False,
+        )
+        workflow_template = {
+            "apiVersion": "argoproj.io/v1alpha1",
+            "kind": "WorkflowTemplate",
+            "metadata": {"name": "wf-0123456789"},
+            "spec": {"entrypoint": "main", "templates": [{"name": "main"}]},
+        }
+        create = custom_api.create_namespaced_custom_object
+        plurals = []
+
+        def create_once(group, version, namespace, plural, body):
+            plurals.append(plural)
+            if plural == "workflowtemplates" and any(
+                p == plural for _, p, _ in custom_api.created
+            ):
+                raise ApiException(status=409, reason="AlreadyExists")
+            return create(group, version, namespace, plural, body)
+
+        custom_api.create_namespaced_custom_object = create_once
+        for _ in range(2):
+            # Already created workflow templates are reused
+            submitter.submit(
+                _workflow("wf"), workflow_templates=[workflow_template]
+            )
+        self.assertEqual(
+            ["workflowtemplates", "workflows", "workflows"],
+            [plural for _, plural, _ in custom_api.created],
+        )
+        # Created by another submitter
+        other = ArgoSubmitter(
+            custom_object_api_client=custom_api,
+            core_api_client=FakeCoreV1Api(),
+            watch_secrets=False,
+        )
+        other.submit(_workflow("wf"), workflow_templates=[workflow_template])
+        self.assertEqual(
+            ["workflowtemplates", "workflows", "workflows"]
+            + ["workflowtemplates", "workflows"],
+            plurals,
+        )
+
+    def test_create_workflow_template(self):
+        custom_api = FakeCustomObjectsApi()
+        objects = {}
+
+        def create(group, version, namespace, plural, body):
+            if body["metadata"]["name"] in objects:
+                raise ApiException(status=409, reason="AlreadyExists")
+            body["metadata"]["resourceVersion"] = "1"
+            objects[body["metadata"]["name"]] = body
+            return body
+
+        def get(group, version, namespace, plural, name):
+            return objects[name]
+
+        custom_api.create_namespaced_custom_object = create
+        custom_api.get_namespaced_custom_object = get
+        custom_api.replace_namespaced_custom_object = mock.Mock(
+            side_effect=lambda *args: objects.__setitem__(args[4], args[5])
+        )
+        submitter = ArgoSubmitter(
+            custom_object_api_client=custom_api,
+            core_api_client=FakeCoreV1Api(),
+            watch_secrets=False,
+        )
+
+        # The template is named after the workflow, before salting
+        couler.config_defaults(name_salter=lambda name: "%s-salted" % name)
+        self.addCleanup(couler.config_defaults, name_salter=lambda x: x)
+        couler.config_workflow(
+            name="pipeline", arguments={"message": "hello", "count": 3}
+        )
+        couler.run_container(
+            image="alpine:3.6",
+            command=["echo"],
+            args=['"{{workflow.parameters.message}}"'],
+        )
+        submitter.create_workflow_template = mock.Mock(
+            wraps=submitter.create_workflow_template
+        )
+        with mock.patch.object(states, "_enable_print_yaml", True):
+            self.assertEqual(
+                "pipeline", couler.create_workflow_template(submitter)
+            )
+        workflow_template = submitter.create_workflow_template.call_args[0][0]
+        spec = objects["pipeline"]["spec"]
+        self.assertEqual(
+            [
+                {"name": "message", "value": "hello"},
+                # Sent as YAML would be
+                {"name": "count", "value": 3},
+            ],
+            spec["arguments"]["parameters"],
+        )
+        self.assertEqual(0, len(couler.workflow.templates))
+
+        # An unchanged template is not replaced, a changed one is
+        submitter.create_workflow_template(workflow_template)
+        self.assertEqual(
+            0, custom_api.replace_namespaced_custom_object.call_count
+        )
+        workflow_template["spec"] = dict(
+            workflow_template["spec"], entrypoint="other"
+        )
+        submitter.create_workflow_template(workflow_template)
+        body = custom_api.replace_namespaced_custom_object.call_args[0][5]
+        self.assertEqual("1", body["metadata"]["resourceVersion"])
+        self.assertEqual("other", objects["pipeline"]["spec"]["entrypoint"])
+
+        submitter.submit = mock.Mock()
+        couler.run_workflow_template(
+            "pipeline", {"message": "hi"}, submitter=submitter
+        )
+        self.assertEqual(
+            {
+                "apiVersion": "argoproj.io/v1alpha1",
+                "kind": "Workflow",
+                "metadata": {"generateName": "pipeline-"},
+                "spec": {
+                    "workflowTemplateRef": {"name": "pipeline"},
+                    "arguments": {
+                        "parameters": [{"name": "message", "value": "hi"}]
+                    },
+                },
+            },
+            submitter.submit.call_args[0][0],
+        )
+
+    @mock.patch("couler.retry_policy.time.sleep")
+    def test_retry_and_rate_limit(self, sleep):
+        custom_api = FakeCustomObjectsApi()
+        core_api = FakeCoreV1Api()
+        throttled = ApiException(status=429, reason="TooManyRequests")
+        throttled.headers = {"Retry-After": "2"}
+        custom_api.create_namespaced_custom_object = _failing_first(
+            custom_api.create_namespaced_custom_object, [throttled]
+        )
+        core_api.list_namespaced_secret = _failing_first(
+            core_api.list_namespaced_secret, [ApiException(status=503)]
+        )
+        core_api.create_namespaced_secret = _failing_first(
+            core_api.create_namespaced_secret,
+            [ApiException(status=429, reason="TooManyRequests")],
+        )
+        rate_limiter = couler.RateLimiter(rate=1000, burst=1000)
+        rate_limiter.acquire = mock.Mock(wraps=rate_limiter.acquire)
+        submitter = ArgoSubmitter(
+            custom_object_api_client=custom_api,
+            core_api_client=core_api,
+            watch_secrets=False,
+            retry_policy=couler.RetryPolicy(initial_backoff=1, jitter=0),
+            rate_limiter=rate_limiter,
+        )
+
+        response = submitter.submit(
+            _workflow("wf"), [Secret("default", {"user": "u"})]
+        )
+
+        self.assertEqual("wf", response["metadata"]["name"])
+        self.assertEqual(1, len(custom_api.created))
+        self.assertEqual(1, len(core_api.secrets))
+        self.assertEqual(
+            [1, 1, 2], [args[0] for args, _ in sleep.call_args_list]
+        )
+        # Two lists and two creates of the secret, two of the workflow
+        self.assertEqual(6, rate_limiter.acquire.call_count)
+
+        # A create that failed on the server may have been processed, so
+        # a workflow with generateName is not created again
+        custom_api.create_namespaced_custom_object = _failing_first(
+            custom_api.create_namespaced_custom_object,
+            [ApiException(status=503)],
+        )
+        with self.assertRaises(ApiException):
+            submitter.submit(_workflow("wf2"))
+        self.assertEqual(1, len(custom_api.created))
@@ -75,6 +75,19 @@ class ArgoTest(ArgoBaseTestCase):
             env=None,
         )
 
+    def test_reassign_script_source(self):
+        couler.run_script(image="image1", command="bash", source="ls")
+        template = couler.workflow.get_template("test-reassign-script-source")
+        self.assertEqual("ls", template.to_dict()["script"]["source"])
+        template.source = "pwd"
+        self.assertEqual("pwd", template.to_dict()["script"]["source"])
+        template.command = "python"
+        template.source = self.setUp
+        self.assertEqual(
+            "\ncouler._cleanup()\nsuper().setUp()\n",
+            template.to_dict()["script"]["source"],
+        )
+
     def test_run_python_script(self):
         self.assertEqual(len(couler.workflow.templates), 0)
         couler.run_script("image1", command="python", source=self.setUp)
@@ -108,6 +121,72 @@ class ArgoTest(ArgoBaseTestCase):
             env=None,
         )
 
+    def test_run_script_source_from_configmap(self):
+        with self.assertRaises(ValueError):
+            couler.run_script("image1", source="ls", source_from="artifact")
+        couler.run_script(
+            "image1",
+            source=self.setUp,
+            args=["x"],
+            step_name="a",
+            source_from="configmap",
+        )
+        couler.run_script(
+            "image1", source=self.setUp, step_name="b", source_from="configmap"
+        )
+        # The same source is stored once
+        self.assertEqual(1, len(states._config_maps))
+        config_map = list(states._config_maps.values())[0]
+        self.assertEqual(
+            {"source": "\ncouler._cleanup()\nsuper().setUp()\n"},
+            config_map.data,
+        )
+
+        wf = couler.workflow_yaml()
+        self.assertEqual(
+            [
+                {
+                    "name": config_map.name,
+                    "configMap": {"name": config_map.name},
+                }
+            ],
+            wf["spec"]["volumes"],
+        )
+        template = wf["spec"]["templates"][1]
+        self.assertNotIn("script", template)
+        container = template["container"]
+        self.assertNotIn("source", container)
+        self.assertEqual(["python"], container["command"])
+        self.assertEqual(
+            ['"{{inputs.parameters.para-a-0}}"', "/couler/script/source"],
+            container["args"],
+        )
+        self.assertEqual(
+            [{"name": config_map.name, "mountPath": "/couler/script"}],
+            container["volumeMounts"],
+        )
+
+        # A reassigned source is stored and mounted instead
+        script = couler.workflow.get_template("a")
+        script.source = "print('changed')"
+        self.assertEqual(
+            {"source": "print('changed')"},
+            states._config_maps[script.config_map.name].data,
+        )
+        wf = couler.workflow_yaml()
+        self.assertIn(
+            {
+                "name": script.config_map.name,
+                "configMap": {"name": script.config_map.name},
+            },
+            wf["spec"]["volumes"],
+        )
+        self.assertEqual(
+            [{"name": script.config_map.name, "mountPath": "/couler/script"}],
+            wf["spec"]["templates"][1]["container"]["volumeMounts"],
+        )
+        couler._cleanup()
+
     def test_run_container_with_volume(self):
         volume = Volume("workdir", "my-existing-volume")
         volume_mount = VolumeMount("workdir", "/mnt/vol")
@@ -177,6 +256,40 @@ class ArgoTest(ArgoBaseTestCase):
         )
         couler._cleanup()
 
+    def test_run_container_with_shared_volumes(self):
+        couler.add_volume(Volume("shared-a", "claim-a"))
+        couler.add_volume(Volume("shared-b", "claim-b"))
+        # Registering a volume again replaces it in place
+        couler.add_volume(Volume("shared-a", "claim-c"))
+        couler.create_workflow_volume(VolumeClaimTemplate("workdir"))
+        for i in range(3):
+            couler.run_container(
+                image="docker/whalesay:latest",
+                command=["bash", "-c", "ls"],
+                step_name="step-%s" % i,
+                volume_mounts=[
+                    VolumeMount("shared-b", "/mnt/b"),
+                    VolumeMount("workdir", "/mnt/work"),
+                    VolumeMount("scratch-%s" % (i % 2), "/mnt/scratch"),
+                ],
+            )
+
+        self.assertTrue(couler.workflow.has_volume("shared-a"))
+        self.assertTrue(couler.workflow.has_pvc_template("workdir"))
+        self.assertFalse(couler.workflow.has_pvc_template("shared-a"))
+        wf = couler.workflow_yaml()
+        self.assertEqual(
+            [
+                Volume("shared-a", "claim-c").to_dict(),
+                Volume("shared-b", "claim-b").to_dict(),
+                {"name": "scratch-0", "emptyDir": {}},
+                {"name": "scratch-1", "emptyDir": {}},
+            ],
+            wf["spec"]["volumes"],
+        )
+        self.assertEqual(1, len(wf["spec"]["volumeClaimTemplates"]))
+        couler._cleanup()
+
     def test_artifact_passing_script(self):
         def producer():
             output_artifact = couler.create_local_artifact(path="/mnt/t1.txt")
@@ -575,6 +688,31 @@ class ArgoTest(ArgoBaseTestCase):
             template["inputs"]["parameters"],
         )
 
+    def test_template_to_dict_memoized(self):
+        couler.run_container(
+            image="docker/whalesay:latest",
+            args=["echo -n hello world"],
+            command=["bash", "-c"],
+            step_name="A",
+            resources={"cpu": "1"},
+        )
+        template = couler.workflow.get_template("A")
+        rendered = template.to_dict()
+        self.assertIs(rendered, template.to_dict())
+
+        # Reassigning a field invalidates the rendered template
+        template.image = "docker/whalesay:v2"
+        updated = template.to_dict()
+        self.assertIsNot(rendered, updated)
+        self.assertEqual("docker/whalesay:v2", updated["container"]["image"])
+        self.assertIs(updated, template.to_dict())
+
+        # So does toggling the global GPU environment overwrite
+        states._overwrite_nvidia_gpu_envs = True
+        self.assertIn("env", template.to_dict()["container"])
+        states._overwrite_nvidia_gpu_envs = False
+        couler._cleanup()
+
     def _verify_script_body(
         self, script_to_check, image, command, source, env
     ):
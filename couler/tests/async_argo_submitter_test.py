@@ -0,0 +1,271 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from unittest import mock
+
+from kubernetes import client as k8s_client
+
+from couler.async_argo_submitter import _AIOHTTP_INSTALLED, AsyncArgoSubmitter
+from couler.core.templates import ConfigMap, Secret
+from couler.retry_policy import RateLimiter, RetryPolicy
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeKubernetesHandler(BaseHTTPRequestHandler):
+    """Keeps the created objects of the fake API server in memory."""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, obj, headers=None):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def do_POST(self):
+        server = self.server
+        body = self._body()
+        with server.lock:
+            server.requests.append(("POST", self.path))
+            if server.errors:
+                status, headers = server.errors.pop(0)
+                return self._reply(status, {"reason": "Error"}, headers)
+            metadata = body["metadata"]
+            if "name" not in metadata:
+                server.counter += 1
+                metadata["name"] = "%s%d" % (
+                    metadata["generateName"],
+                    server.counter,
+                )
+            key = "%s/%s" % (self.path, metadata["name"])
+            if key in server.objects:
+                return self._reply(409, {"reason": "AlreadyExists"})
+            metadata["resourceVersion"] = "1"
+            metadata["uid"] = "uid-%d" % len(server.objects)
+            body["status"] = {"phase": "Pending"}
+            server.objects[key] = body
+        self._reply(201, body)
+
+    def do_GET(self):
+        with self.server.lock:
+            obj = self.server.objects.get(self.path)
+        if obj is None:
+            return self._reply(404, {"reason": "NotFound"})
+        self._reply(200, obj)
+
+    def do_PUT(self):
+        body = self._body()
+        with self.server.lock:
+            self.server.requests.append(("PUT", self.path))
+            if self.path not in self.server.objects:
+                return self._reply(404, {"reason": "NotFound"})
+            self.server.objects[self.path] = body
+        self._reply(200, body)
+
+    def do_PATCH(self):
+        (operation,) = self._body()
+        with self.server.lock:
+            metadata = self.server.objects[self.path]["metadata"]
+            if operation["path"] == "/metadata/ownerReferences":
+                metadata["ownerReferences"] = operation["value"]
+            elif "ownerReferences" not in metadata:
+                return self._reply(422, {"reason": "Invalid"})
+            else:
+                metadata["ownerReferences"].append(operation["value"])
+        self._reply(200, self.server.objects[self.path])
+
+    def do_DELETE(self):
+        self._body()
+        with self.server.lock:
+            obj = self.server.objects.pop(self.path, None)
+        if obj is None:
+            return self._reply(404, {"reason": "NotFound"})
+        self._reply(200, {"status": "Success"})
+
+
+def _workflow(name):
+    return {
+        "apiVersion": "argoproj.io/v1alpha1",
+        "kind": "Workflow",
+        "metadata": {"name": name},
+        "spec": {"entrypoint": "main", "templates": [{"name": "main"}]},
+    }
+
+
+@unittest.skipUnless(_AIOHTTP_INSTALLED, "aiohttp is not installed")
+class AsyncArgoSubmitterTest(unittest.TestCase):
+    def setUp(self):
+        self.server = _ThreadingHTTPServer(
+            ("127.0.0.1", 0), FakeKubernetesHandler
+        )
+        self.server.lock = threading.Lock()
+        self.server.objects = {}
+        self.server.requests = []
+        self.server.counter = 0
+        # (status, headers) of the responses to the next POST requests
+        self.server.errors = []
+        threading.Thread(target=self.server.serve_forever).start()
+        configuration = k8s_client.Configuration()
+        configuration.host = "http://127.0.0.1:%d" % self.server.server_port
+        self.submitter = AsyncArgoSubmitter(client_configuration=configuration)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.submitter.close())
+        self.loop.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_submit_status_and_delete(self):
+        secret = Secret("default", {"user": "u"})
+        wf = _workflow("wf")
+        del wf["metadata"]["name"]
+        wf["metadata"]["generateName"] = "wf-"
+
+        response = self.run_async(self.submitter.submit(wf, [secret]))
+        name = response["metadata"]["name"]
+        self.assertTrue(name.startswith("wf-"))
+        self.assertEqual(
+            {"phase": "Pending"},
+            self.run_async(self.submitter.get_status(name)),
+        )
+
+        self.run_async(self.submitter.delete(name))
+        with self.assertRaises(k8s_client.rest.ApiException) as e:
+            self.run_async(self.submitter.get_status(name))
+        self.assertEqual(404, e.exception.status)
+        with self.assertRaisesRegex(Exception, "deleting the workflow"):
+            self.run_async(self.submitter.delete(name))
+        with self.assertRaises(ValueError):
+            self.run_async(self.submitter.submit(_workflow("wf_1")))
+
+    def test_submit_many(self):
+        shared = Secret("default", {"user": "u"})
+        self.run_async(self.submitter.submit(_workflow("wf-0")))
+        workflows = [(_workflow("wf-%d" % i), [shared]) for i in range(20)]
+
+        results = self.run_async(
+            self.submitter.submit_many(workflows, max_concurrency=5)
+        )
+
+        self.assertEqual([False] + [True] * 19, [r.succeeded for r in results])
+        self.assertEqual(409, results[0].error.status)
+        self.assertEqual(
+            ["wf-%d" % i for i in range(1, 20)],
+            [r.name for r in results[1:]],
+        )
+        secret_requests = [
+            path for _, path in self.server.requests if "secrets" in path
+        ]
+        self.assertEqual(1, len(secret_requests))
+
+    def test_resubmit_with_secret(self):
+        secret = Secret("default", {"user": "u"})
+        for name in ["wf-0", "wf-1"]:
+            # The secret exists on the second submission
+            self.run_async(self.submitter.submit(_workflow(name), [secret]))
+        renamed = Secret("default", {"user": "other"}, name=secret.name)
+        with self.assertRaises(k8s_client.rest.ApiException) as e:
+            self.run_async(self.submitter.submit(_workflow("wf-2"), [renamed]))
+        self.assertEqual(409, e.exception.status)
+
+    def test_submit_config_maps(self):
+        config_map = ConfigMap({"items": "[1, 2]"})
+        for name in ["wf-0", "wf-1"]:
+            self.run_async(
+                self.submitter.submit(
+                    _workflow(name), config_maps=[config_map]
+                )
+            )
+        # Owned by both workflows, it is deleted with the last of them
+        metadata = self.server.objects[
+            "/api/v1/namespaces/default/configmaps/%s" % config_map.name
+        ]["metadata"]
+        self.assertEqual(
+            ["wf-0", "wf-1"],
+            [ref["name"] for ref in metadata["ownerReferences"]],
+        )
+
+    def test_retry_and_rate_limit(self):
+        rate_limiter = RateLimiter(rate=1000, burst=1000)
+        rate_limiter.acquire_async = mock.Mock(
+            wraps=rate_limiter.acquire_async
+        )
+        self.submitter.retry_policy = RetryPolicy(max_backoff=0.01)
+        self.submitter.rate_limiter = rate_limiter
+        self.server.errors = [(429, {"Retry-After": "1"})]
+
+        response = self.run_async(self.submitter.submit(_workflow("wf")))
+
+        self.assertEqual("wf", response["metadata"]["name"])
+        self.assertEqual(2, rate_limiter.acquire_async.call_count)
+        # A create that failed on the server may have been processed
+        self.server.errors = [(503, None)]
+        with self.assertRaises(k8s_client.rest.ApiException) as e:
+            self.run_async(self.submitter.submit(_workflow("wf-1")))
+        self.assertEqual(503, e.exception.status)
+        self.assertNotIn("wf-1", str(list(self.server.objects)))
+
+    def test_create_workflow_template(self):
+        path = (
+            "/apis/argoproj.io/v1alpha1/namespaces/default/"
+            "workflowtemplates/pipeline"
+        )
+        workflow_template = {
+            "apiVersion": "argoproj.io/v1alpha1",
+            "kind": "WorkflowTemplate",
+            "metadata": {"name": "pipeline"},
+            "spec": {"entrypoint": "main", "templates": [{"name": "main"}]},
+        }
+        for _ in range(2):
+            # The template is only replaced when its spec changes
+            self.run_async(
+                self.submitter.create_workflow_template(workflow_template)
+            )
+        workflow_template["spec"]["entrypoint"] = "other"
+        self.run_async(
+            self.submitter.create_workflow_template(workflow_template)
+        )
+        self.assertEqual(
+            [("POST", path.rsplit("/", 1)[0])] * 3 + [("PUT", path)],
+            self.server.requests,
+        )
+        self.assertEqual(
+            "other", self.server.objects[path]["spec"]["entrypoint"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+import unittest
+
+from kubernetes import client as k8s_client
+
+import couler.argo as couler
+from couler import client_registry
+from couler.argo_submitter import ArgoSubmitter
+from couler.tests.async_argo_submitter_test import (
+    FakeKubernetesHandler,
+    _ThreadingHTTPServer,
+)
+
+_KUBE_CONFIG = """apiVersion: v1
+kind: Config
+clusters:
+- name: fake
+  cluster:
+    server: http://127.0.0.1:%d
+users:
+- name: fake
+  user:
+    token: abc
+contexts:
+- name: fake
+  context:
+    cluster: fake
+    user: fake
+current-context: fake
+"""
+
+
+class ClientRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = _ThreadingHTTPServer(
+            ("127.0.0.1", 0), FakeKubernetesHandler
+        )
+        self.server.lock = threading.Lock()
+        self.server.objects = {}
+        self.server.requests = []
+        self.server.counter = 0
+        threading.Thread(target=self.server.serve_forever).start()
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".yaml", delete=False
+        ) as f:
+            f.write(_KUBE_CONFIG % self.server.server_port)
+        self.config_file = f.name
+
+    def tearDown(self):
+        client_registry.clear()
+        k8s_client.Configuration.set_default(None)
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.config_file)
+
+    def test_clients_are_shared(self):
+        clients = client_registry.get_clients(config_file=self.config_file)
+        self.assertIs(
+            clients, client_registry.get_clients(config_file=self.config_file)
+        )
+        other = client_registry.get_clients(
+            "other", config_file=self.config_file
+        )
+        self.assertIsNot(clients, other)
+        self.assertIs(clients.api_client, other.api_client)
+        self.assertIn(
+            "Bearer abc",
+            str(clients.api_client.configuration.auth_settings()),
+        )
+
+        submitter = ArgoSubmitter(config_file=self.config_file)
+        self.assertIs(
+            clients.custom_objects_api,
+            submitter.get_custom_object_api_client(),
+        )
+        self.assertIs(
+            submitter.get_secret_cache(),
+            ArgoSubmitter(config_file=self.config_file).get_secret_cache(),
+        )
+
+        client_registry.set_pool_size(32)
+        self.assertEqual(
+            32,
+            clients.api_client.rest_client.pool_manager.connection_pool_kw[
+                "maxsize"
+            ],
+        )
+
+    def test_delete_uses_registry(self):
+        path = "/apis/argoproj.io/v1alpha1/namespaces/default/workflows/wf"
+        for name in ["wf", "wf2"]:
+            self.server.objects[path[: -len("wf")] + name] = {}
+        couler.delete("wf", config_file=self.config_file)
+        api_client = client_registry.get_api_client(
+            config_file=self.config_file
+        )
+        couler.delete("wf2", config_file=self.config_file)
+        self.assertEqual({}, self.server.objects)
+        self.assertIs(
+            api_client,
+            client_registry.get_api_client(config_file=self.config_file),
+        )
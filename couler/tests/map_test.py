@@ -11,9 +11,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import unittest
+
+import pyaml
+import yaml
+
 import couler.argo as couler
+from couler.core import states
+from couler.core.plain_objects import to_plain_objects
 from couler.tests.argo_yaml_test import ArgoYamlTest
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 couler.config_workflow(name="pytest")
 
 
@@ -23,6 +36,14 @@ def consume(message):
     )
 
 
+def greet(greeting, name):
+    return couler.run_container(
+        image="docker/whalesay:latest",
+        command=["cowsay"],
+        args=[greeting, name],
+    )
+
+
 class MapTest(ArgoYamlTest):
     def test_map_function(self):
         test_paras = ["t1", "t2", "t3"]
@@ -94,6 +115,239 @@ class MapTest(ArgoYamlTest):
             self.assertListEqual(map_step["withItems"], expected_with_items)
             couler._cleanup()
 
+    def test_map_items_from_configmap(self):
+        # Quotes are escaped once in the JSON of the items
+        test_paras = ['t"%d' % i for i in range(100)]
+        steps = couler.map(
+            lambda x: consume(x),
+            test_paras,
+            items_from="configmap",
+            max_chunk_bytes=1024,
+        )
+        wf = couler.workflow_yaml()
+
+        map_steps = wf["spec"]["templates"][0]["steps"][0]
+        self.assertEqual(len(steps), len(map_steps))
+        self.assertGreater(len(map_steps), 1)
+        parameters = wf["spec"]["arguments"]["parameters"]
+        self.assertEqual(len(map_steps), len(parameters))
+        config_maps = list(states._config_maps.values())
+        items = []
+        for map_step, parameter, config_map in zip(
+            map_steps, parameters, config_maps
+        ):
+            self.assertNotIn("withItems", map_step)
+            self.assertEqual(map_step["template"], "consume")
+            self.assertEqual(
+                map_step["withParam"],
+                '"{{workflow.parameters.%s}}"' % parameter["name"],
+            )
+            self.assertEqual(
+                parameter["valueFrom"],
+                {"configMapKeyRef": {"name": config_map.name, "key": "items"}},
+            )
+            self.assertLessEqual(len(config_map.data["items"]), 1024)
+            items.extend(json.loads(config_map.data["items"]))
+        self.assertEqual(
+            [{"para-consume-0": para} for para in test_paras], items
+        )
+        # A chunk only ends when the next item does not fit in it
+        for config_map, next_map in zip(config_maps, config_maps[1:]):
+            first = json.dumps(json.loads(next_map.data["items"])[0])
+            self.assertGreater(
+                len(config_map.data["items"].encode("utf-8"))
+                + len(first.encode("utf-8"))
+                + 2,
+                1024,
+            )
+        # The workflow can be printed and submitted
+        plain = to_plain_objects(wf)
+        self.assertEqual(plain, yaml.safe_load(pyaml.dump(wf)))
+        self.assertEqual(
+            "{{workflow.parameters.%s}}" % parameters[0]["name"],
+            plain["spec"]["templates"][0]["steps"][0][0]["withParam"],
+        )
+        couler._cleanup()
+
+        # A small input is fanned out by a single step
+        step = couler.map(
+            lambda x: consume(x), ["t1", "t2"], items_from="configmap"
+        )
+        wf = couler.workflow_yaml()
+        self.assertEqual(
+            [step.to_dict()], wf["spec"]["templates"][0]["steps"][0]
+        )
+        self.assertEqual(1, len(states._config_maps))
+        with self.assertRaises(ValueError):
+            couler.map(lambda x: consume(x), ["t1"], items_from="artifact")
+        couler._cleanup()
+
+    def test_map_batches(self):
+        def produce(message):
+            return couler.run_container(
+                image="alpine:3.6",
+                command=["echo"],
+                args=[message],
+                output=couler.create_parameter_artifact("/tmp/out.txt"),
+            )
+
+        step = couler.map(lambda x: produce(x), ["a b", 3, "c"], batch_size=2)
+        wf = couler.workflow_yaml()
+
+        batch_template = wf["spec"]["templates"][2]
+        self.assertEqual("produce-batch", batch_template["name"])
+        self.assertEqual(
+            ["sh", "-c"], batch_template["container"]["command"][:2]
+        )
+        output_names = [
+            o["name"] for o in batch_template["outputs"]["parameters"]
+        ]
+        self.assertEqual(2, len(output_names))
+        self.assertEqual(
+            "/tmp/out.txt.1",
+            batch_template["outputs"]["parameters"][1]["valueFrom"]["path"],
+        )
+        self.assertEqual(
+            "set -e\n"
+            'eval "set -- $0"\n'
+            "i=0\n"
+            "while [ $# -gt 0 ]; do\n"
+            'COULER_ITEM_0="$1"\n'
+            "shift 1\n"
+            'echo "$COULER_ITEM_0"\n'
+            "mv -f /tmp/out.txt /tmp/out.txt.$i\n"
+            "i=$((i + 1))\n"
+            "done\n"
+            "while [ $i -lt 2 ]; do\n"
+            ": > /tmp/out.txt.$i\n"
+            "i=$((i + 1))\n"
+            "done\n",
+            batch_template["container"]["command"][2],
+        )
+        map_step = wf["spec"]["templates"][0]["steps"][0][0]
+        self.assertEqual(step.to_dict(), map_step)
+        self.assertEqual("produce-batch", map_step["template"])
+        # Each batch only passes the values of its items
+        self.assertEqual(
+            [
+                {"para-produce-batch-0": "'a b' 3"},
+                {"para-produce-batch-0": "c"},
+            ],
+            map_step["withItems"],
+        )
+        couler._cleanup()
+
+        def run(message):
+            return couler.run_script(
+                image="python:3.6",
+                args=[message],
+                source="print('{{inputs.parameters.para-run-0}}')",
+            )
+
+        couler.map(
+            lambda x: run(x),
+            ["x", "y", "z"],
+            batch_duration=60,
+            item_duration=20,
+        )
+        wf = couler.workflow_yaml()
+        batch_script = wf["spec"]["templates"][2]["container"]["command"][2]
+        # The source is written for each item from a single copy
+        self.assertEqual(1, batch_script.count("print("))
+        self.assertIn(
+            "couler_source() {\n"
+            "printf '%s' 'print('\"'\"''\"$COULER_ITEM_0\"''\"'\"')'\n"
+            "}\n",
+            batch_script,
+        )
+        self.assertIn(
+            "couler_source > /tmp/couler-batch-source\n"
+            'python "$COULER_ITEM_0" /tmp/couler-batch-source\n',
+            batch_script,
+        )
+        map_step = wf["spec"]["templates"][0]["steps"][0][0]
+        self.assertEqual(
+            [{"para-run-batch-0": "x y z"}], map_step["withItems"]
+        )
+        couler._cleanup()
+
+    def test_map_multiple_arguments(self):
+        expected_with_items = [
+            {"para-greet-0": "hello", "para-greet-1": "a"},
+            {"para-greet-0": "hi", "para-greet-1": "b"},
+        ]
+        inputs = [
+            [("hello", "a"), ("hi", "b")],
+            (row for row in [("hello", "a"), ("hi", "b")]),
+        ]
+        for input_list in inputs:
+            couler.map(greet, input_list)
+            wf = couler.workflow_yaml()
+            map_step = wf["spec"]["templates"][0]["steps"][0][0]
+            self.assertListEqual(map_step["withItems"], expected_with_items)
+            couler._cleanup()
+
+        # Columns are matched to the arguments by name, and their items
+        # are the JSON of withParam
+        columns = [
+            {"greeting": ["hello", "hi"], "name": ["a", "b"]},
+            {"name": ["a", "b"], "greeting": ["hello", "hi"]},
+        ]
+        for input_list in columns:
+            couler.map(greet, input_list)
+            wf = couler.workflow_yaml()
+            map_step = wf["spec"]["templates"][0]["steps"][0][0]
+            self.assertNotIn("withItems", map_step)
+            self.assertListEqual(
+                json.loads(map_step["withParam"]), expected_with_items
+            )
+            couler._cleanup()
+        couler.map(
+            lambda a, b: greet(a, b), {"b": ["a", "b"], "a": ["hello", "hi"]}
+        )
+        map_step = couler.workflow_yaml()["spec"]["templates"][0]["steps"][0]
+        self.assertListEqual(
+            json.loads(map_step[0]["withParam"]), expected_with_items
+        )
+        couler._cleanup()
+
+        with self.assertRaises(ValueError):
+            couler.map(greet, {"greeting": ["hello", "hi"], "name": ["a"]})
+        couler._cleanup()
+        with self.assertRaises(ValueError):
+            couler.map(greet, {"greeting": ["hello"], "other": ["a"]})
+        couler._cleanup()
+        with self.assertRaises(ValueError):
+            couler.map(greet, {"greeting": ["hello"]})
+        couler._cleanup()
+        with self.assertRaises(ValueError):
+            couler.map(lambda x: greet(x, "a"), ["hello", "hi"])
+        couler._cleanup()
+        with self.assertRaises(ValueError):
+            couler.map(consume, [])
+        couler._cleanup()
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_map_numpy_arrays(self):
+        couler.map(consume, np.arange(3))
+        map_step = couler.workflow_yaml()["spec"]["templates"][0]["steps"][0]
+        self.assertListEqual(
+            [{"para-consume-0": i} for i in range(3)],
+            map_step[0]["withItems"],
+        )
+        couler._cleanup()
+
+        couler.map(greet, np.array([["hello", "a"], ["hi", "b"]]))
+        map_step = couler.workflow_yaml()["spec"]["templates"][0]["steps"][0]
+        self.assertListEqual(
+            [
+                {"para-greet-0": "hello", "para-greet-1": "a"},
+                {"para-greet-0": "hi", "para-greet-1": "b"},
+            ],
+            map_step[0]["withItems"],
+        )
+        couler._cleanup()
+
     # TODO: Provide new test case without `tf.train`.
     # def test_map_function_with_run_job(self):
     #     couler.map(
@@ -17,6 +17,7 @@ import couler.argo as couler
 from couler.core import states
 
 try:
+    from couler.core import proto_repr
     from couler.core.proto_repr import get_default_proto_workflow
 except Exception:
     # set cleanup_proto_workflow to an empty function for compatibility
@@ -161,6 +162,34 @@ spec:
         self.assertEqual(len(t.outputs), 3)
         self.assertEqual(t.outputs[0].parameter.name, "job-name")
 
+    def test_dag_dependencies(self):
+        def job(name):
+            couler.run_container(
+                image="docker/whalesay:latest",
+                command=["cowsay"],
+                args=[name],
+                step_name=name,
+            )
+
+        couler.set_dependencies(lambda: job("A"), dependencies=None)
+        couler.set_dependencies(lambda: job("B"), dependencies=["A"])
+        couler.set_dependencies(lambda: job("C"), dependencies=["A"])
+        couler.set_dependencies(lambda: job("D"), dependencies=["B", "C"])
+        proto_wf = get_default_proto_workflow()
+        deps = {
+            s.steps[0].name: list(s.steps[0].dependencies)
+            for s in proto_wf.steps
+        }
+        self.assertEqual(
+            {"A": [], "B": ["A"], "C": ["A"], "D": ["B", "C"]}, deps
+        )
+
+        # Attaching in bulk looks up the same steps
+        proto_repr.add_deps_to_steps(["B", "unknown"])
+        self.assertEqual(
+            ["A", "A"], list(proto_wf.steps[1].steps[0].dependencies)
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,167 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import email.utils
+import threading
+import time
+import unittest
+from unittest import mock
+
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    MaxRetryError,
+    NewConnectionError,
+    ProtocolError,
+)
+
+from couler.retry_policy import RateLimiter, RetryPolicy
+
+
+def _flaky(errors, result="ok"):
+    """Return a function raising the given errors, then returning."""
+    errors = list(errors)
+    calls = []
+
+    def func(*args):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return func, calls
+
+
+def _api_exception(status, retry_after=None):
+    e = ApiException(status=status, reason="Error")
+    if retry_after is not None:
+        e.headers = {"Retry-After": retry_after}
+    return e
+
+
+class RetryPolicyTest(unittest.TestCase):
+    @mock.patch("couler.retry_policy.time.sleep")
+    def test_backoff(self, sleep):
+        policy = RetryPolicy(
+            max_attempts=5, initial_backoff=1, max_backoff=3, jitter=0
+        )
+        func, calls = _flaky(
+            [
+                _api_exception(503),
+                _api_exception(429),
+                ProtocolError("connection reset"),
+                _api_exception(500),
+            ]
+        )
+
+        self.assertEqual("ok", policy.call(func, "a"))
+        self.assertEqual([("a",)] * 5, calls)
+        self.assertEqual(
+            [1, 2, 3, 3], [args[0] for args, _ in sleep.call_args_list]
+        )
+
+    def test_jitter(self):
+        policy = RetryPolicy(initial_backoff=4, jitter=0.5)
+        for _ in range(20):
+            self.assertTrue(2 <= policy.delay(1) <= 4)
+
+    @mock.patch("couler.retry_policy.time.sleep")
+    def test_retry_after(self, sleep):
+        policy = RetryPolicy(initial_backoff=1, max_backoff=120, jitter=0)
+        date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        func, _ = _flaky([_api_exception(429, "7"), _api_exception(503, date)])
+
+        policy.call(func)
+
+        delays = [args[0] for args, _ in sleep.call_args_list]
+        self.assertEqual(7, delays[0])
+        self.assertTrue(55 < delays[1] <= 60)
+        # The server cannot make a caller wait longer than max_backoff
+        policy = RetryPolicy(max_backoff=5)
+        self.assertEqual(5, policy.delay(1, _api_exception(429, "3600")))
+
+    @mock.patch("couler.retry_policy.time.sleep")
+    def test_create(self, sleep):
+        policy = RetryPolicy(initial_backoff=1, jitter=0)
+        # Not processed by the server
+        func, calls = _flaky(
+            [
+                _api_exception(429),
+                NewConnectionError(None, "connection refused"),
+                MaxRetryError(None, "/", ConnectTimeoutError("timed out")),
+            ]
+        )
+        self.assertEqual("ok", policy.call_create(func))
+        self.assertEqual(4, len(calls))
+
+        # Possibly processed by the server
+        for error in [
+            _api_exception(500),
+            _api_exception(503),
+            ProtocolError("connection reset"),
+            MaxRetryError(None, "/", ProtocolError("connection reset")),
+        ]:
+            func, calls = _flaky([error])
+            with self.assertRaises(type(error)):
+                policy.call_create(func)
+            self.assertEqual(1, len(calls))
+            # Other calls are retried
+            func, calls = _flaky([error])
+            self.assertEqual("ok", policy.call(func))
+            self.assertEqual(2, len(calls))
+
+    @mock.patch("couler.retry_policy.time.sleep")
+    def test_give_up(self, sleep):
+        policy = RetryPolicy(max_attempts=3)
+        func, calls = _flaky([_api_exception(404)])
+        with self.assertRaises(ApiException):
+            policy.call(func)
+        self.assertEqual(1, len(calls))
+
+        func, calls = _flaky([_api_exception(503)] * 3)
+        with self.assertRaises(ApiException):
+            policy.call(func)
+        self.assertEqual(3, len(calls))
+
+        func, calls = _flaky([ValueError("not an API error")])
+        with self.assertRaises(ValueError):
+            policy.call(func)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(2, sleep.call_count)
+
+        with self.assertRaises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_token_bucket(self):
+        limiter = RateLimiter(rate=100, burst=5)
+        start = time.monotonic()
+        threads = [
+            threading.Thread(
+                target=lambda: [limiter.acquire() for _ in range(5)]
+            )
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The burst goes through at once, the other 10 at 100 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        with self.assertRaises(ValueError):
+            RateLimiter(rate=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+import couler.argo as couler
+from couler.core import states
+from couler.core.shared_templates import extract_shared_templates
+from couler.tests.argo_test import ArgoBaseTestCase
+
+couler.config_workflow(name="pytest")
+
+
+def echo(message, step_name=None):
+    return couler.run_container(
+        image="alpine:3.6",
+        command=["echo"],
+        args=[message],
+        step_name=step_name,
+    )
+
+
+def whalesay(message, step_name=None):
+    return couler.run_container(
+        image="docker/whalesay:latest",
+        command=["cowsay"],
+        args=[message],
+        step_name=step_name,
+    )
+
+
+class SharedTemplatesTest(ArgoBaseTestCase):
+    def test_extract_named_templates(self):
+        echo("a")
+        whalesay("b")
+        echo("c")
+        wf = couler.workflow_yaml()
+
+        shared, workflow_templates = extract_shared_templates(wf, ["echo"])
+        self.assertEqual(1, len(workflow_templates))
+        workflow_template = workflow_templates[0]
+        self.assertEqual("WorkflowTemplate", workflow_template["kind"])
+        self.assertTrue(
+            workflow_template["metadata"]["name"].startswith("echo-")
+        )
+        self.assertEqual(
+            [wf["spec"]["templates"][1]],
+            workflow_template["spec"]["templates"],
+        )
+        templates = shared["spec"]["templates"]
+        self.assertEqual(
+            [wf["spec"]["entrypoint"], "whalesay"],
+            [t["name"] for t in templates],
+        )
+        steps = [group[0] for group in templates[0]["steps"]]
+        expected_ref = {
+            "name": workflow_template["metadata"]["name"],
+            "template": "echo",
+        }
+        self.assertEqual(expected_ref, steps[0]["templateRef"])
+        self.assertNotIn("template", steps[0])
+        self.assertEqual("whalesay", steps[1]["template"])
+        self.assertEqual(expected_ref, steps[2]["templateRef"])
+        # The rendered workflow is left as it is
+        self.assertEqual("echo", wf["spec"]["templates"][1]["name"])
+
+        # The same content gives the same WorkflowTemplate
+        self.assertEqual(
+            workflow_templates,
+            extract_shared_templates(wf, ["echo"])[1],
+        )
+        with self.assertRaises(ValueError):
+            extract_shared_templates(wf, [wf["spec"]["entrypoint"]])
+        with self.assertRaises(ValueError):
+            extract_shared_templates(wf, ["unknown"])
+
+    def test_extract_reused_templates(self):
+        echo("a")
+        whalesay("b")
+        echo("c")
+        wf = couler.workflow_yaml()
+
+        self.assertEqual((wf, []), extract_shared_templates(wf, 3))
+        shared, workflow_templates = extract_shared_templates(wf, 2)
+        self.assertEqual(
+            ["echo"],
+            [wt["spec"]["templates"][0]["name"] for wt in workflow_templates],
+        )
+
+    def test_extract_dag_templates(self):
+        couler.set_dependencies(lambda: echo("a", "A"), dependencies=None)
+        couler.set_dependencies(lambda: whalesay("b", "B"), dependencies=None)
+        couler.set_dependencies(lambda: echo("c", "C"), dependencies=["A"])
+        wf = couler.workflow_yaml()
+
+        shared, workflow_templates = extract_shared_templates(wf, ["A", "C"])
+        self.assertEqual(2, len(workflow_templates))
+        tasks = shared["spec"]["templates"][0]["dag"]["tasks"]
+        self.assertEqual(
+            ["A", None, "C"],
+            [t.get("templateRef", {}).get("template") for t in tasks],
+        )
+        self.assertEqual(["A"], tasks[2]["dependencies"])
+
+    def test_submit_shared_templates(self):
+        couler.config_workflow(shared_templates=["echo"])
+        echo("a")
+        submitter = mock.Mock(spec=couler.ArgoSubmitter)
+        # Submitting turns off the printing of the YAML at exit
+        with mock.patch.object(states, "_enable_print_yaml", True):
+            couler.run(submitter=submitter)
+
+        wf = submitter.submit.call_args[0][0]
+        workflow_templates = submitter.submit.call_args[1][
+            "workflow_templates"
+        ]
+        self.assertEqual(
+            workflow_templates[0]["metadata"]["name"],
+            wf["spec"]["templates"][0]["steps"][0][0]["templateRef"]["name"],
+        )
+        self.assertEqual(1, len(wf["spec"]["templates"]))
@@ -12,6 +12,8 @@
 # limitations under the License.
 
 import base64
+import inspect
+from unittest import mock
 
 from couler.core import utils
 from couler.tests.argo_test import ArgoBaseTestCase
@@ -37,6 +39,21 @@ self.assertTrue(func_name in ["pytest", "runpy"])
 """
         self.assertEqual(code, utils.body(self.test_get_root_caller_filename))
 
+    def test_body_cached(self):
+        def func():
+            return 1
+
+        with mock.patch.object(
+            inspect, "getsource", wraps=inspect.getsource
+        ) as getsource:
+            self.assertEqual("\nreturn 1\n", utils.body(func))
+            self.assertEqual("\nreturn 1\n", utils.body(func))
+            self.assertEqual(1, getsource.call_count)
+            # The source is read again once its file is modified
+            with mock.patch("os.path.getmtime", return_value=0.0):
+                self.assertEqual("\nreturn 1\n", utils.body(func))
+            self.assertEqual(2, getsource.call_count)
+
     def test_get_root_caller_filename(self):
         func_name = utils.workflow_filename()
         # Here we assume that we are using `pytest` or `python -m pytest`
@@ -50,6 +67,32 @@ self.assertTrue(func_name in ["pytest", "runpy"])
 
         inner_func()
 
+    def test_invocation_location_line_number(self):
+        def inner_func():
+            return utils.invocation_location()
+
+        def outer_func():
+            return inner_func()
+
+        expected_line = inspect.currentframe().f_lineno + 1
+        func_name, line_number = outer_func()
+        self.assertEqual("outer-func", func_name)
+        self.assertEqual(expected_line, line_number)
+
+    def test_invocation_location_cached_call_site(self):
+        def inner_func():
+            return utils.invocation_location()
+
+        def outer_func():
+            return inner_func()
+
+        hits = utils._call_site.cache_info().hits
+        locations = []
+        for _ in range(3):
+            locations.append(outer_func())
+        self.assertEqual(1, len(set(locations)))
+        self.assertGreaterEqual(utils._call_site.cache_info().hits, hits + 2)
+
     def test_encode_base64(self):
         s = "test encode string"
         encode = utils.encode_base64(s)
@@ -326,6 +326,93 @@ class WorkflowBasicTest(ArgoYamlTest):
         }
         self.assertEqual(wf["metadata"], expected_meta)
 
+    def test_workflow_to_dict_incremental(self):
+        from couler.core.templates.volume import VolumeMount
+
+        # A workflow without steps keeps rendering them as an empty dict
+        self.assertEqual(
+            {}, couler.workflow_yaml()["spec"]["templates"][0]["steps"]
+        )
+        heads()
+        couler.run_container(
+            image="python:3.6",
+            command=["bash", "-c", "ls /mnt"],
+            step_name="list-mnt",
+            volume_mounts=[VolumeMount("scratch", "/mnt")],
+        )
+        wf = couler.workflow_yaml()
+        rendered = couler.workflow_yaml()
+        self.assertEqual(wf, rendered)
+        # Changing the returned spec must not change the cached one
+        wf["metadata"]["name"] = "changed"
+        wf["spec"]["templates"][1]["container"]["image"] = "changed"
+        wf["spec"]["templates"][0]["steps"].append([])
+        del wf["spec"]["volumes"]
+        self.assertEqual(rendered, couler.workflow_yaml())
+        wf = couler.workflow_yaml()
+        self.assertEqual(
+            wf["spec"]["volumes"], [{"name": "scratch", "emptyDir": {}}]
+        )
+        # Rendering must not register the auto-generated emptyDir volume
+        self.assertEqual(len(couler.workflow.volumes), 0)
+
+        tails()
+        updated = couler.workflow_yaml()
+        self.assertIsNot(wf, updated)
+        self.assertEqual(3, len(updated["spec"]["templates"][0]["steps"]))
+        self.assertEqual(4, len(updated["spec"]["templates"]))
+        self.assertEqual(
+            updated["spec"]["volumes"], [{"name": "scratch", "emptyDir": {}}]
+        )
+
+        couler.workflow.get_template("heads").image = "python:3.7"
+        updated = couler.workflow_yaml()
+        self.assertEqual(
+            "python:3.7", updated["spec"]["templates"][1]["container"]["image"]
+        )
+        couler._cleanup()
+
+    def test_workflow_intern_templates(self):
+        def hello(message):
+            return couler.run_container(
+                image="alpine:3.6", command=["echo"], args=[message]
+            )
+
+        def hi(message):
+            return couler.run_container(
+                image="alpine:3.6", command=["echo"], args=[message]
+            )
+
+        couler.config_workflow(intern_templates=True)
+        hello("a")
+        hi("b")
+        heads()
+        couler.set_exit_handler(couler.WFStatus.Failed, lambda: hi("c"))
+        wf = couler.workflow_yaml()
+        templates = wf["spec"]["templates"]
+        self.assertEqual(
+            ["hello", "heads", "exit-handler"],
+            [t["name"] for t in templates[1:]],
+        )
+        step = templates[0]["steps"][1][0]
+        self.assertEqual("hello", step["template"])
+        self.assertEqual(
+            ["para-hello-0"],
+            [p["name"] for p in step["arguments"]["parameters"]],
+        )
+        exit_step = templates[-1]["steps"][0][0]
+        self.assertEqual("hello", exit_step["template"])
+        # The registered templates are left as they are
+        self.assertIsNotNone(couler.workflow.get_template("hi"))
+
+        couler.config_workflow(intern_templates=False)
+        wf = couler.workflow_yaml()
+        self.assertEqual(5, len(wf["spec"]["templates"]))
+        self.assertEqual(
+            "hi", wf["spec"]["templates"][0]["steps"][1][0]["template"]
+        )
+        couler._cleanup()
+
     def test_set_workflow_exit_handler(self):
         couler._cleanup()
 
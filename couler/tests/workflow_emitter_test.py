@@ -0,0 +1,120 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+
+import pyaml
+
+import couler.argo as couler
+from couler.core import workflow_emitter
+from couler.core.workflow_emitter import WorkflowSizeError
+from couler.tests.argo_test import ArgoBaseTestCase
+
+
+def producer():
+    import random
+
+    print("heads" if random.randint(0, 1) == 0 else "tails")
+
+
+class WorkflowEmitterTest(ArgoBaseTestCase):
+    def _build_steps_workflow(self):
+        couler.run_script(
+            image="python:3.6",
+            source=producer,
+            step_name="producer",
+            resources={"cpu": "1", "memory": "1Gi"},
+        )
+        for i in range(3):
+            couler.run_container(
+                image="alpine:3.6",
+                command=["sh", "-c", "echo " + "word " * 30],
+                args=["consumer-%s" % i],
+                env={"INDEX": i},
+                step_name="consumer-%s" % i,
+            )
+        couler.set_exit_handler(
+            couler.WFStatus.Succeeded,
+            lambda: couler.run_container(
+                image="alpine:3.6", command=["echo"], step_name="cleanup"
+            ),
+        )
+
+    def _build_dag_workflow(self):
+        def job(name):
+            couler.run_container(
+                image="docker/whalesay:latest",
+                command=["cowsay"],
+                args=[name],
+                step_name=name,
+            )
+
+        couler.set_dependencies(lambda: job("A"), dependencies=None)
+        couler.set_dependencies(lambda: job("B"), dependencies=["A"])
+        couler.set_dependencies(lambda: job("C"), dependencies=["A", "B"])
+
+    def _check_same_as_full_dump(self):
+        wf = couler.workflow_yaml()
+        stream = io.StringIO()
+        num_bytes = workflow_emitter.dump_yaml(wf, stream)
+        expected = pyaml.dump(wf, force_embed=True)
+        self.assertEqual(expected, stream.getvalue())
+        self.assertEqual(len(expected.encode("utf-8")), num_bytes)
+
+        stream = io.StringIO()
+        workflow_emitter.dump_json(wf, stream)
+        self.assertEqual(json.dumps(wf), stream.getvalue())
+
+    def test_steps_workflow(self):
+        self._build_steps_workflow()
+        self._check_same_as_full_dump()
+        couler._cleanup()
+
+    def test_dag_workflow(self):
+        self._build_dag_workflow()
+        self._check_same_as_full_dump()
+        couler._cleanup()
+
+    def test_cron_workflow(self):
+        self._build_dag_workflow()
+        couler.config_workflow(cron_config={"schedule": "* * * * *"})
+        self._check_same_as_full_dump()
+        couler._cleanup()
+
+    def test_size_budget_exceeded(self):
+        couler.run_script(
+            image="python:3.6", source="print(1)\n" * 20, step_name="small"
+        )
+        couler.run_script(
+            image="python:3.6", source="print(2)\n" * 2000, step_name="large"
+        )
+        couler.run_script(
+            image="python:3.6", source="print(3)\n" * 20, step_name="last"
+        )
+        stream = io.StringIO()
+        with self.assertRaises(WorkflowSizeError) as cm:
+            workflow_emitter.dump_yaml(
+                couler.workflow_yaml(), stream, max_bytes=10000
+            )
+        # Emission stops at the template exceeding the budget
+        self.assertEqual("large", cm.exception.contributors[0][0])
+        self.assertNotIn("last", dict(cm.exception.contributors))
+        self.assertIn("large", str(cm.exception))
+        self.assertNotIn("print(2)", stream.getvalue())
+
+        with self.assertRaises(ValueError):
+            workflow_emitter.dump_json(
+                couler.workflow_yaml(), io.StringIO(), max_bytes=10000
+            )
+        couler._cleanup()
@@ -0,0 +1,124 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+from couler.argo_submitter import ArgoSubmitter
+from couler.tests.argo_submitter_test import (
+    FakeCoreV1Api,
+    FakeCustomObjectsApi,
+    ScriptedWatch,
+)
+from couler.workflow_informer import WorkflowInformer, label_selector_matcher
+
+
+def _workflow(name, labels, phase, nodes=None):
+    return {
+        "metadata": {
+            "name": name,
+            "labels": labels,
+            "resourceVersion": "1",
+        },
+        "status": {"phase": phase, "nodes": nodes or {}},
+    }
+
+
+class WorkflowInformerTest(unittest.TestCase):
+    def setUp(self):
+        self.custom_api = FakeCustomObjectsApi()
+        self.custom_api.items = [
+            _workflow("wf-%d" % i, {"team": "a" if i % 2 else "b"}, "Running")
+            for i in range(5)
+        ]
+
+    def test_list_workflows_paginated(self):
+        submitter = ArgoSubmitter(
+            custom_object_api_client=self.custom_api,
+            core_api_client=FakeCoreV1Api(),
+        )
+        names = [
+            wf["metadata"]["name"]
+            for wf in submitter.list_workflows(label_selector="x", limit=2)
+        ]
+        self.assertEqual(["wf-%d" % i for i in range(5)], names)
+        self.assertEqual(
+            [None, "2", "4"],
+            [kwargs.get("_continue") for kwargs in self.custom_api.lists],
+        )
+        self.assertEqual("x", self.custom_api.lists[0]["label_selector"])
+
+    def test_label_selector_matcher(self):
+        labels = {"app": "couler", "tier": "x"}
+        for selector, expected in [
+            (None, True),
+            ("app=couler", True),
+            ("app==couler,tier!=x", False),
+            ("tier in (x, y),!canary", True),
+            ("tier notin (x,y)", False),
+            ("app", True),
+            ("!app", False),
+        ]:
+            self.assertEqual(
+                expected, label_selector_matcher(selector)(labels), selector
+            )
+
+    def test_informer(self):
+        outputs = {"parameters": [{"name": "p", "value": "1"}]}
+        watch = ScriptedWatch(
+            [
+                [
+                    {
+                        "type": "MODIFIED",
+                        "object": _workflow(
+                            "wf-1",
+                            {"team": "a"},
+                            "Succeeded",
+                            nodes={
+                                "wf-1-123": {
+                                    "name": "wf-1.step",
+                                    "displayName": "step",
+                                    "outputs": outputs,
+                                },
+                                "wf-1": {"displayName": "wf-1"},
+                            },
+                        ),
+                    },
+                    {"type": "DELETED", "object": _workflow("wf-4", {}, "")},
+                ]
+            ]
+        )
+        informer = WorkflowInformer(
+            self.custom_api, watch_factory=watch, page_size=2
+        ).start()
+        self.addCleanup(informer.stop)
+        self.assertTrue(informer.wait_for_sync(timeout=1))
+        for _ in range(100):
+            if informer.get("wf-4") is None:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(3, len(self.custom_api.lists))
+        self.assertEqual("Succeeded", informer.get_phase("wf-1"))
+        self.assertEqual("Running", informer.get_status("wf-0")["phase"])
+        self.assertIsNone(informer.get_phase("wf-4"))
+        self.assertEqual(outputs, informer.get_node_outputs("wf-1", "step"))
+        self.assertEqual({"step": outputs}, informer.get_node_outputs("wf-1"))
+        self.assertEqual(
+            ["wf-1", "wf-3"],
+            sorted(
+                wf["metadata"]["name"]
+                for wf in informer.list(label_selector="team=a")
+            ),
+        )
+        self.assertEqual("10", watch.calls[0]["resource_version"])
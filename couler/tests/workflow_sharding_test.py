@@ -0,0 +1,224 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pyaml
+import yaml
+
+import couler.argo as couler
+from couler.core import workflow_emitter, workflow_sharding
+from couler.core.plain_objects import to_plain_objects
+from couler.tests.argo_test import ArgoBaseTestCase
+
+couler.config_workflow(name="pytest")
+
+_MAX_BYTES = 8000
+
+
+def echo(message, step_name):
+    return couler.run_container(
+        image="alpine:3.6",
+        command=["echo"],
+        args=[message],
+        step_name=step_name,
+        output=couler.create_parameter_artifact("/tmp/out.txt"),
+    )
+
+
+def shard_steps(workflow_template):
+    return [
+        [step["name"] for step in group]
+        for group in workflow_template["spec"]["templates"][0]["steps"]
+    ]
+
+
+def shard_tasks(workflow_template):
+    return [
+        task["name"]
+        for task in workflow_template["spec"]["templates"][0]["dag"]["tasks"]
+    ]
+
+
+class WorkflowShardingTest(ArgoBaseTestCase):
+    def test_small_workflow(self):
+        echo("hello", "A")
+        wf = couler.workflow_yaml()
+        self.assertEqual(
+            (wf, []), workflow_sharding.shard_workflow(wf, _MAX_BYTES)
+        )
+
+    def test_shard_steps(self):
+        output = echo("x", "produce")
+        for i in range(4):
+            echo("filler-%d-" % i * 300, "filler-%d" % i)
+        couler.run_container(
+            image="alpine:3.6",
+            command=["cat"],
+            args=[output],
+            step_name="consume",
+        )
+        wf = couler.workflow_yaml()
+        wf["spec"]["volumes"] = [{"name": "data", "emptyDir": {}}]
+        wf["spec"]["volumeClaimTemplates"] = [
+            {"metadata": {"name": "claim"}, "spec": {}}
+        ]
+        self.assertFalse(workflow_sharding.fits(wf, _MAX_BYTES))
+
+        parent, workflow_templates = workflow_sharding.shard_workflow(
+            wf, _MAX_BYTES
+        )
+        self.assertTrue(workflow_sharding.fits(parent, _MAX_BYTES))
+        # Only the shards mount the volumes
+        self.assertNotIn("volumes", parent["spec"])
+        self.assertNotIn("volumeClaimTemplates", parent["spec"])
+        for workflow_template in workflow_templates:
+            self.assertEqual(
+                wf["spec"]["volumes"], workflow_template["spec"]["volumes"]
+            )
+        steps = [
+            step
+            for workflow_template in workflow_templates
+            for step in shard_steps(workflow_template)
+        ]
+        # The step groups are run in order, each in exactly one shard
+        self.assertEqual(
+            [
+                [step["name"] for step in group]
+                for group in wf["spec"]["templates"][0]["steps"]
+            ],
+            steps,
+        )
+        main = parent["spec"]["templates"][0]
+        self.assertEqual(
+            [["shard-%d" % i] for i in range(len(workflow_templates))],
+            [[step["name"] for step in group] for group in main["steps"]],
+        )
+        for template, workflow_template in zip(
+            parent["spec"]["templates"][1:], workflow_templates
+        ):
+            self.assertTrue(workflow_sharding.fits(workflow_template))
+            manifest = yaml.safe_load(template["resource"]["manifest"])
+            self.assertEqual(
+                {"name": workflow_template["metadata"]["name"]},
+                manifest["spec"]["workflowTemplateRef"],
+            )
+
+        # The output of produce is passed to consume through the parent
+        first, last = workflow_templates[0], workflow_templates[-1]
+        global_name = parent["spec"]["templates"][1]["outputs"]["parameters"][
+            0
+        ]["name"]
+        exporting = [
+            t
+            for t in first["spec"]["templates"]
+            if t["name"].startswith("produce-")
+        ]
+        self.assertEqual(1, len(exporting))
+        self.assertEqual(
+            global_name,
+            exporting[0]["outputs"]["parameters"][0]["globalName"],
+        )
+        self.assertEqual(
+            [{"name": global_name}], last["spec"]["arguments"]["parameters"]
+        )
+        consume = last["spec"]["templates"][0]["steps"][-1][0]
+        self.assertEqual(
+            '"{{workflow.parameters.%s}}"' % global_name,
+            consume["arguments"]["parameters"][0]["value"],
+        )
+        self.assertEqual(
+            '"{{steps.shard-0.outputs.parameters.%s}}"' % global_name,
+            main["steps"][-1][0]["arguments"]["parameters"][0]["value"],
+        )
+        # The parent can be printed and submitted
+        plain = to_plain_objects(parent)
+        self.assertEqual(plain, yaml.safe_load(pyaml.dump(parent)))
+        self.assertEqual(
+            "{.status.outputs.parameters[?(@.name=='%s')].value}"
+            % global_name,
+            plain["spec"]["templates"][1]["outputs"]["parameters"][0][
+                "valueFrom"
+            ]["jsonPath"],
+        )
+        self.assertEqual(
+            "{{steps.shard-0.outputs.parameters.%s}}" % global_name,
+            plain["spec"]["templates"][0]["steps"][-1][0]["arguments"][
+                "parameters"
+            ][0]["value"],
+        )
+        manifest = yaml.safe_load(
+            parent["spec"]["templates"][-1]["resource"]["manifest"]
+        )
+        self.assertEqual(
+            [
+                {
+                    "name": global_name,
+                    "value": "{{inputs.parameters.%s}}" % global_name,
+                }
+            ],
+            manifest["spec"]["arguments"]["parameters"],
+        )
+
+    def test_shard_dag(self):
+        couler.set_dependencies(
+            lambda: echo("a" * 1500, "A"), dependencies=None
+        )
+        couler.set_dependencies(
+            lambda: echo("b" * 1200, "B"), dependencies=["A"]
+        )
+        couler.set_dependencies(
+            lambda: echo("c" * 2500, "C"), dependencies=["A"]
+        )
+        couler.set_dependencies(
+            lambda: echo("d" * 1200, "D"), dependencies=["B"]
+        )
+        wf = couler.workflow_yaml()
+        tasks = wf["spec"]["templates"][0]["dag"]["tasks"]
+        # D reads an artifact of B, so they cannot be split
+        tasks[3]["arguments"]["artifacts"] = [
+            {"name": "in", "from": "{{tasks.B.outputs.artifacts.out}}"}
+        ]
+
+        parent, workflow_templates = workflow_sharding.shard_workflow(
+            wf, _MAX_BYTES
+        )
+        self.assertGreater(len(workflow_templates), 1)
+        shards = [shard_tasks(wt) for wt in workflow_templates]
+        self.assertEqual(
+            ["A", "B", "C", "D"], sorted(t for s in shards for t in s)
+        )
+        shard_of = {t: i for i, s in enumerate(shards) for t in s}
+        self.assertEqual(shard_of["B"], shard_of["D"])
+        for workflow_template in workflow_templates:
+            for task in workflow_template["spec"]["templates"][0]["dag"][
+                "tasks"
+            ]:
+                for dependency in task.get("dependencies", []):
+                    self.assertEqual(
+                        shard_of[task["name"]], shard_of[dependency]
+                    )
+        # The parent runs the shard of A before the others
+        for task in parent["spec"]["templates"][0]["dag"]["tasks"]:
+            i = int(task["name"].split("-")[1])
+            if i != shard_of["A"]:
+                self.assertIn(
+                    "shard-%d" % shard_of["A"], task.get("dependencies", [])
+                )
+
+    def test_unsplittable_workflow(self):
+        echo("x" * _MAX_BYTES, "A")
+        echo("y", "B")
+        with self.assertRaises(workflow_emitter.WorkflowSizeError) as ctx:
+            workflow_sharding.shard_workflow(
+                couler.workflow_yaml(), _MAX_BYTES
+            )
+        self.assertEqual("A", ctx.exception.contributors[0][0])
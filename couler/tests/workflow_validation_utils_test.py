@@ -11,8 +11,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import threading
+
 import couler.argo as couler
 from couler.core.workflow_validation_utils import (  # noqa: F401
+    WorkflowValidator,
     validate_workflow_yaml,
 )
 from couler.tests.argo_yaml_test import ArgoYamlTest
@@ -35,6 +39,16 @@ def start_pod_with_step(message, step_name):
     )
 
 
+class FakeApiClient(object):
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def deserialize(self, response, response_type):
+        with self._lock:
+            self.calls.append((response_type, response.data))
+
+
 def run_multiple_pods(num_pods):
     para = []
     i = 0
@@ -118,3 +132,52 @@ class WorkflowValidationUtilsTest(ArgoYamlTest):
         wf = couler.workflow_yaml()
         self.assertEqual(wf["spec"]["templates"][1]["name"], "a-b")
         couler._cleanup()
+
+    def test_validator_only_checks_changed_sections(self):
+        for i in range(3):
+            start_pod_with_step(message="m%s" % i, step_name="s%s" % i)
+        wf = couler.workflow_yaml()
+        api_client = FakeApiClient()
+        validator = WorkflowValidator(api_client=api_client)
+
+        validator.validate(wf)
+        types = [t for t, _ in api_client.calls]
+        self.assertEqual(3, types.count("V1alpha1WorkflowStep"))
+
+        api_client.calls = []
+        validator.validate(wf)
+        self.assertEqual([], api_client.calls)
+
+        start_pod_with_step(message="m3", step_name="s3")
+        validator.validate(couler.workflow_yaml())
+        self.assertEqual(
+            ["V1alpha1WorkflowStep"], [t for t, _ in api_client.calls]
+        )
+        couler._cleanup()
+
+    def test_validator_dag_and_thread_pool(self):
+        for name in ["A", "B", "C", "D"]:
+            deps = None if name == "A" else ["A"]
+            couler.set_dependencies(
+                lambda name=name: start_pod_with_step(name, name),
+                dependencies=deps,
+            )
+        wf = couler.workflow_yaml()
+        api_client = FakeApiClient()
+        WorkflowValidator(api_client=api_client, max_workers=4).validate(wf)
+        types = sorted(t for t, _ in api_client.calls)
+        self.assertEqual(
+            ["V1alpha1DAGTask"] * 4 + ["V1alpha1DAGTemplate"], types
+        )
+        # The workflow is validated in place without being modified
+        self.assertEqual(couler.workflow_yaml(), wf)
+
+        wf2 = copy.deepcopy(wf)
+        wf2["spec"]["templates"][0]["dag"] = None
+        self.assertRaisesRegex(
+            Exception,
+            "At least one task definition must exist in dag.tasks",
+            WorkflowValidator(api_client=api_client).validate,
+            wf2,
+        )
+        couler._cleanup()
@@ -0,0 +1,238 @@
+# Copyright 2021 The Couler Authors. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import re
+import threading
+
+from kubernetes import watch as k8s_watch
+from kubernetes.client.rest import ApiException
+
+from couler.argo_submitter import (
+    _DEFAULT_PAGE_SIZE,
+    _WATCH_MAX_BACKOFF_SECONDS,
+    _WATCH_TIMEOUT_SECONDS,
+    _list_pages,
+)
+from couler.core.constants import WorkflowCRD
+
+_SET_REQUIREMENT = re.compile(r"^([^\s!=]+)\s+(in|notin)\s+\((.*)\)$")
+
+
+def label_selector_matcher(label_selector):
+    """Return a function telling whether a dict of labels matches the
+    given Kubernetes label selector, e.g. "app=a,tier in (x, y),!canary".
+    """
+    if not label_selector:
+        return lambda labels: True
+    requirements = []
+    # Split on the commas that are not inside parentheses
+    for requirement in re.split(r",(?![^(]*\))", label_selector):
+        requirement = requirement.strip()
+        set_match = _SET_REQUIREMENT.match(requirement)
+        if set_match:
+            key, operator, values = set_match.groups()
+            values = {v.strip() for v in values.split(",")}
+            if operator == "in":
+                requirements.append(
+                    lambda labels, k=key, vs=values: labels.get(k) in vs
+                )
+            else:
+                requirements.append(
+                    lambda labels, k=key, vs=values: labels.get(k) not in vs
+                )
+        elif "!=" in requirement:
+            key, value = [p.strip() for p in requirement.split("!=", 1)]
+            requirements.append(
+                lambda labels, k=key, v=value: labels.get(k) != v
+            )
+        elif "=" in requirement:
+            key, value = [
+                p.strip() for p in re.split(r"==?", requirement, maxsplit=1)
+            ]
+            requirements.append(
+                lambda labels, k=key, v=value: labels.get(k) == v
+            )
+        elif requirement.startswith("!"):
+            key = requirement[1:].strip()
+            requirements.append(lambda labels, k=key: k not in labels)
+        elif requirement:
+            requirements.append(lambda labels, k=requirement: k in labels)
+    return lambda labels: all(r(labels or {}) for r in requirements)
+
+
+class WorkflowInformer(object):
+    """A local cache of the workflows of one namespace.
+
+    The workflows are listed once, page by page, and then kept current by
+    a watch running in a daemon thread, so that status queries are served
+    from memory instead of hitting the API server. Only the workflows
+    matching `label_selector` are cached. The returned workflows are the
+    cached objects and must not be modified.
+    """
+
+    def __init__(
+        self,
+        custom_object_api_client,
+        namespace="default",
+        label_selector=None,
+        watch_factory=k8s_watch.Watch,
+        page_size=_DEFAULT_PAGE_SIZE,
+    ):
+        self._custom_object_api_client = custom_object_api_client
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self._watch_factory = watch_factory
+        self.page_size = page_size
+        # workflow name -> workflow
+        self._workflows = {}
+        self._resource_version = None
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def wait_for_sync(self, timeout=None):
+        """Block until the first list is done, returns False on timeout."""
+        return self._synced.wait(timeout)
+
+    def get(self, name):
+        with self._lock:
+            return self._workflows.get(name)
+
+    def get_status(self, name):
+        workflow = self.get(name)
+        if workflow is None:
+            return None
+        return workflow.get("status") or {}
+
+    def get_phase(self, name):
+        status = self.get_status(name)
+        if status is None:
+            return None
+        return status.get("phase")
+
+    def get_node_outputs(self, name, node_name=None):
+        """Return the outputs of the node of a workflow with the given id,
+        name or display name, or of all its nodes by display name."""
+        status = self.get_status(name)
+        if status is None:
+            return None
+        nodes = (status.get("nodes") or {}).items()
+        if node_name is None:
+            return {
+                node.get("displayName", node_id): node["outputs"]
+                for node_id, node in nodes
+                if node.get("outputs")
+            }
+        for node_id, node in nodes:
+            if node_name in (
+                node_id,
+                node.get("name"),
+                node.get("displayName"),
+            ):
+                return node.get("outputs") or {}
+        return None
+
+    def list(self, label_selector=None):
+        matches = label_selector_matcher(label_selector)
+        with self._lock:
+            workflows = list(self._workflows.values())
+        return [
+            workflow
+            for workflow in workflows
+            if matches(workflow["metadata"].get("labels"))
+        ]
+
+    def _args(self):
+        return (
+            self._custom_object_api_client.list_namespaced_custom_object,
+            WorkflowCRD.GROUP,
+            WorkflowCRD.VERSION,
+            self.namespace,
+            WorkflowCRD.PLURAL,
+        )
+
+    def _kwargs(self):
+        if self.label_selector is None:
+            return {}
+        return {"label_selector": self.label_selector}
+
+    def _run(self):
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                if self._resource_version is None:
+                    self._list()
+                self._watch()
+                backoff = 1
+            except ApiException as e:
+                if e.status == 410:
+                    self._resource_version = None
+                    continue
+                logging.warning("Workflow informer failed: %s" % e)
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, _WATCH_MAX_BACKOFF_SECONDS)
+            except Exception as e:
+                logging.warning("Workflow informer failed: %s" % e)
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, _WATCH_MAX_BACKOFF_SECONDS)
+
+    def _list(self):
+        workflows = {}
+        resource_version = None
+        for page in _list_pages(
+            *self._args(), limit=self.page_size, **self._kwargs()
+        ):
+            for workflow in page["items"]:
+                workflows[workflow["metadata"]["name"]] = workflow
+            # All the pages share the resource version
+            resource_version = page["metadata"]["resourceVersion"]
+        with self._lock:
+            self._workflows = workflows
+            self._resource_version = resource_version
+        self._synced.set()
+
+    def _watch(self):
+        w = self._watch_factory()
+        for event in w.stream(
+            *self._args(),
+            resource_version=self._resource_version,
+            timeout_seconds=_WATCH_TIMEOUT_SECONDS,
+            **self._kwargs()
+        ):
+            obj = event["object"]
+            if event["type"] == "ERROR":
+                if obj.get("code") == 410:
+                    # Too old to resume from, list again
+                    self._resource_version = None
+                return
+            with self._lock:
+                if event["type"] == "DELETED":
+                    self._workflows.pop(obj["metadata"]["name"], None)
+                else:
+                    self._workflows[obj["metadata"]["name"]] = obj
+                self._resource_version = obj["metadata"]["resourceVersion"]
+            if self._stopped.is_set():
+                w.stop()
+                return